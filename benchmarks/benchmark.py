@@ -0,0 +1,454 @@
+"""Benchmark the registry API against generated module trees.
+
+Synthetic fs_path trees are generated with a given number of module
+versions, then every operation of the module API and the /dl/ download
+route is timed through the Flask test client and through gunicorn started
+with the configuration of the container image. Results are written as JSON
+so runs can be compared between commits:
+
+    python benchmarks/benchmark.py --sizes 1000 10000 --output results.json
+    python benchmarks/benchmark.py --compare baseline.json results.json
+
+The cold start of a fresh interpreter, up to the response to its first
+request, is measured as well and checked against a budget:
+
+    python benchmarks/benchmark.py --sizes --startup-budget 1.0
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from os.path import abspath, dirname, exists, join
+
+import yaml
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from terraform_registry_api import registry  # noqa: E402
+from terraform_registry_api.terraform_module_registry_api import api  # noqa: E402
+
+PROVIDERS = ("aws", "azurerm", "google")
+VERSIONS_PER_PROVIDER = 10
+MODULES_PER_NAMESPACE = 50
+ARTIFACT_SIZE = 16 * 1024
+
+# Run in a fresh interpreter to time a cold start, prints the timings as JSON
+COLD_START = """
+import json, time
+started = time.perf_counter()
+from terraform_registry_api import registry
+imported = time.perf_counter()
+app = registry.create_app()
+created = time.perf_counter()
+response = app.test_client().get("/v1/modules?limit=1")
+served = time.perf_counter()
+print(json.dumps({"status": response.status_code,
+                  "import_s": imported - started, "create_s": created - imported,
+                  "first_request_s": served - created, "total_s": served - started}))
+"""
+
+# Operation name mapped to a function building a request path for a module
+OPERATIONS = {
+    "list_all_modules": lambda m: "/v1/modules?limit=20&offset=40",
+    "list_modules": lambda m: "/v1/modules/{ns}?limit=20".format(**m),
+    "search_modules": lambda m: "/v1/modules/search?q={name}&limit=20".format(**m),
+    "list_versions": lambda m: "/v1/modules/{ns}/{name}/{provider}/versions".format(**m),
+    "get_latest_for_all_providers": lambda m: "/v1/modules/{ns}/{name}".format(**m),
+    "get_latest_for_provider": lambda m: "/v1/modules/{ns}/{name}/{provider}".format(**m),
+    "get_module": lambda m: "/v1/modules/{ns}/{name}/{provider}/{version}".format(**m),
+    "download_version":
+        lambda m: "/v1/modules/{ns}/{name}/{provider}/{version}/download".format(**m),
+    "download_latest":
+        lambda m: "/v1/modules/{ns}/{name}/{provider}/download".format(**m),
+    "dl_module":
+        lambda m: "/dl/module/{ns}/{name}/{provider}/{version}/"
+                  "{ns}_{name}-{provider}-{version}.tar.gz".format(**m),
+}
+
+
+def generate_tree(basedir, versions):
+    """Generate a module tree holding a number of versions.
+
+    A tree already generated in basedir is reused if its marker records the
+    same number of versions, otherwise the tree is generated again.
+
+    Args:
+        basedir (str): Directory to create the tree in
+        versions (int): Number of module versions to create
+
+    Returns:
+        list: (namespace, name, provider, version) of every version
+    """
+    artifact = random.Random(versions).randbytes(ARTIFACT_SIZE) \
+        if hasattr(random.Random, "randbytes") else os.urandom(ARTIFACT_SIZE)
+    per_module = len(PROVIDERS) * VERSIONS_PER_PROVIDER
+    modules = max(1, versions // per_module)
+    marker = join(basedir, ".complete")
+    complete = False
+    if exists(marker):
+        with open(marker) as markerfile:
+            complete = markerfile.read().strip() == str(modules * per_module)
+        if not complete:
+            shutil.rmtree(basedir)
+    created = []
+    for index in range(modules):
+        namespace = "namespace{}".format(index // MODULES_PER_NAMESPACE)
+        name = "module{}".format(index)
+        moduledir = join(basedir, namespace, name)
+        if not complete:
+            os.makedirs(moduledir, exist_ok=True)
+            with open(join(moduledir, "module_metadata.yaml"), "w") as metafile:
+                yaml.safe_dump({"owner": "Team {}".format(index % 7),
+                                "description": "Benchmark module {} for {}".format(
+                                    name, namespace),
+                                "verified": index % 3 != 0}, metafile)
+        for provider in PROVIDERS:
+            for minor in range(VERSIONS_PER_PROVIDER):
+                version = "1.{}.0".format(minor)
+                created.append((namespace, name, provider, version))
+                if complete:
+                    continue
+                versiondir = join(moduledir, provider, version)
+                os.makedirs(versiondir, exist_ok=True)
+                filename = "{}_{}-{}-{}.tar.gz".format(namespace, name, provider, version)
+                with open(join(versiondir, filename), "wb") as tarball:
+                    tarball.write(artifact)
+    with open(marker, "w") as markerfile:
+        markerfile.write(str(len(created)))
+    return created
+
+
+def build_requests(modules, operations, count, seed=0):
+    """Build the request paths for each operation.
+
+    Args:
+        modules (list): (namespace, name, provider, version) of every version
+        operations (list): Names of the operations to request
+        count (int): Number of requests per operation
+        seed (int, optional): Seed for picking modules. Defaults to 0.
+
+    Returns:
+        dict: Operation name mapped to its request paths
+    """
+    rng = random.Random(seed)
+    picked = [dict(zip(("ns", "name", "provider", "version"), rng.choice(modules)))
+              for _ in range(count)]
+    return {operation: [OPERATIONS[operation](module) for module in picked]
+            for operation in operations}
+
+
+def summarize(latencies, elapsed, errors):
+    """Summarize the timings of an operation.
+
+    Args:
+        latencies (list): Seconds taken by each request
+        elapsed (float): Wall clock seconds for all requests
+        errors (int): Number of requests which failed
+
+    Returns:
+        dict: Request count, throughput and latency percentiles
+    """
+    latencies = sorted(latencies)
+
+    def percentile(quantile):
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(quantile * (len(latencies) - 1))))
+        return round(latencies[index] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "max_ms": percentile(1.0),
+    }
+
+
+def run_client(app, paths):
+    """Time requests made through the Flask test client.
+
+    Args:
+        app (Flask): Application to benchmark
+        paths (list): Request paths
+
+    Returns:
+        dict: See summarize
+    """
+    client = app.test_client()
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for path in paths:
+        begin = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        latencies.append(time.perf_counter() - begin)
+        errors += response.status_code >= 400
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def run_server(port, paths, concurrency):
+    """Time requests made over HTTP to a running server.
+
+    Args:
+        port (int): Port the server listens on
+        paths (list): Request paths
+        concurrency (int): Number of connections making requests
+
+    Returns:
+        dict: See summarize
+    """
+    latencies, errors = [], []
+    chunks = [paths[i::concurrency] for i in range(concurrency)]
+
+    def worker(chunk):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        failed = 0
+        for path in chunk:
+            begin = time.perf_counter()
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - begin)
+            failed += response.status >= 400
+        connection.close()
+        errors.append(failed)
+
+    threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, sum(errors))
+
+
+def start_server(workers, timeout=600):
+    """Serve the registry with gunicorn as the container image does.
+
+    The server is configured through the environment of this process, and
+    listens on a free local port.
+
+    Args:
+        workers (int): Number of worker processes, None for the default of
+            the gunicorn configuration
+        timeout (float, optional): Seconds to wait for the server to answer.
+            Defaults to 600.
+
+    Returns:
+        tuple: The server process and the port it listens on, None if
+        gunicorn is not installed
+    """
+    if shutil.which("gunicorn") is None:
+        return None
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    environment = dict(os.environ, server_bind="127.0.0.1:{}".format(port),
+                       PYTHONPATH=dirname(dirname(abspath(__file__))))
+    if workers is not None:
+        environment["server_workers"] = str(workers)
+    server = subprocess.Popen(
+        ["gunicorn", "-c", "python:terraform_registry_api.gunicorn_config",
+         "--log-level", "warning"], env=environment, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/.well-known/terraform.json")
+            connection.getresponse().read()
+            connection.close()
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    server.wait()
+    raise RuntimeError("gunicorn did not start serving on port {}".format(port))
+
+
+def benchmark(size, workdir, args):
+    """Benchmark every operation against a tree of a given size.
+
+    Args:
+        size (int): Number of module versions in the tree
+        workdir (str): Directory holding the generated trees
+        args (Namespace): Command line arguments
+
+    Returns:
+        list: Result of each operation and transport
+    """
+    basedir = join(workdir, "versions-{}".format(size))
+    modules = generate_tree(basedir, size)
+    os.environ.update({"fs_path": basedir, "fs_watch": "off",
+                       "cache_size": str(args.cache_size)})
+    started = time.perf_counter()
+    app = registry.create_app()
+    startup = time.perf_counter() - started
+    requests = build_requests(modules, args.operations, args.requests)
+    print("{} versions: started in {:.2f}s".format(size, startup), file=sys.stderr)
+
+    results = []
+    for transport in args.transports:
+        server = None
+        if transport == "gunicorn":
+            server = start_server(args.workers)
+            if server is None:
+                print("gunicorn is not installed, skipping", file=sys.stderr)
+                continue
+        for operation, paths in requests.items():
+            api.response_cache.clear()
+            if transport == "client":
+                run_client(app, paths[:args.warmup])
+                result = run_client(app, paths)
+            else:
+                run_server(server[1], paths[:args.warmup], args.concurrency)
+                result = run_server(server[1], paths, args.concurrency)
+            result.update({"size": size, "transport": transport,
+                           "operation": operation, "startup_s": round(startup, 3)})
+            results.append(result)
+            print("  {transport:8} {operation:30} {throughput:>9} req/s "
+                  "p50 {p50_ms:>8} ms  p99 {p99_ms:>8} ms".format(**result),
+                  file=sys.stderr)
+        if server is not None:
+            server[0].terminate()
+            server[0].wait()
+    return results
+
+
+def cold_start(runs):
+    """Time the cold start of the registry in fresh interpreters.
+
+    The registry is started with the default Dummy backend, so the timings
+    are those of the application itself and not of loading a module tree.
+
+    Args:
+        runs (int): Number of interpreters to start
+
+    Returns:
+        dict: Median seconds of each phase of the startup
+    """
+    environment = {key: value for key, value in os.environ.items()
+                   if key not in ("fs_path", "s3_bucket", "proxy_upstream",
+                                  "sqlite_database", "fs_provider_path")}
+    environment["PYTHONPATH"] = dirname(dirname(abspath(__file__)))
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", COLD_START], env=environment,
+                                capture_output=True, check=True, text=True).stdout
+        timings.append(json.loads(output.splitlines()[-1]))
+    return {key: round(sorted(timing[key] for timing in timings)[len(timings) // 2], 3)
+            for key in ("import_s", "create_s", "first_request_s", "total_s")}
+
+
+def git_commit():
+    """Get the commit the benchmark runs on.
+
+    Returns:
+        str: Commit hash, None outside of a git checkout
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              check=True, text=True,
+                              cwd=dirname(abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """Print the change in throughput and p99 latency between two runs.
+
+    Args:
+        baseline (str): Path of the results to compare against
+        current (str): Path of the new results
+    """
+    with open(baseline) as before, open(current) as after:
+        old, new = json.load(before), json.load(after)
+    known = {(r["size"], r["transport"], r["operation"]): r for r in old["results"]}
+    print("{:>8} {:8} {:30} {:>10} {:>10}".format(
+        "size", "transport", "operation", "req/s", "p99"))
+    for result in new["results"]:
+        previous = known.get((result["size"], result["transport"], result["operation"]))
+        if previous is None or not previous["throughput"] or not previous["p99_ms"]:
+            continue
+        print("{:>8} {:8} {:30} {:>+9.1f}% {:>+9.1f}%".format(
+            result["size"], result["transport"], result["operation"],
+            100 * (result["throughput"] / previous["throughput"] - 1),
+            100 * (result["p99_ms"] / previous["p99_ms"] - 1)))
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line.
+
+    Args:
+        argv (list, optional): Command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000],
+                        help="module versions in each generated tree")
+    parser.add_argument("--operations", nargs="+", default=list(OPERATIONS),
+                        choices=list(OPERATIONS))
+    parser.add_argument("--transports", nargs="+", default=["client", "gunicorn"],
+                        choices=["client", "gunicorn"])
+    parser.add_argument("--requests", type=int, default=500,
+                        help="requests per operation")
+    parser.add_argument("--warmup", type=int, default=50,
+                        help="requests made before timing each operation")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="connections making requests to gunicorn")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="gunicorn worker processes (default one per CPU)")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="response cache size, disabled by default")
+    parser.add_argument("--workdir", default=join(dirname(abspath(__file__)), ".trees"),
+                        help="directory the generated trees are kept in")
+    parser.add_argument("--startup-runs", type=int, default=5,
+                        help="fresh interpreters started to time the cold start")
+    parser.add_argument("--startup-budget", type=float,
+                        help="fail if the median cold start takes longer (seconds)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two result files instead of benchmarking")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    startup = cold_start(args.startup_runs)
+    print("cold start: {total_s}s (import {import_s}s, create {create_s}s, "
+          "first request {first_request_s}s)".format(**startup), file=sys.stderr)
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark(size, args.workdir, args))
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "settings": {"requests": args.requests, "concurrency": args.concurrency,
+                     "workers": args.workers, "cache_size": args.cache_size},
+        "cold_start": startup,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    if args.startup_budget is not None and startup["total_s"] > args.startup_budget:
+        print("cold start over the budget of {}s".format(args.startup_budget),
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
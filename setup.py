@@ -16,7 +16,7 @@ setuptools.setup(
         "Bug Tracker": "https://github.com/terra-store/terra-store/issues",
     },
     classifiers=[
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "Framework :: Flask",
         "Development Status :: 2 - Pre-Alpha",
         "License :: OSI Approved :: Apache Software License",
@@ -25,6 +25,16 @@ setuptools.setup(
     include_package_data=True,
     package_dir={"": "."},
     packages=setuptools.find_packages(where="."),
-    python_requires=">=3.6",
+    python_requires=">=3.7",
+    extras_require={
+        "s3": ["boto3"],
+        "proxy": ["urllib3"],
+        "gunicorn": ["gunicorn>=20.1"],
+        "asgi": ["uvicorn"],
+        "orjson": ["orjson"],
+    },
+    entry_points={
+        "console_scripts": ["terra-store=terraform_registry_api.cli:main"],
+    },
     keywords="terraform, registry, flask",
 )
@@ -1 +1,6 @@
 """Main Module."""
+import time
+
+# Taken before any other module of the package is imported, startup is
+# measured from here
+STARTED = time.perf_counter()
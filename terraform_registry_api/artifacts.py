@@ -0,0 +1,221 @@
+"""Serving of module artifacts on the /dl/ routes.
+
+Artifacts are handed to the WSGI server's ``wsgi.file_wrapper`` when it
+offers one, which lets servers such as gunicorn use ``sendfile`` and waitress
+stream straight from the file. Byte ranges, and the whole file on other
+servers, are sent through a memory map. Backends which hold an artifact in
+memory, or stream it from elsewhere, return it as an Artifact together with
+its ETag; streamed artifacts are relayed in chunks and always sent whole.
+Artifacts kept in a BlobStore use their digest as ETag. Single byte ranges,
+conditional requests and handing the transfer off to nginx with
+``X-Accel-Redirect`` are supported.
+"""
+import calendar
+import hashlib
+import mimetypes
+import mmap
+import os
+
+from flask import Response, request
+
+from .metrics import download_bytes
+from .terraform_module_registry_api.backends.abstract import Artifact
+from .terraform_module_registry_api.backends.blobstore import blob_digest
+from .terraform_module_registry_api.exceptions import FileNotFoundException
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class MappedFile:
+    """Iterate a byte range of a file through a memory map."""
+
+    def __init__(self, fileobj, start, length, chunk_size=CHUNK_SIZE):
+        """Map the file.
+
+        Args:
+            fileobj (file): File opened in binary mode
+            start (int): Offset of the first byte to send
+            length (int): Number of bytes to send
+            chunk_size (int, optional): Bytes per chunk. Defaults to 1 MiB.
+        """
+        self.fileobj = fileobj
+        self.start = start
+        self.length = length
+        self.chunk_size = chunk_size
+        self.mapped = None
+        if length:
+            self.mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __iter__(self):
+        """Yield the byte range in chunks."""
+        end = self.start + self.length
+        for offset in range(self.start, end, self.chunk_size):
+            yield self.mapped[offset:min(offset + self.chunk_size, end)]
+
+    def close(self):
+        """Unmap and close the file."""
+        if self.mapped is not None:
+            self.mapped.close()
+        self.fileobj.close()
+
+
+class StreamedBody:
+    """Iterate a readable stream in chunks."""
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        """Wrap the stream.
+
+        Args:
+            stream (file): Stream opened in binary mode
+            chunk_size (int, optional): Bytes per chunk. Defaults to 1 MiB.
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        """Yield the stream in chunks until it is exhausted."""
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        """Close the stream."""
+        self.stream.close()
+
+
+def send_artifact(artifact, accel_path=None, accel_prefix=None):
+    """Build the response for downloading an artifact.
+
+    Args:
+        artifact (str|Artifact|bytes): Location of the artifact on disk, or
+            the artifact itself. The ETag of bare bytes is computed on every
+            call.
+        accel_path (str, optional): Path of the artifact relative to the
+            location nginx serves for accel_prefix. Defaults to None.
+        accel_prefix (str, optional): Internal nginx location to redirect
+            the transfer to with X-Accel-Redirect. Defaults to None, which
+            sends the artifact from this process.
+
+    Raises:
+        FileNotFoundException: Raised if the artifact does not exist
+
+    Returns:
+        Response: The artifact, part of it or a 304, 416 response
+    """
+    if isinstance(artifact, bytes):
+        artifact = Artifact(artifact, len(artifact),
+                            hashlib.sha256(artifact).hexdigest(), None)
+    if isinstance(artifact, Artifact):
+        mimetype = mimetypes.guess_type(accel_path or "")[0]
+        size, etag, last_modified = artifact.size, artifact.etag, artifact.last_modified
+    else:
+        try:
+            stat = os.stat(artifact)
+        except OSError:
+            raise FileNotFoundException("The requested file was not found.")
+        mimetype = mimetypes.guess_type(accel_path or artifact)[0]
+        size, last_modified = stat.st_size, int(stat.st_mtime)
+        etag = blob_digest(artifact) \
+            or "{:x}-{:x}".format(stat.st_mtime_ns, stat.st_size)
+    mimetype = mimetype or "application/octet-stream"
+
+    if accel_prefix and accel_path is not None and isinstance(artifact, str):
+        resp = Response(mimetype=mimetype)
+        resp.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" \
+            + accel_path.lstrip("/")
+        if request.method != "HEAD":
+            download_bytes.inc(size)
+        return resp
+
+    resp = Response(mimetype=mimetype, direct_passthrough=True)
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    streamed = isinstance(artifact, Artifact) and not isinstance(artifact.body, bytes)
+    resp.accept_ranges = "none" if streamed else "bytes"
+    if not_modified(etag, last_modified):
+        if streamed:
+            artifact.body.close()
+        resp.status_code = 304
+        return resp
+
+    start, length = 0, size
+    if request.range is not None and not streamed \
+            and if_range_matches(etag, last_modified):
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            resp.status_code = 416
+            resp.headers["Content-Range"] = "bytes */{}".format(size)
+            return resp
+        start, length = byte_range[0], byte_range[1] - byte_range[0]
+        resp.status_code = 206
+        resp.headers["Content-Range"] = "bytes {}-{}/{}".format(
+            start, start + length - 1, size)
+
+    if streamed:
+        resp.response = StreamedBody(artifact.body)
+    elif isinstance(artifact, Artifact):
+        resp.response = [artifact.body if length == size
+                         else artifact.body[start:start + length]]
+    else:
+        fileobj = open(artifact, "rb")
+        file_wrapper = request.environ.get("wsgi.file_wrapper")
+        # file wrappers send the file to its end, so ranges are mapped
+        if file_wrapper is not None and length == size:
+            resp.response = file_wrapper(fileobj, CHUNK_SIZE)
+        else:
+            resp.response = MappedFile(fileobj, start, length)
+    resp.content_length = length
+    if request.method != "HEAD":
+        download_bytes.inc(length)
+    return resp
+
+
+def not_modified(etag, last_modified):
+    """Check the conditional request headers.
+
+    Args:
+        etag (str): ETag of the artifact
+        last_modified (int): Modification time of the artifact, or None
+
+    Returns:
+        bool: True if the client copy is current
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since is not None and last_modified is not None:
+        return last_modified <= timestamp(request.if_modified_since)
+    return False
+
+
+def if_range_matches(etag, last_modified):
+    """Check whether a Range request may be answered partially.
+
+    Args:
+        etag (str): ETag of the artifact
+        last_modified (int): Modification time of the artifact, or None
+
+    Returns:
+        bool: False if If-Range names a different version of the artifact
+    """
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return last_modified is not None \
+            and last_modified <= timestamp(if_range.date)
+    return True
+
+
+def timestamp(date):
+    """Convert a parsed HTTP date to a unix timestamp.
+
+    Args:
+        date (datetime): Date in UTC, with or without timezone
+
+    Returns:
+        int: Seconds since the epoch
+    """
+    return calendar.timegm(date.utctimetuple())
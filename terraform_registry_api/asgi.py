@@ -0,0 +1,336 @@
+"""ASGI entry point of the registry.
+
+Usage::
+
+    uvicorn --factory terraform_registry_api.asgi:create_app
+
+Module downloads are served natively: the artifact is looked up through the
+asynchronous backend interface and files are streamed by the event loop,
+which reads each chunk on the thread pool, so slow clients and long
+downloads do not hold a thread. All other requests run the WSGI application
+on the thread pool for as long as the handler takes, the rendered body is
+then sent by the event loop. Idle keep-alive connections are only held by
+the ASGI server. Streamed responses, which carry no Content-Length, are
+relayed chunk by chunk as the WSGI application produces them.
+"""
+import asyncio
+import functools
+import io
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+
+from .artifacts import send_artifact
+from .metrics import record_request
+from .registry import create_app as create_wsgi_app
+from .serialization import dumps
+from .terraform_module_registry_api import api
+from .terraform_module_registry_api.backends.asynchronous import as_async
+from .terraform_module_registry_api.exceptions import FileNotFoundException
+
+CHUNK_SIZE = 1024 * 1024
+MODULE_DOWNLOADS = "/dl/module/"
+
+
+class FileSender:
+    """File body of a WSGI response, sent by the event loop.
+
+    Handed to the WSGI application as ``wsgi.file_wrapper``, so responses
+    sending a file can be told apart from other bodies.
+    """
+
+    def __init__(self, fileobj, block_size=CHUNK_SIZE):
+        """Wrap the file.
+
+        Args:
+            fileobj (file): File positioned at the start of the body
+            block_size (int, optional): Bytes read at once. Defaults to 1 MiB.
+        """
+        self.fileobj = fileobj
+        self.block_size = block_size
+
+    def __iter__(self):
+        """Iterate the blocks of the file, for callers expecting WSGI.
+
+        Returns:
+            iterator: The remaining content of the file in blocks
+        """
+        return iter(lambda: self.fileobj.read(self.block_size), b"")
+
+    def close(self):
+        """Close the file."""
+        self.fileobj.close()
+
+
+class Registry:
+    """ASGI application serving the registry."""
+
+    def __init__(self, app, executor=None, accel_prefix=None):
+        """Instantiate the application.
+
+        Args:
+            app (Flask): The WSGI application answering the other requests
+            executor (Executor, optional): Pool running the WSGI application,
+                synchronous backends and file reads. Defaults to None, which
+                creates one.
+            accel_prefix (str, optional): Internal nginx location module
+                downloads are redirected to. Defaults to None.
+        """
+        self.app = app
+        self.executor = executor or ThreadPoolExecutor(thread_name_prefix="terra-store")
+        self.accel_prefix = accel_prefix
+        self.__backend = (None, None)
+
+    async def __call__(self, scope, receive, send):
+        """Handle a connection.
+
+        Args:
+            scope (dict): Connection scope
+            receive (callable): Awaitable returning the next event
+            send (callable): Awaitable sending an event
+        """
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            await send({"type": "websocket.close"})
+            return
+        wsgi_environ = build_environ(scope, await read_body(receive))
+        if scope["path"].startswith(MODULE_DOWNLOADS) \
+                and scope["method"] in ("GET", "HEAD"):
+            status, headers, body = await self.download(
+                wsgi_environ, scope["path"][len(MODULE_DOWNLOADS):])
+        else:
+            status, headers, body = await self.run(call_wsgi, self.app, wsgi_environ)
+        await self.respond(send, status, headers, body)
+
+    def backend(self):
+        """Get the asynchronous interface of the configured module backend.
+
+        Returns:
+            AsyncBackend: The backend
+        """
+        backend, adapter = self.__backend
+        if backend is not api.backend:
+            backend, adapter = api.backend, as_async(api.backend, self.executor)
+            self.__backend = (backend, adapter)
+        return adapter
+
+    async def download(self, wsgi_environ, filepath):
+        """Answer a module download.
+
+        Args:
+            wsgi_environ (dict): WSGI environment of the request
+            filepath (str): Path of the requested file
+
+        Returns:
+            tuple: Status line, headers and body of the response
+        """
+        started = time.perf_counter()
+        try:
+            artifact = await self.backend().download_module(filepath)
+            with self.app.request_context(wsgi_environ):
+                response = send_artifact(artifact, filepath, self.accel_prefix)
+        except FileNotFoundException:
+            body = dumps({
+                "detail": "The requested file was not found on the server.",
+                "status": 404,
+                "title": "File Not Found",
+                "type": "about:blank"
+            })
+            record_request("download", "404", time.perf_counter() - started, len(body))
+            return "404 NOT FOUND", [("Content-Type", "application/problem+json"),
+                                     ("Content-Length", str(len(body)))], [body]
+        record_request("download", response.status,
+                       time.perf_counter() - started,
+                       0 if wsgi_environ["REQUEST_METHOD"] == "HEAD"
+                       else response.content_length or 0)
+        return call_wsgi(response, wsgi_environ)
+
+    async def respond(self, send, status, headers, body):
+        """Send a response.
+
+        Args:
+            send (callable): Awaitable sending an event
+            status (str): Status line
+            headers (list): Header name and value pairs
+            body (iterable): Chunks of the body, a FileSender, or an iterator
+                producing the chunks on the thread pool
+        """
+        await send({"type": "http.response.start",
+                    "status": int(status.split(" ", 1)[0]),
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                for name, value in headers]})
+        try:
+            if isinstance(body, FileSender):
+                remaining = next((int(value) for name, value in headers
+                                  if name.lower() == "content-length"), None)
+                while remaining is None or remaining > 0:
+                    size = body.block_size if remaining is None \
+                        else min(body.block_size, remaining)
+                    chunk = await self.run(body.fileobj.read, size)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk,
+                                "more_body": True})
+            elif isinstance(body, list):
+                for chunk in body:
+                    await send({"type": "http.response.body", "body": chunk,
+                                "more_body": True})
+            else:
+                chunks = iter(body)
+                while True:
+                    chunk = await self.run(next, chunks, None)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        await send({"type": "http.response.body", "body": chunk,
+                                    "more_body": True})
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def lifespan(self, receive, send):
+        """Handle the startup and shutdown of the server.
+
+        Args:
+            receive (callable): Awaitable returning the next event
+            send (callable): Awaitable sending an event
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def run(self, function, *args):
+        """Run a blocking call on the thread pool.
+
+        Args:
+            function (callable): The call
+            args: Arguments of the call
+
+        Returns:
+            object: Result of the call
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          functools.partial(function, *args))
+
+
+async def read_body(receive):
+    """Read the whole request body.
+
+    Args:
+        receive (callable): Awaitable returning the next event
+
+    Returns:
+        bytes: The body
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def build_environ(scope, body):
+    """Build the WSGI environment of a request.
+
+    Args:
+        scope (dict): Connection scope of the request
+        body (bytes): Request body
+
+    Returns:
+        dict: The WSGI environment
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    wsgi_environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/{}".format(scope.get("http_version", "1.1")),
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "wsgi.file_wrapper": FileSender,
+    }
+    for name, value in scope.get("headers", ()):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key == "CONTENT_LENGTH":
+            continue
+        if key != "CONTENT_TYPE":
+            key = "HTTP_" + key
+        if key in wsgi_environ:
+            value = wsgi_environ[key] + "," + value
+        wsgi_environ[key] = value
+    return wsgi_environ
+
+
+def call_wsgi(app, wsgi_environ):
+    """Call a WSGI application and collect its response.
+
+    Args:
+        app (callable): The WSGI application
+        wsgi_environ (dict): WSGI environment of the request
+
+    Returns:
+        tuple: Status line, headers and body of the response, the body is
+        a FileSender for files, the iterable returned by the application
+        for streamed responses without a Content-Length and a list of
+        chunks otherwise
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    result = app(wsgi_environ, start_response)
+    if isinstance(result, FileSender):
+        return started[0], started[1], result
+    if not any(name.lower() == "content-length" for name, _ in started[1]):
+        return started[0], started[1], result
+    try:
+        body = [b"".join(result)]
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started[0], started[1], body
+
+
+def create_app():
+    """Create and configure the ASGI application.
+
+    The application is configured from the environment like the WSGI one.
+
+    Returns:
+        Registry: The ASGI application
+    """
+    return Registry(create_wsgi_app(), accel_prefix=environ.get("accel_redirect_prefix"))
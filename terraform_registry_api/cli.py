@@ -0,0 +1,190 @@
+"""Maintenance commands for a terra-store module tree.
+
+Usage::
+
+    terra-store dedupe PATH             move tarballs into the content addressed store
+    terra-store gc PATH [--grace SECS]  remove blobs no tarball points at
+    terra-store publish PATH SOURCE...  publish the versions of directories or tar
+                                        archives laid out like the module tree
+    terra-store index PATH DATABASE     sync an SQLite catalog with the module tree
+    terra-store compile-specs           validate the API specifications and compile
+                                        them for a faster start
+    terra-store profile-header          print a profile header signed with the
+                                        profile_secret environment variable
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+from os import environ
+from os.path import isdir
+
+from connexion.exceptions import InvalidSpecification
+
+from .profiling import HEADER, MAX_VALIDITY, sign
+from .specs import SPECS, compile_spec, spec_path
+from .terraform_module_registry_api.backends import Filesystem, SQLite
+from .terraform_module_registry_api.backends.ingest import read_archive, read_tree
+from .terraform_module_registry_api.exceptions import (InvalidModuleException,
+                                                       ModuleExistsException)
+
+
+def dedupe(args):
+    """Move the tarballs of a module tree into its blob store.
+
+    Args:
+        args (argparse.Namespace): Parsed command line
+
+    Returns:
+        int: Exit status
+    """
+    moved, freed = Filesystem(args.path).dedupe()
+    print("Moved {} tarballs into the blob store, freed {} bytes".format(moved, freed))
+    return 0
+
+
+def collect(args):
+    """Remove unused blobs from the blob store of a module tree.
+
+    Args:
+        args (argparse.Namespace): Parsed command line
+
+    Returns:
+        int: Exit status
+    """
+    removed = Filesystem(args.path).collect_blobs(args.grace)
+    print("Removed {} unused blobs".format(len(removed)))
+    return 0
+
+
+def publish(args):
+    """Publish the versions of the sources into a module tree in one batch.
+
+    Args:
+        args (argparse.Namespace): Parsed command line
+
+    Returns:
+        int: Exit status
+    """
+    backend = Filesystem(args.path, workers=args.workers)
+    with tempfile.TemporaryDirectory(prefix="terra-store-") as staging:
+        uploads = []
+        try:
+            for source in args.sources:
+                if isdir(source):
+                    uploads.extend(read_tree(source))
+                else:
+                    with open(source, "rb") as archive:
+                        unpacked = tempfile.mkdtemp(dir=staging)
+                        uploads.extend(read_archive(archive, unpacked))
+            backend.publish(uploads)
+        except (InvalidModuleException, ModuleExistsException) as error:
+            print(error.message, file=sys.stderr)
+            return 1
+    print("Published {} versions".format(len(uploads)))
+    return 0
+
+
+def index(args):
+    """Sync an SQLite catalog with a module tree.
+
+    Args:
+        args (argparse.Namespace): Parsed command line
+
+    Returns:
+        int: Exit status
+    """
+    written, removed = SQLite(args.path, args.database, sync=False).sync()
+    print("Wrote {} modules, removed {} modules".format(written, removed))
+    return 0
+
+
+def compile_specs(args):
+    """Validate API specifications and write their compiled form.
+
+    Args:
+        args (argparse.Namespace): Parsed command line
+
+    Returns:
+        int: Exit status
+    """
+    for path in args.specs or [spec_path(spec) for spec in SPECS]:
+        try:
+            print("Compiled {}".format(compile_spec(path)))
+        except InvalidSpecification as invalid:
+            print("{} is invalid: {}".format(path, invalid), file=sys.stderr)
+            return 1
+    return 0
+
+
+def profile_header(args):
+    """Print a header requesting a profile of the request carrying it.
+
+    Args:
+        args (argparse.Namespace): Parsed command line
+
+    Returns:
+        int: Exit status
+    """
+    secret = environ.get("profile_secret")
+    if not secret:
+        print("profile_secret is not set", file=sys.stderr)
+        return 1
+    if not 0 < args.ttl <= MAX_VALIDITY:
+        print("ttl must be between 1 and {} seconds".format(MAX_VALIDITY),
+              file=sys.stderr)
+        return 1
+    print("{}: {}".format(HEADER, sign(secret, int(time.time()) + args.ttl)))
+    return 0
+
+
+def main(argv=None):
+    """Run a command.
+
+    Args:
+        argv (list, optional): Command line arguments. Defaults to None,
+            which uses sys.argv.
+
+    Returns:
+        int: Exit status
+    """
+    parser = argparse.ArgumentParser(prog="terra-store",
+                                     description="Maintain a terra-store module tree.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("dedupe", help="move tarballs into the blob store")
+    command.add_argument("path", help="root of the module tree")
+    command.set_defaults(run=dedupe)
+    command = commands.add_parser("gc", help="remove blobs no tarball points at")
+    command.add_argument("path", help="root of the module tree")
+    command.add_argument("--grace", type=float, default=3600,
+                         help="seconds new blobs are kept, they may be being "
+                              "published (default 3600)")
+    command.set_defaults(run=collect)
+    command = commands.add_parser("publish", help="publish module versions")
+    command.add_argument("path", help="root of the module tree")
+    command.add_argument("sources", nargs="+", metavar="source",
+                         help="directory or tar archive laid out like the module tree")
+    command.add_argument("--workers", type=int, default=None,
+                         help="threads checking and storing tarballs")
+    command.set_defaults(run=publish)
+    command = commands.add_parser("index", help="sync an SQLite catalog with the tree")
+    command.add_argument("path", help="root of the module tree")
+    command.add_argument("database", help="SQLite catalog, created if missing")
+    command.set_defaults(run=index)
+    command = commands.add_parser("compile-specs",
+                                  help="validate and compile the API specifications")
+    command.add_argument("specs", nargs="*", metavar="spec",
+                         help="swagger.yml to compile (default those of the registry)")
+    command.set_defaults(run=compile_specs)
+    command = commands.add_parser("profile-header",
+                                  help="print a signed header profiling a request")
+    command.add_argument("--ttl", type=int, default=300,
+                         help="seconds the header is valid (default 300)")
+    command.set_defaults(run=profile_header)
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Gunicorn configuration serving the registry from several processes.
+
+Usage::
+
+    gunicorn -c python:terraform_registry_api.gunicorn_config
+
+The application is loaded once in the master process, so the module tree is
+scanned once and the catalog is shared copy-on-write by all workers instead
+of being built by each of them. A catalog restored from a catalog file is
+reconciled with the tree before the first worker is forked. Objects that
+exist at fork time are frozen out of garbage collection, which would
+otherwise touch and so copy the shared pages. Each worker restarts the
+background work of the backend, such as watching the tree, once forked.
+
+The workers share their metrics through a metrics directory, so a scrape of
+/metrics answered by any worker reports the metrics of all of them.
+
+Configured through environment variables:
+
+    server_bind     Address to listen on (default 0.0.0.0:8080)
+    server_workers  Number of worker processes (default one per CPU)
+    server_threads  Threads per worker process (default 4)
+    metrics_dir     Directory the workers share their metrics in (default a
+                    temporary directory removed on exit)
+    metrics_interval
+                    Seconds between writes of the metrics of a worker
+                    (default 5)
+"""
+import gc
+import multiprocessing
+import shutil
+import tempfile
+
+from os import environ
+
+from terraform_registry_api.metrics import metric_registry
+from terraform_registry_api.terraform_module_registry_api import api
+
+wsgi_app = "terraform_registry_api.registry:create_app()"
+bind = environ.get("server_bind", "0.0.0.0:8080")
+workers = int(environ.get("server_workers", multiprocessing.cpu_count()))
+threads = int(environ.get("server_threads", 4))
+preload_app = True
+
+
+def on_starting(server):
+    """Set up the metrics directory shared by the workers.
+
+    Args:
+        server (Arbiter): The gunicorn master
+    """
+    directory = environ.get("metrics_dir") \
+        or tempfile.mkdtemp(prefix="terra-store-metrics-")
+    metric_registry.set_directory(directory,
+                                  float(environ.get("metrics_interval", 5)))
+
+
+def on_exit(server):
+    """Remove the metrics directory, unless it was configured.
+
+    Args:
+        server (Arbiter): The gunicorn master
+    """
+    if environ.get("metrics_dir") is None and metric_registry.directory is not None:
+        shutil.rmtree(metric_registry.directory, ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    """Prepare the loaded application before forking a worker.
+
+    Background work of the backend is finished, the metrics recorded so far
+    are written and the objects of the application are frozen.
+
+    Args:
+        server (Arbiter): The gunicorn master
+        worker (Worker): The worker about to be forked
+    """
+    api.before_fork()
+    metric_registry.flush()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Restart the background work of the backend in a forked worker.
+
+    Args:
+        server (Arbiter): The gunicorn master
+        worker (Worker): The forked worker
+    """
+    api.after_fork()
+    metric_registry.after_fork()
+
+
+def worker_exit(server, worker):
+    """Write the last metrics of an exiting worker.
+
+    Args:
+        server (Arbiter): The gunicorn master
+        worker (Worker): The exiting worker
+    """
+    metric_registry.flush()
@@ -0,0 +1,704 @@
+"""Prometheus metrics of the registry.
+
+Metrics are kept in memory by each process and rendered in the Prometheus
+text format on /metrics. Recording a sample is a dictionary lookup, a lock
+and a few additions, label values of the hot paths are resolved once and
+kept, so instrumentation does not show up in request latency.
+
+Processes sharing a metrics directory, such as the workers of gunicorn,
+write their metrics to a file of their own in it every few seconds, and a
+scrape answered by any of them renders the metrics of all of them: counters
+and histograms are summed, gauges take their largest value. Files of
+workers which exited are kept, so counters never go backwards.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+from bisect import bisect_left
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPERATION = "terra_store.operation"
+UNMATCHED = "unmatched"
+
+logger = logging.getLogger(__name__)
+
+
+class CounterValue:
+    """Value of a counter for one set of label values."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        """Start the counter at zero."""
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Increment the counter.
+
+        Args:
+            amount (int, optional): Amount to add. Defaults to 1.
+        """
+        with self._lock:
+            self.value += amount
+
+    def state(self):
+        """Get the value in a form which can be written as JSON.
+
+        Returns:
+            int: The count
+        """
+        return self.value
+
+    def merge(self, state):
+        """Add the value of another process.
+
+        Args:
+            state (int): The count of the other process
+        """
+        self.value += state
+
+    def reset(self):
+        """Start the counter again at zero."""
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def samples(self, name, labels):
+        """Render the samples of the value.
+
+        Args:
+            name (str): Name of the metric
+            labels (str): Rendered labels of the value
+
+        Returns:
+            list: Lines of the text format
+        """
+        return ["{}{} {}".format(name, braces(labels), self.value)]
+
+
+class GaugeValue:
+    """Value of a gauge for one set of label values."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        """Start the gauge at zero."""
+        self.value = 0
+
+    def set(self, value):
+        """Set the gauge.
+
+        Args:
+            value (float): The new value
+        """
+        self.value = value
+
+    def state(self):
+        """Get the value in a form which can be written as JSON.
+
+        Returns:
+            float: The value
+        """
+        return self.value
+
+    def merge(self, state):
+        """Combine the value with the one of another process.
+
+        Args:
+            state (float): The value of the other process
+        """
+        self.value = max(self.value, state)
+
+    def reset(self):
+        """Start the gauge again at zero."""
+        self.value = 0
+
+    def samples(self, name, labels):
+        """Render the samples of the value.
+
+        Args:
+            name (str): Name of the metric
+            labels (str): Rendered labels of the value
+
+        Returns:
+            list: Lines of the text format
+        """
+        return ["{}{} {!r}".format(name, braces(labels), self.value)]
+
+
+class HistogramValue:
+    """Observations of a histogram for one set of label values."""
+
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        """Start the histogram without observations.
+
+        Args:
+            buckets (tuple): Sorted upper bounds of the buckets
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record an observation.
+
+        Args:
+            value (float): The observed value
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def state(self):
+        """Get the observations in a form which can be written as JSON.
+
+        Returns:
+            list: The count of each bucket and the sum
+        """
+        with self._lock:
+            return [list(self.counts), self.sum]
+
+    def merge(self, state):
+        """Add the observations of another process.
+
+        Args:
+            state (list): The count of each bucket and the sum of the other
+                process
+        """
+        counts, total = state
+        self.counts = [count + other for count, other in zip(self.counts, counts)]
+        self.sum += total
+
+    def reset(self):
+        """Drop all observations."""
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def samples(self, name, labels):
+        """Render the samples of the value.
+
+        Args:
+            name (str): Name of the metric
+            labels (str): Rendered labels of the value
+
+        Returns:
+            list: Lines of the text format
+        """
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, counts):
+            cumulative += count
+            lines.append("{}_bucket{} {}".format(
+                name, braces(join_labels(labels, 'le="{}"'.format(bound))),
+                cumulative))
+        lines.append("{}_sum{} {!r}".format(name, braces(labels), total))
+        lines.append("{}_count{} {}".format(name, braces(labels), cumulative))
+        return lines
+
+
+class Metric:
+    """A metric and its values by label values."""
+
+    def __init__(self, kind, name, documentation, labelnames=(), buckets=BUCKETS):
+        """Instantiate a metric.
+
+        Args:
+            kind (str): counter, gauge or histogram
+            name (str): Name of the metric
+            documentation (str): Help text of the metric
+            labelnames (tuple, optional): Names of the labels. Defaults to ().
+            buckets (tuple, optional): Upper bounds of the buckets of a
+                histogram. Defaults to BUCKETS.
+        """
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Get the value for a set of label values.
+
+        Args:
+            values (str): Value of each label, in the order of the names
+
+        Raises:
+            ValueError: Raised if the number of values does not match
+
+        Returns:
+            CounterValue|GaugeValue|HistogramValue: The value, created if it
+            is new
+        """
+        value = self._values.get(values)
+        if value is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError("{} takes the labels {}".format(
+                    self.name, ", ".join(self.labelnames)))
+            with self._lock:
+                value = self._values.get(values)
+                if value is None:
+                    if self.kind == "histogram":
+                        value = HistogramValue(self.buckets)
+                    elif self.kind == "gauge":
+                        value = GaugeValue()
+                    else:
+                        value = CounterValue()
+                    self._values[values] = value
+        return value
+
+    def copy(self):
+        """Create a metric with the same definition and no values.
+
+        Returns:
+            Metric: The empty metric
+        """
+        return Metric(self.kind, self.name, self.documentation, self.labelnames,
+                      self.buckets)
+
+    def state(self):
+        """Get the values in a form which can be written as JSON.
+
+        Returns:
+            list: Label values and state of each value
+        """
+        with self._lock:
+            values = list(self._values.items())
+        return [[list(label_values), value.state()] for label_values, value in values]
+
+    def merge(self, state):
+        """Add the values of another process.
+
+        Args:
+            state (list): Label values and state of each value, as returned
+                by state
+        """
+        for label_values, value in state:
+            self.labels(*label_values).merge(value)
+
+    def reset(self):
+        """Reset every value in place, values held by callers stay valid."""
+        self._lock = threading.Lock()
+        for value in self._values.values():
+            value.reset()
+
+    def render(self):
+        """Render the metric.
+
+        Returns:
+            list: Lines of the text format
+        """
+        lines = ["# HELP {} {}".format(self.name, self.documentation),
+                 "# TYPE {} {}".format(self.name, self.kind)]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = ",".join('{}="{}"'.format(name, escape_label(label))
+                              for name, label in zip(self.labelnames, label_values))
+            lines.extend(value.samples(self.name, labels))
+        return lines
+
+
+class Registry:
+    """Collection of the metrics exposed together."""
+
+    def __init__(self):
+        """Instantiate an empty registry."""
+        self.metrics = []
+        self.directory = None
+        self.interval = None
+        self.path = None
+
+    def counter(self, name, documentation, labelnames=()):
+        """Create a counter.
+
+        Args:
+            name (str): Name of the metric
+            documentation (str): Help text of the metric
+            labelnames (tuple, optional): Names of the labels. Defaults to ().
+
+        Returns:
+            Metric: The counter
+        """
+        metric = Metric("counter", name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, labelnames=()):
+        """Create a gauge.
+
+        Args:
+            name (str): Name of the metric
+            documentation (str): Help text of the metric
+            labelnames (tuple, optional): Names of the labels. Defaults to ().
+
+        Returns:
+            Metric: The gauge
+        """
+        metric = Metric("gauge", name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=BUCKETS):
+        """Create a histogram.
+
+        Args:
+            name (str): Name of the metric
+            documentation (str): Help text of the metric
+            labelnames (tuple, optional): Names of the labels. Defaults to ().
+            buckets (tuple, optional): Upper bounds of the buckets.
+                Defaults to BUCKETS.
+
+        Returns:
+            Metric: The histogram
+        """
+        metric = Metric("histogram", name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def set_directory(self, directory, interval=5.0):
+        """Share the metrics with the other processes using a directory.
+
+        Metrics files left behind in the directory by earlier runs are
+        removed, so this is called once, before worker processes are forked.
+
+        Args:
+            directory (str): Directory the metrics of each process are written
+                to, created if it does not exist
+            interval (float, optional): Seconds between writes of the metrics
+                of a process. Defaults to 5.0.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".json"):
+                os.unlink(entry.path)
+        self.directory = directory
+        self.interval = interval
+        self.path = self.__metrics_path()
+
+    def __metrics_path(self):
+        """Pick the file the metrics of this process are written to.
+
+        Returns:
+            str: Location of the file, unique even if the pid is reused
+        """
+        return os.path.join(self.directory, "{}-{}.json".format(
+            os.getpid(), time.time_ns()))
+
+    def flush(self):
+        """Write the metrics recorded so far, if they are shared."""
+        if self.directory is not None:
+            self.write()
+
+    def after_fork(self):
+        """Start the metrics of a forked worker process.
+
+        The values inherited from the parent are already in the file of the
+        parent, so they are reset and the worker writes them to a file of its
+        own from a background thread.
+        """
+        if self.directory is None:
+            return
+        for metric in self.metrics:
+            metric.reset()
+        self.path = self.__metrics_path()
+        threading.Thread(target=self.__write_periodically, name="terra-store-metrics",
+                         daemon=True).start()
+
+    def __write_periodically(self):
+        """Write the metrics every interval."""
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write()
+            except OSError:
+                logger.exception("Writing the metrics to %s failed", self.path)
+
+    def write(self):
+        """Write the metrics of this process to its file in the directory."""
+        state = {metric.name: metric.state() for metric in self.metrics}
+        staging = "{}.{}.tmp".format(self.path, threading.get_ident())
+        with open(staging, "w") as metrics_file:
+            json.dump(state, metrics_file)
+        os.replace(staging, self.path)
+
+    def collect(self):
+        """Merge the metrics of all processes sharing the directory.
+
+        Returns:
+            list: Metrics holding the values of all processes
+        """
+        self.write()
+        merged = [metric.copy() for metric in self.metrics]
+        by_name = {metric.name: metric for metric in merged}
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as metrics_file:
+                    state = json.load(metrics_file)
+            except (OSError, ValueError):
+                logger.warning("Skipping unreadable metrics file %s", entry.path)
+                continue
+            for name, values in state.items():
+                if name in by_name:
+                    by_name[name].merge(values)
+        return merged
+
+    def render(self):
+        """Render all metrics in the Prometheus text format.
+
+        With a metrics directory the metrics of all processes sharing it are
+        rendered, otherwise those of this process.
+
+        Returns:
+            bytes: The exposition
+        """
+        metrics = self.collect() if self.directory is not None else self.metrics
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+metric_registry = Registry()
+requests = metric_registry.counter(
+    "terra_store_requests_total", "Requests answered, by operation and status.",
+    ("operation", "status"))
+request_duration = metric_registry.histogram(
+    "terra_store_request_duration_seconds",
+    "Time taken to build the response of a request, by operation.", ("operation",))
+response_bytes = metric_registry.counter(
+    "terra_store_response_bytes_total", "Bytes of response bodies, by operation.",
+    ("operation",))
+backend_duration = metric_registry.histogram(
+    "terra_store_backend_call_duration_seconds",
+    "Time taken by backend calls, by api and method.", ("api", "method"))
+cache_lookups = metric_registry.counter(
+    "terra_store_response_cache_lookups_total",
+    "Lookups in the response cache, by result.", ("result",))
+download_bytes = metric_registry.counter(
+    "terra_store_download_bytes_total",
+    "Bytes of module and provider artifacts downloaded.").labels()
+startup_duration = metric_registry.gauge(
+    "terra_store_startup_seconds",
+    "Time taken to start the application, by phase.", ("phase",))
+
+
+class TimedBackend:
+    """Record the duration of each call made to a backend.
+
+    Every other attribute of the backend is passed through, so the wrapper
+    can stand in for the backend it wraps.
+    """
+
+    def __init__(self, backend, api):
+        """Wrap a backend.
+
+        Args:
+            backend (object): The backend answering the calls
+            api (str): Name of the api the backend serves, used as label
+        """
+        self.backend = backend
+        self.api = api
+
+    def __getattr__(self, name):
+        """Look up an attribute of the backend.
+
+        Public methods are wrapped to time their calls, the wrappers are kept
+        so later lookups do not come back here.
+
+        Args:
+            name (str): Name of the attribute
+
+        Returns:
+            object: The attribute, or the timed method
+        """
+        attribute = getattr(self.backend, name)
+        if name.startswith("_") or not inspect.ismethod(attribute):
+            return attribute
+        histogram = backend_duration.labels(self.api, name)
+
+        @functools.wraps(attribute)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        setattr(self, name, timed)
+        return timed
+
+
+class MetricsMiddleware:
+    """WSGI middleware recording the requests answered by the application."""
+
+    def __init__(self, app):
+        """Wrap the application.
+
+        Args:
+            app (callable): The WSGI application
+        """
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        """Answer a request and record it.
+
+        The request is recorded once the application returned its response,
+        or, for streamed responses without a Content-Length, once the body
+        has been sent.
+
+        Args:
+            environ (dict): WSGI environment of the request
+            start_response (callable): Starts the response
+
+        Returns:
+            iterable: The response body
+        """
+        started = time.perf_counter()
+        response = []
+
+        def record_start(status, headers, exc_info=None):
+            response[:] = [status, headers]
+            return start_response(status, headers, exc_info)
+
+        result = self.app(environ, record_start)
+        length = None
+        if response:
+            length = next((value for name, value in response[1]
+                           if name.lower() == "content-length"), None)
+        if not response or (length is None and environ["REQUEST_METHOD"] != "HEAD"):
+            return CountedBody(result, environ, response, started)
+        record_request(environ.get(OPERATION, UNMATCHED), response[0],
+                       time.perf_counter() - started,
+                       0 if environ["REQUEST_METHOD"] == "HEAD" else int(length))
+        return result
+
+
+class CountedBody:
+    """Streamed response body counting the bytes sent."""
+
+    def __init__(self, body, environ, response, started):
+        """Wrap the body.
+
+        Args:
+            body (iterable): Body returned by the application
+            environ (dict): WSGI environment of the request
+            response (list): Status line and headers, once started
+            started (float): perf_counter value when the request came in
+        """
+        self.body = body
+        self.environ = environ
+        self.response = response
+        self.started = started
+        self.size = 0
+
+    def __iter__(self):
+        """Iterate the chunks of the body.
+
+        Yields:
+            bytes: The next chunk
+        """
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        """Close the body and record the request."""
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            record_request(self.environ.get(OPERATION, UNMATCHED),
+                           self.response[0] if self.response else "500",
+                           time.perf_counter() - self.started, self.size)
+
+
+def record_request(operation, status, seconds, size):
+    """Record an answered request.
+
+    Args:
+        operation (str): operationId of the route, or its endpoint name
+        status (str): Status line of the response
+        seconds (float): Time taken to answer
+        size (int): Bytes of the response body
+    """
+    requests.labels(operation, status.split(" ", 1)[0]).inc()
+    request_duration.labels(operation).observe(seconds)
+    response_bytes.labels(operation).inc(size)
+
+
+def operation_ids(app):
+    """Map the endpoints of a Flask application to their operationId.
+
+    Connexion routes are named after the operationId of the handler, other
+    routes keep their endpoint name.
+
+    Args:
+        app (Flask): The application
+
+    Returns:
+        dict: Endpoint name mapped to the operation label
+    """
+    operations = {}
+    for endpoint, view in app.view_functions.items():
+        handler = inspect.unwrap(view)
+        if "<locals>" in handler.__qualname__ or "." not in endpoint:
+            operations[endpoint] = endpoint.rpartition(".")[2]
+        else:
+            operations[endpoint] = "{}.{}".format(handler.__module__,
+                                                  handler.__qualname__)
+    return operations
+
+
+def braces(labels):
+    """Enclose rendered labels in braces.
+
+    Args:
+        labels (str): Rendered labels, may be empty
+
+    Returns:
+        str: The labels in braces, or an empty string
+    """
+    return "{" + labels + "}" if labels else ""
+
+
+def join_labels(*labels):
+    """Join rendered labels.
+
+    Args:
+        labels (str): Rendered labels, may be empty
+
+    Returns:
+        str: The labels separated by commas
+    """
+    return ",".join(label for label in labels if label)
+
+
+def escape_label(value):
+    """Escape a label value for the text format.
+
+    Args:
+        value (str): The label value
+
+    Returns:
+        str: The escaped value
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
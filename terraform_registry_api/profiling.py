@@ -0,0 +1,136 @@
+"""Opt-in profiling of single requests.
+
+ProfilingMiddleware runs the dispatch of selected requests under cProfile,
+saves the profile in pstats format for offline analysis, e.g. with
+``python -m pstats`` or snakeviz, and reports the time taken and the name
+of the saved profile in a Server-Timing header. The middleware is only
+installed when a profile directory is configured, so the registry does not
+pay anything for it otherwise.
+
+Requests are profiled either all of them, or those carrying a header signed
+with the profile secret::
+
+    X-Terra-Store-Profile: <expiry>:<hex HMAC-SHA256 of expiry>
+
+where expiry is a unix timestamp, which ``terra-store profile-header``
+prints for the secret in the environment.
+"""
+import cProfile
+import hashlib
+import hmac
+import os
+import time
+import uuid
+
+from datetime import datetime, timezone
+
+from .metrics import OPERATION
+
+HEADER = "X-Terra-Store-Profile"
+MAX_VALIDITY = 3600
+
+
+class ProfilingMiddleware:
+    """WSGI middleware profiling the dispatch of selected requests."""
+
+    def __init__(self, app, directory, secret=None, profile_all=False):
+        """Wrap the application.
+
+        Args:
+            app (callable): The WSGI application
+            directory (str): Directory the profiles are saved in
+            secret (str, optional): Secret signing the profile header.
+                Defaults to None, which ignores the header.
+            profile_all (bool, optional): Profile every request.
+                Defaults to False.
+        """
+        self.app = app
+        self.directory = directory
+        self.secret = secret
+        self.profile_all = profile_all
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, environ, start_response):
+        """Answer a request, profiling it if selected.
+
+        The response is started once the application returned, so the
+        Server-Timing header can carry the time taken by the dispatch.
+
+        Args:
+            environ (dict): WSGI environment of the request
+            start_response (callable): Starts the response
+
+        Returns:
+            iterable: The response body
+        """
+        if not self.profile_all and not verify_header(
+                self.secret, environ.get("HTTP_X_TERRA_STORE_PROFILE")):
+            return self.app(environ, start_response)
+        response = []
+
+        def defer_start(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        result = profile.runcall(self.app, environ, defer_start)
+        elapsed = time.perf_counter() - started
+        name = self.save(profile, environ.get(OPERATION, "request"))
+        status, headers, exc_info = response
+        headers = list(headers) + [
+            ("Server-Timing", 'app;dur={:.3f};desc="{}"'.format(elapsed * 1000, name))]
+        start_response(status, headers, exc_info)
+        return result
+
+    def save(self, profile, operation):
+        """Save a profile.
+
+        Args:
+            profile (cProfile.Profile): The finished profile
+            operation (str): Operation of the profiled request
+
+        Returns:
+            str: File name of the profile within the directory
+        """
+        name = "{:%Y%m%dT%H%M%S}-{}-{}.prof".format(
+            datetime.now(timezone.utc), operation.rpartition(".")[2],
+            uuid.uuid4().hex[:8])
+        profile.dump_stats(os.path.join(self.directory, name))
+        return name
+
+
+def sign(secret, expiry):
+    """Sign the expiry of a profile header.
+
+    Args:
+        secret (str): The profile secret
+        expiry (int): Unix timestamp until which the header is valid
+
+    Returns:
+        str: Value of the profile header
+    """
+    signature = hmac.new(secret.encode(), str(expiry).encode(), hashlib.sha256)
+    return "{}:{}".format(expiry, signature.hexdigest())
+
+
+def verify_header(secret, value, now=None):
+    """Check a profile header.
+
+    Args:
+        secret (str): The profile secret, None rejects every header
+        value (str): Value of the header, None if it is missing
+        now (float, optional): Current unix time. Defaults to None, which
+            uses the clock.
+
+    Returns:
+        bool: True if the header is signed with the secret and valid now
+    """
+    if not secret or not value:
+        return False
+    expiry, _, _ = value.partition(":")
+    if not expiry.isdigit():
+        return False
+    now = time.time() if now is None else now
+    if not now <= int(expiry) <= now + MAX_VALIDITY:
+        return False
+    return hmac.compare_digest(value.encode(), sign(secret, int(expiry)).encode())
@@ -1,16 +1,25 @@
-import json
+import logging
+import time
+
 import connexion
-from flask import request, make_response
+from flask import Response, request, make_response
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-from connexion.exceptions import NonConformingResponse, BadRequestProblem, \
-    ResolverProblem
-from flask.helpers import send_file
+from connexion.exceptions import BadRequestProblem, ResolverProblem
 from os import environ
 
+from . import STARTED, metrics
+from .artifacts import send_artifact
+from .profiling import ProfilingMiddleware
+from .serialization import dumps, set_encoder
+from .specs import add_api
 from .terraform_module_registry_api import api
+from .terraform_provider_registry_api import api as provider_api
 from .terraform_module_registry_api.exceptions import FileNotFoundException
 
+IMPORTED = time.perf_counter()
+logger = logging.getLogger(__name__)
+
 
 def create_app():
     """Create and configure Flask API.
@@ -20,15 +29,39 @@ def create_app():
     Returns:
         FlaskApp: The intialized FlaskApp Server
     """
+    started = time.perf_counter()
     # Create the application instance
     app = connexion.App(__name__, specification_dir="./")
     app.app.wsgi_app = ProxyFix(app.app.wsgi_app)
+    if environ.get("profile_dir") is not None:
+        app.app.wsgi_app = ProfilingMiddleware(
+            app.app.wsgi_app, environ.get("profile_dir"),
+            secret=environ.get("profile_secret"),
+            profile_all=environ.get("profile_all", "false").lower() == "true")
+    app.app.wsgi_app = metrics.MetricsMiddleware(app.app.wsgi_app)
 
     if environ.get("fs_path") is not None:
         api.set_backend("Filesystem")
+    elif environ.get("sqlite_database") is not None:
+        api.set_backend("SQLite")
+    elif environ.get("s3_bucket") is not None:
+        api.set_backend("S3")
+    elif environ.get("proxy_upstream") is not None:
+        api.set_backend("Proxy")
+    api.set_cache(int(environ.get("cache_size", 1024)),
+                  float(environ.get("cache_ttl", 300)))
+    api.set_publish_token(environ.get("publish_token"))
+    api.set_stream_listings(environ.get("stream_listings", "false").lower() == "true")
+    set_encoder(environ.get("json_encoder", "auto"))
+    accel_prefix = environ.get("accel_redirect_prefix")
+    if environ.get("fs_provider_path") is not None:
+        provider_api.set_backend("Filesystem")
+    provider_accel_prefix = environ.get("provider_accel_redirect_prefix")
+    configured = time.perf_counter()
 
-    # Read the swagger.yml file to configure the endpoints
-    app.add_api("terraform_module_registry_api/swagger.yml")
+    # Read the swagger.yml files, or their compiled form, to configure the endpoints
+    add_api(app, "terraform_module_registry_api/swagger.yml")
+    add_api(app, "terraform_provider_registry_api/swagger.yml", pythonic_params=True)
 
     @app.route("/.well-known/terraform.json")
     def service_discovery():
@@ -37,32 +70,71 @@ def create_app():
         Returns:
             json: Descprion of the supported apis and the base urls
         """
-        print(request.url)
         services = {
             "modules.v1": "{root}v1/modules".format(root=request.url_root),
             "providers.v1": "{root}v1/providers".format(root=request.url_root)
         }
-        resp = make_response(json.dumps(services), 200)
+        resp = make_response(dumps(services), 200)
         resp.content_type = "application/json"
         return resp
 
     @app.route("/dl/<modtype>/<path:filepath>")
     def download(modtype, filepath):
-        if modtype == "module":
-            try:
+        try:
+            if modtype == "module":
                 requested = api.download_module(filepath)
-            except FileNotFoundException:
-                raise ResolverProblem(
-                    status=404,
-                    title="File Not Found",
-                    detail="The requested file was not found on the server.")
-        elif modtype == "provider":
-            raise NonConformingResponse(
-                reason="Not Yet Supported",
-                message="The provider type is not yet supported")
-        else:
-            raise BadRequestProblem(
-                detail="Type is not valid: Valid Types are [module|provider]")
-        return send_file(requested)
+                return send_artifact(requested, filepath, accel_prefix)
+            elif modtype == "provider":
+                requested = provider_api.download_provider(filepath)
+                return send_artifact(requested, filepath, provider_accel_prefix)
+        except FileNotFoundException:
+            raise ResolverProblem(
+                status=404,
+                title="File Not Found",
+                detail="The requested file was not found on the server.")
+        raise BadRequestProblem(
+            detail="Type is not valid: Valid Types are [module|provider]")
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        """Metrics Endpoint.
+
+        Returns:
+            response: The metrics in the Prometheus text format
+        """
+        return Response(metrics.metric_registry.render(), 200,
+                        content_type=metrics.CONTENT_TYPE)
 
+    operations = metrics.operation_ids(app.app)
+
+    @app.app.before_request
+    def label_operation():
+        """Label the request with the operation it is routed to."""
+        request.environ[metrics.OPERATION] = operations.get(request.endpoint,
+                                                            metrics.UNMATCHED)
+
+    record_startup({"imports": IMPORTED - STARTED, "backends": configured - started,
+                    "apis": time.perf_counter() - configured},
+                   environ.get("startup_budget"))
     return app.app
+
+
+def record_startup(phases, budget=None):
+    """Record the time taken to start the application.
+
+    Args:
+        phases (dict): Seconds taken by each phase of the startup
+        budget (str, optional): Seconds the startup may take, a warning is
+            logged if it takes longer. Defaults to None, which logs the
+            timings at debug level only.
+    """
+    total = sum(phases.values())
+    for phase, seconds in dict(phases, total=total).items():
+        metrics.startup_duration.labels(phase).set(seconds)
+    timings = ", ".join("{} {:.3f}s".format(phase, seconds)
+                        for phase, seconds in phases.items())
+    if budget is not None and total > float(budget):
+        logger.warning("Started in %.3fs, over the budget of %ss (%s)", total, budget,
+                       timings)
+    else:
+        logger.debug("Started in %.3fs (%s)", total, timings)
@@ -0,0 +1,78 @@
+"""JSON encoding of API responses.
+
+Responses are encoded with orjson when it is installed and with the
+standard library otherwise, set_encoder picks one explicitly. Both encoders
+write compact UTF-8 encoded JSON, so responses do not depend on which one
+is used.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def stdlib_dumps(obj):
+    """Encode an object with the standard library.
+
+    Args:
+        obj (object): Object made of dicts, lists, strings, numbers and None
+
+    Returns:
+        bytes: The JSON document
+    """
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+encoder = stdlib_dumps
+
+
+def dumps(obj):
+    """Encode an object as JSON.
+
+    Args:
+        obj (object): Object made of dicts, lists, strings, numbers and None
+
+    Returns:
+        bytes: The JSON document
+    """
+    return encoder(obj)
+
+
+def escape(value):
+    """Encode a string for use inside a JSON string.
+
+    Args:
+        value (str): The string
+
+    Returns:
+        bytes: The encoded string, without quotes
+    """
+    return encoder(value)[1:-1]
+
+
+def set_encoder(name="auto"):
+    """Choose the JSON encoder.
+
+    Args:
+        name (str, optional): orjson, json for the standard library or auto
+            to use orjson if it is installed. Defaults to auto.
+
+    Raises:
+        ImportError: Raised if orjson is requested but not installed
+        ValueError: Raised if the name is unknown
+    """
+    global encoder
+    if name not in ("auto", "orjson", "json"):
+        raise ValueError("Unknown JSON encoder {}".format(name))
+    if name == "orjson" and orjson is None:
+        raise ImportError("The orjson encoder requires orjson, install "
+                          "terraform_registry_api[orjson]")
+    if name != "json" and orjson is not None:
+        encoder = orjson.dumps
+    else:
+        encoder = stdlib_dumps
+
+
+set_encoder()
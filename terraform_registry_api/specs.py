@@ -0,0 +1,136 @@
+"""Compiled API specifications.
+
+Connexion parses the swagger.yml of each API whenever an application is
+created, which takes a good part of the startup time. A specification is
+compiled once, e.g. when the container image is built with
+``terra-store compile-specs``: it is validated and written as JSON next to
+the YAML file, together with the sha256 digest of the YAML it was compiled
+from. The compiled specification is handed to connexion in place of the
+YAML file while the digest matches.
+"""
+import copy
+import hashlib
+import json
+import os
+import uuid
+
+from os.path import join, dirname, splitext
+
+import yaml
+
+from connexion.spec import Specification
+
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Specifications of the registry, relative to the package
+SPECS = ("terraform_module_registry_api/swagger.yml",
+         "terraform_provider_registry_api/swagger.yml")
+
+
+def spec_path(spec):
+    """Locate a specification of the registry.
+
+    Args:
+        spec (str): Path of the specification relative to the package
+
+    Returns:
+        str: Absolute path of the YAML file
+    """
+    return join(dirname(os.path.abspath(__file__)), spec)
+
+
+def compiled_path(path):
+    """Locate the compiled form of a specification.
+
+    Args:
+        path (str): Path of the YAML file
+
+    Returns:
+        str: Path of the JSON file
+    """
+    return splitext(path)[0] + ".json"
+
+
+def source_digest(path):
+    """Hash a specification.
+
+    Args:
+        path (str): Path of the YAML file
+
+    Returns:
+        str: Hex sha256 digest of the file
+    """
+    with open(path, "rb") as source:
+        return hashlib.sha256(source.read()).hexdigest()
+
+
+def compile_spec(path):
+    """Validate a specification and write its compiled form.
+
+    Args:
+        path (str): Path of the YAML file
+
+    Raises:
+        InvalidSpecification: Raised if the specification is invalid
+
+    Returns:
+        str: Path of the compiled specification
+    """
+    with open(path, "rb") as source:
+        content = source.read()
+    # the round trip through JSON turns all keys into strings, as connexion does
+    spec = json.loads(json.dumps(yaml.load(content, Loader=SafeLoader)))
+    Specification.from_dict(copy.deepcopy(spec))
+    target = compiled_path(path)
+    staging = "{}.{}.tmp".format(target, uuid.uuid4().hex)
+    try:
+        with open(staging, "w", encoding="utf-8") as compiled:
+            json.dump({"source": hashlib.sha256(content).hexdigest(), "spec": spec},
+                      compiled)
+        os.replace(staging, target)
+    except BaseException:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+    return target
+
+
+def load_compiled(path):
+    """Load the compiled form of a specification.
+
+    Args:
+        path (str): Path of the YAML file
+
+    Returns:
+        dict: The specification, None if it is not compiled or was compiled
+        from another version of the YAML file
+    """
+    try:
+        with open(compiled_path(path), encoding="utf-8") as compiled:
+            compiled = json.load(compiled)
+    except (OSError, ValueError):
+        return None
+    if compiled.get("source") != source_digest(path):
+        return None
+    return compiled.get("spec")
+
+
+def add_api(app, spec, **kwargs):
+    """Add an API to a connexion application, from its compiled specification.
+
+    The YAML file is parsed by connexion if the specification is not
+    compiled, or the compiled form is out of date.
+
+    Args:
+        app (connexion.App): The application
+        spec (str): Path of the specification relative to the package
+        kwargs: Arguments passed on to connexion
+
+    Returns:
+        connexion.apis.AbstractAPI: The added API
+    """
+    path = spec_path(spec)
+    compiled = load_compiled(path)
+    if compiled is None:
+        return app.add_api(path, **kwargs)
+    return app.add_api(compiled, **kwargs)
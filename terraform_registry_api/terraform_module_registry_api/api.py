@@ -1,13 +1,64 @@
-from flask import make_response, redirect, request
+import hmac
+import io
+import tempfile
+
+from functools import wraps
+from flask import Response, make_response, redirect, request
 from os import environ
 
-from .backends import Dummy, Filesystem
-from .exceptions import ModuleNotFoundException
+from ..metrics import TimedBackend, cache_lookups
+from ..serialization import dumps
+from . import backends
+from .backends import Dummy
+from .cache import ResponseCache
+from .exceptions import (ModuleNotFoundException, InvalidModuleException,
+                         ModuleExistsException, UpstreamUnavailableException)
+
+backend = TimedBackend(Dummy(), "modules")
+response_cache = ResponseCache()
+publish_token = None
+stream_listings = False
+cache_hits = cache_lookups.labels("hit")
+cache_misses = cache_lookups.labels("miss")
+
+
+def cached(handler):
+    """Serve successful responses of a handler from the response cache.
+
+    Responses are keyed by the handler, its arguments and the root url of
+    the request. They carry a strong ETag so clients can revalidate with
+    If-None-Match and receive a 304 without a body.
+
+    Args:
+        handler (function): Request handler returning a response
 
-backend = Dummy()
+    Returns:
+        function: The wrapped handler
+    """
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not response_cache.enabled:
+            return handler(*args, **kwargs)
+        key = (handler.__name__, args, tuple(sorted(kwargs.items())),
+               request.url_root)
+        generation = backend.generation
+        entry = response_cache.get(key, generation)
+        if entry is None:
+            cache_misses.inc()
+            resp = handler(*args, **kwargs)
+            if resp.status_code != 200:
+                return resp
+            entry = response_cache.put(key, generation, resp.get_data())
+        else:
+            cache_hits.inc()
+        resp = make_response(entry.body, 200)
+        resp.set_etag(entry.etag)
+        return resp.make_conditional(request)
+    return wrapper
 
 
-def list_modules(namespace=None):
+def list_modules(namespace=None, offset=0, limit=None, provider=None,
+                 verified=None):
     """List modules in namespace requested.
 
     Response format:
@@ -50,14 +101,48 @@ def list_modules(namespace=None):
 
     Args:
         namespace (str, optional): Namespace for the module. Defaults to None.
+        offset (int, optional): Number of modules to skip. Defaults to 0.
+        limit (int, optional): Maximum number of modules. Defaults to None.
+        provider (str, optional): Only list this provider. Defaults to None.
+        verified (bool, optional): Only list verified modules. Defaults to None.
 
     Returns:
         response: JSON formatted respnse
     """
-    return make_response(backend.get_modules(request.url_root, namespace), 200)
+    if stream_listings:
+        try:
+            return Response(backend.stream_modules(
+                request.url_root, namespace, offset=offset, limit=limit,
+                provider=provider, verified=verified), 200)
+        except ModuleNotFoundException as module_not_found:
+            return make_response(module_not_found.message, 404)
+        except UpstreamUnavailableException as unavailable:
+            return make_response(unavailable.message, 502)
+    return render_modules(namespace, offset=offset, limit=limit,
+                          provider=provider, verified=verified)
+
+
+@cached
+def render_modules(namespace=None, offset=0, limit=None, provider=None,
+                   verified=None):
+    """Render a listing of modules at once.
 
+    See list_modules for details.
 
-def list_all_modules():
+    Returns:
+        response: JSON formatted respnse
+    """
+    try:
+        return make_response(backend.get_modules(
+            request.url_root, namespace, offset=offset, limit=limit,
+            provider=provider, verified=verified), 200)
+    except ModuleNotFoundException as module_not_found:
+        return make_response(module_not_found.message, 404)
+    except UpstreamUnavailableException as unavailable:
+        return make_response(unavailable.message, 502)
+
+
+def list_all_modules(offset=0, limit=None, provider=None, verified=None):
     """List all modules.
 
     See list_modules for details.
@@ -65,9 +150,11 @@ def list_all_modules():
     Returns:
         response: json list of all modules
     """
-    return list_modules()
+    return list_modules(offset=offset, limit=limit, provider=provider,
+                        verified=verified)
 
 
+@cached
 def list_versions(namespace, name, provider):
     """List version for mnodule.
 
@@ -84,6 +171,8 @@ def list_versions(namespace, name, provider):
                              200)
     except ModuleNotFoundException as module_not_found:
         return make_response(module_not_found.message, 404)
+    except UpstreamUnavailableException as unavailable:
+        return make_response(unavailable.message, 502)
 
 
 def download_version(namespace, name, provider, version):
@@ -102,7 +191,7 @@ def download_version(namespace, name, provider, version):
         resp = make_response('', 204)
         artifact = backend.download_version(
             namespace, name, provider, version)
-        if artifact.startswith("http"):
+        if "://" in artifact or "::" in artifact:
             final_artifact = artifact
         else:
             final_artifact = "{root}dl/module/{artifact}".format(root=request.url_root,
@@ -111,37 +200,62 @@ def download_version(namespace, name, provider, version):
         return resp
     except ModuleNotFoundException as module_not_found:
         return make_response(module_not_found.message, 404)
+    except UpstreamUnavailableException as unavailable:
+        return make_response(unavailable.message, 502)
 
 
-def search_modules(q):
+@cached
+def search_modules(q, offset=0, limit=None, provider=None, verified=None,
+                   namespace=None):
     """Search modules based on the query.
 
     Args:
         q (str, optional): Ther query string to search for. Defaults to None.
+        offset (int, optional): Number of modules to skip. Defaults to 0.
+        limit (int, optional): Maximum number of modules. Defaults to None.
+        provider (str, optional): Only list this provider. Defaults to None.
+        verified (bool, optional): Only list verified modules. Defaults to None.
+        namespace (str, optional): Only list this namespace. Defaults to None.
 
     Returns:
         response: list of modules matching the
                   relevant search query as json
     """
-    return make_response(backend.search_modules(
-        request.url_root, q), 200)
+    try:
+        return make_response(backend.search_modules(
+            request.url_root, q, offset=offset, limit=limit, provider=provider,
+            verified=verified, namespace=namespace), 200)
+    except ModuleNotFoundException as module_not_found:
+        return make_response(module_not_found.message, 404)
+    except UpstreamUnavailableException as unavailable:
+        return make_response(unavailable.message, 502)
 
 
-def get_latest_for_all_providers(namespace, name):
+@cached
+def get_latest_for_all_providers(namespace, name, offset=0, limit=None):
     """Get latest version for all providers.
 
     Args:
         namespace (str): namespace for the version
         name (str): Name of the module
+        offset (int, optional): Number of providers to skip. Defaults to 0.
+        limit (int, optional): Maximum number of providers. Defaults to None.
 
     Returns:
         json: Details of vesion for each provider
     """
-    return make_response(
-        backend.get_latest_all_providers(request.url_root, namespace, name),
-        200)
+    try:
+        return make_response(
+            backend.get_latest_all_providers(request.url_root, namespace, name,
+                                             offset=offset, limit=limit),
+            200)
+    except ModuleNotFoundException as module_not_found:
+        return make_response(module_not_found.message, 404)
+    except UpstreamUnavailableException as unavailable:
+        return make_response(unavailable.message, 502)
 
 
+@cached
 def get_latest_for_provider(namespace, name, provider):
     """Get Latest version for Provider.
 
@@ -158,8 +272,11 @@ def get_latest_for_provider(namespace, name, provider):
             request.url_root, namespace, name, provider), 200)
     except ModuleNotFoundException as module_not_found:
         return make_response(module_not_found.message, 404)
+    except UpstreamUnavailableException as unavailable:
+        return make_response(unavailable.message, 502)
 
 
+@cached
 def get_module(namespace, name, provider, version):
     """Get Module Details.
 
@@ -179,6 +296,8 @@ def get_module(namespace, name, provider, version):
             200)
     except ModuleNotFoundException as module_not_found:
         return make_response(module_not_found.message, 404)
+    except UpstreamUnavailableException as unavailable:
+        return make_response(unavailable.message, 502)
 
 
 def download_latest(namespace, name, provider):
@@ -201,6 +320,8 @@ def download_latest(namespace, name, provider):
             request.url_root, namespace, name, provider))
     except ModuleNotFoundException as module_not_found:
         return make_response(module_not_found.message, 404)
+    except UpstreamUnavailableException as unavailable:
+        return make_response(unavailable.message, 502)
 
 
 def download_module(filepath):
@@ -215,12 +336,141 @@ def download_module(filepath):
     return backend.download_module(filepath)
 
 
+def publish_modules():
+    """Publish the module versions of the uploaded tar archive.
+
+    Connexion reads the whole request body before the handler runs, large
+    imports are better done with terra-store publish on the server.
+
+    Returns:
+        response: JSON list of the published versions
+    """
+    from .backends.ingest import read_archive  # tarfile is only needed to publish
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="terra-store-") as staging:
+            uploads = read_archive(io.BytesIO(request.get_data()), staging)
+            if not uploads:
+                return make_response("The upload holds no modules", 400)
+            backend.publish(uploads)
+    except InvalidModuleException as invalid:
+        return make_response(invalid.message, 400)
+    except ModuleExistsException as exists:
+        return make_response(exists.message, 409)
+    except NotImplementedError as read_only:
+        return make_response(str(read_only), 501)
+    resp = make_response(dumps({"modules": ["/".join(upload[:4])
+                                            for upload in uploads]}), 201)
+    resp.content_type = "application/json"
+    return resp
+
+
+def check_token(apikey, required_scopes=None):
+    """Check the token sent to publish modules.
+
+    Args:
+        apikey (str): Authorization header, the token optionally prefixed
+            with Bearer
+        required_scopes (list, optional): Unused. Defaults to None.
+
+    Returns:
+        dict: Token info, None if the token is not valid
+    """
+    if not publish_token:
+        return None
+    scheme, _, token = apikey.partition(" ")
+    if scheme.lower() != "bearer":
+        token = apikey
+    if hmac.compare_digest(token.strip().encode(), publish_token.encode()):
+        return {"sub": "publisher"}
+    return None
+
+
 def set_backend(backendtype):
     """Set backend.
 
     Args:
         backendtype (str): Type of backend requested
     """
+    global backend
     if backendtype == "Filesystem":
-        global backend
-        backend = Filesystem(environ.get("fs_path"))
+        workers = environ.get("publish_workers")
+        backend = TimedBackend(backends.Filesystem(
+            environ.get("fs_path"),
+            watch=environ.get("fs_watch", "auto"),
+            poll_interval=float(environ.get("fs_poll_interval", 5)),
+            workers=int(workers) if workers else None,
+            catalog_file=environ.get("fs_catalog_file"),
+            compile_metadata=environ.get("compile_metadata", "false").lower() == "true"),
+            "modules")
+    elif backendtype == "SQLite":
+        workers = environ.get("publish_workers")
+        backend = TimedBackend(backends.SQLite(
+            environ.get("sqlite_path"),
+            environ.get("sqlite_database"),
+            sync=environ.get("sqlite_sync", "true").lower() == "true",
+            workers=int(workers) if workers else None,
+            compile_metadata=environ.get("compile_metadata", "false").lower() == "true"),
+            "modules")
+    elif backendtype == "S3":
+        backend = TimedBackend(backends.S3(
+            environ.get("s3_bucket"),
+            prefix=environ.get("s3_prefix", ""),
+            endpoint_url=environ.get("s3_endpoint_url"),
+            region=environ.get("s3_region"),
+            refresh_interval=float(environ.get("s3_refresh_interval", 60)),
+            url_expiry=int(environ.get("s3_url_expiry", 3600)),
+            max_connections=int(environ.get("s3_max_connections", 50))), "modules")
+    elif backendtype == "Proxy":
+        backend = TimedBackend(backends.Proxy(
+            environ.get("proxy_upstream"),
+            environ.get("proxy_cache_dir", "/var/cache/terra-store"),
+            ttl=float(environ.get("proxy_ttl", 300)),
+            timeout=float(environ.get("proxy_timeout", 10)),
+            max_connections=int(environ.get("proxy_max_connections", 10)),
+            max_responses=int(environ.get("proxy_max_responses", 1024))), "modules")
+
+
+def before_fork():
+    """Prepare the backend before worker processes are forked from it."""
+    backend.before_fork()
+
+
+def after_fork():
+    """Prepare the backend inherited by a forked worker process."""
+    backend.after_fork()
+
+
+def set_cache(size, ttl):
+    """Configure the response cache.
+
+    Args:
+        size (int): Maximum number of responses to keep, 0 disables the cache
+        ttl (float): Seconds a response is kept
+    """
+    global response_cache
+    response_cache = ResponseCache(size, ttl)
+
+
+def set_publish_token(token):
+    """Configure the token required to publish modules.
+
+    Args:
+        token (str): The token, None disables publishing
+    """
+    global publish_token
+    publish_token = token
+
+
+def set_stream_listings(enabled):
+    """Configure whether module listings are streamed.
+
+    Streamed listings are sent in chunks as they are rendered, so the
+    memory used by a request does not grow with the listing, but they are
+    not cached.
+
+    Args:
+        enabled (bool): Stream module listings
+    """
+    global stream_listings
+    stream_listings = enabled
@@ -2,6 +2,51 @@
 
 Current Implementations:
  - Dummy
+ - Filesystem
+ - Proxy
+ - S3
+ - SQLite
+
+Backends are imported when they are first looked up, so only the configured
+backend and its dependencies are loaded.
 """
-from .dummy import Dummy
-from .filesystem import Filesystem
+from importlib import import_module
+
+# Backend class mapped to the module implementing it
+BACKENDS = {
+    "Dummy": "dummy",
+    "Filesystem": "filesystem",
+    "Proxy": "proxy",
+    "S3": "s3",
+    "SQLite": "sqlite",
+}
+
+__all__ = sorted(BACKENDS)
+
+
+def __getattr__(name):
+    """Import a backend on first use.
+
+    Args:
+        name (str): Name of the backend class
+
+    Raises:
+        AttributeError: Raised if there is no backend of that name
+
+    Returns:
+        type: The backend class
+    """
+    if name not in BACKENDS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    backend = getattr(import_module("." + BACKENDS[name], __name__), name)
+    globals()[name] = backend
+    return backend
+
+
+def __dir__():
+    """List the attributes of the module, including backends not yet imported.
+
+    Returns:
+        list: Sorted attribute names
+    """
+    return sorted(set(globals()) | set(BACKENDS))
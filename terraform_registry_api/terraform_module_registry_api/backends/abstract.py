@@ -1,9 +1,51 @@
 from abc import ABC, abstractmethod
+from collections import namedtuple
+
+# Artifact a backend serves itself: body holds the content as bytes or a
+# readable binary stream, size its length in bytes, etag identifies the content
+# and last_modified is a unix timestamp or None
+Artifact = namedtuple("Artifact", ("body", "size", "etag", "last_modified"))
 
 
 class AbstractBackend(ABC):
     """Abstract Class defining the backend structure."""
 
+    @property
+    def generation(self):
+        """int: Changes whenever the data served by the backend changes.
+
+        Used to invalidate cached responses. Backends whose data never
+        changes can keep the default.
+        """
+        return 0
+
+    def before_fork(self):
+        """Finish work that must not be repeated by every forked worker.
+
+        Called in the parent process before it forks worker processes.
+        """
+
+    def after_fork(self):
+        """Prepare a backend inherited by a forked worker process.
+
+        Threads and connections of the parent do not carry over to the
+        child, backends using them set them up again here.
+        """
+
+    def publish(self, uploads):
+        """Publish a batch of module versions.
+
+        Backends which can be written to make all versions of the batch
+        visible at once, or none of them.
+
+        Args:
+            uploads (list): Upload of each version
+
+        Raises:
+            NotImplementedError: Raised if the backend is read only
+        """
+        raise NotImplementedError("This backend does not support publishing.")
+
     @abstractmethod
     def get_versions(self, namespace, name, provider):
         """Get The Versions.
@@ -57,34 +99,83 @@ class AbstractBackend(ABC):
         """
 
     @abstractmethod
-    def get_modules(self, baseurl, namespace=None):
+    def get_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                    provider=None, verified=None):
         """Get all modules in namespace provided.
 
+        Modules are returned in a stable order so pages can be requested
+        one after another. Only the requested page is built.
+
         Args:
             namespace (str, optional): Namespace of modules. Defaults to None.
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
 
         Returns:
             json: JSON representation of the modules within the namespace
         """
 
+    def stream_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                       provider=None, verified=None):
+        """Get all modules in namespace provided as a stream of JSON chunks.
+
+        Takes the same arguments as get_modules and yields the same document
+        in parts. Backends able to render a listing incrementally override
+        this, the default yields the result of get_modules at once.
+
+        Args:
+            namespace (str, optional): Namespace of modules. Defaults to None.
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+
+        Returns:
+            iterator: Chunks of the JSON representation of the modules
+        """
+        return iter((self.get_modules(baseurl, namespace, offset=offset, limit=limit,
+                                      provider=provider, verified=verified),))
+
     @abstractmethod
-    def search_modules(self, baseurl, query):
+    def search_modules(self, baseurl, query, offset=0, limit=None,
+                       provider=None, verified=None, namespace=None):
         """Search the module list based on the query.
 
         Args:
             query (str): Query string used for the search
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+            namespace (str, optional): Only return modules in this namespace.
+                Defaults to None.
 
         Returns:
             json: List of modules including details
         """
 
     @abstractmethod
-    def get_latest_all_providers(self, baseurl, namespace, name):
+    def get_latest_all_providers(self, baseurl, namespace, name, offset=0,
+                                 limit=None):
         """Get Latest versions for each deployed provider.
 
         Args:
             namespace (str): namespace for the version
             name (str): Name of the module
+            offset (int, optional): Number of providers to skip. Defaults to 0.
+            limit (int, optional): Maximum number of providers to return.
+                Defaults to None, which returns all providers.
 
         Returns:
             json: List of all provders and latest version for
@@ -118,5 +209,5 @@ class AbstractBackend(ABC):
             FileNotFoundException: Raised if file does not exist
 
         Returns:
-            File: The bytearray representation of the requested file
+            str|Artifact: Location of the file on disk, or the file itself
         """
@@ -0,0 +1,153 @@
+"""Asynchronous interface to the backends.
+
+AsyncBackend mirrors AbstractBackend with coroutines, for backends able to
+wait on their storage without holding a thread. Backends only implementing
+the synchronous interface are adapted by ThreadPoolBackend, which runs each
+call on a thread pool so the event loop is never blocked.
+"""
+import asyncio
+import functools
+
+from abc import ABC, abstractmethod
+
+
+class AsyncBackend(ABC):
+    """Abstract Class defining the asynchronous backend structure.
+
+    The methods take the same arguments and raise the same exceptions as
+    their counterparts in AbstractBackend.
+    """
+
+    @property
+    def generation(self):
+        """int: Changes whenever the data served by the backend changes."""
+        return 0
+
+    @abstractmethod
+    async def get_versions(self, namespace, name, provider):
+        """Get The Versions, see AbstractBackend.get_versions."""
+
+    @abstractmethod
+    async def download_version(self, namespace, name, provider, version):
+        """Generate Download URL, see AbstractBackend.download_version."""
+
+    @abstractmethod
+    async def download_latest(self, baseurl, namespace, name, provider):
+        """Find the latest version, see AbstractBackend.download_latest."""
+
+    @abstractmethod
+    async def get_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                          provider=None, verified=None):
+        """Get modules, see AbstractBackend.get_modules."""
+
+    @abstractmethod
+    async def search_modules(self, baseurl, query, offset=0, limit=None,
+                             provider=None, verified=None, namespace=None):
+        """Search modules, see AbstractBackend.search_modules."""
+
+    @abstractmethod
+    async def get_latest_all_providers(self, baseurl, namespace, name, offset=0,
+                                       limit=None):
+        """Get latest versions, see AbstractBackend.get_latest_all_providers."""
+
+    @abstractmethod
+    async def get_module(self, baseurl, namespace, name, provider, version=None):
+        """Get module details, see AbstractBackend.get_module."""
+
+    @abstractmethod
+    async def download_module(self, filepath):
+        """Download the module, see AbstractBackend.download_module."""
+
+
+class ThreadPoolBackend(AsyncBackend):
+    """Run the calls of a synchronous backend on a thread pool."""
+
+    def __init__(self, backend, executor=None):
+        """Adapt a synchronous backend.
+
+        Args:
+            backend (AbstractBackend): The backend answering the calls
+            executor (Executor, optional): Pool running the calls. Defaults
+                to None, which uses the default executor of the event loop.
+        """
+        self.backend = backend
+        self.executor = executor
+
+    @property
+    def generation(self):
+        """int: Generation of the adapted backend."""
+        return self.backend.generation
+
+    async def get_versions(self, namespace, name, provider):
+        """Get The Versions, see AbstractBackend.get_versions."""
+        return await self.__run(self.backend.get_versions, namespace, name, provider)
+
+    async def download_version(self, namespace, name, provider, version):
+        """Generate Download URL, see AbstractBackend.download_version."""
+        return await self.__run(self.backend.download_version, namespace, name,
+                                provider, version)
+
+    async def download_latest(self, baseurl, namespace, name, provider):
+        """Find the latest version, see AbstractBackend.download_latest."""
+        return await self.__run(self.backend.download_latest, baseurl, namespace,
+                                name, provider)
+
+    async def get_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                          provider=None, verified=None):
+        """Get modules, see AbstractBackend.get_modules."""
+        return await self.__run(self.backend.get_modules, baseurl, namespace,
+                                offset=offset, limit=limit, provider=provider,
+                                verified=verified)
+
+    async def search_modules(self, baseurl, query, offset=0, limit=None,
+                             provider=None, verified=None, namespace=None):
+        """Search modules, see AbstractBackend.search_modules."""
+        return await self.__run(self.backend.search_modules, baseurl, query,
+                                offset=offset, limit=limit, provider=provider,
+                                verified=verified, namespace=namespace)
+
+    async def get_latest_all_providers(self, baseurl, namespace, name, offset=0,
+                                       limit=None):
+        """Get latest versions, see AbstractBackend.get_latest_all_providers."""
+        return await self.__run(self.backend.get_latest_all_providers, baseurl,
+                                namespace, name, offset=offset, limit=limit)
+
+    async def get_module(self, baseurl, namespace, name, provider, version=None):
+        """Get module details, see AbstractBackend.get_module."""
+        return await self.__run(self.backend.get_module, baseurl, namespace, name,
+                                provider, version)
+
+    async def download_module(self, filepath):
+        """Download the module, see AbstractBackend.download_module."""
+        return await self.__run(self.backend.download_module, filepath)
+
+    async def __run(self, function, *args, **kwargs):
+        """Run a call of the backend on the pool.
+
+        Args:
+            function (callable): Method of the backend
+            args: Positional arguments of the call
+            kwargs: Keyword arguments of the call
+
+        Returns:
+            object: Result of the call
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          functools.partial(function, *args, **kwargs))
+
+
+def as_async(backend, executor=None):
+    """Get the asynchronous interface of a backend.
+
+    Args:
+        backend (AbstractBackend|AsyncBackend): The backend
+        executor (Executor, optional): Pool for synchronous backends.
+            Defaults to None, which uses the default executor.
+
+    Returns:
+        AsyncBackend: The backend itself, or an adapter running it on a pool
+    """
+    if isinstance(backend, AsyncBackend):
+        return backend
+    return ThreadPoolBackend(backend, executor)
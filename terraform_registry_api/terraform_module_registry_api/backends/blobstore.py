@@ -0,0 +1,141 @@
+"""Content addressed storage for module artifacts.
+
+Blobs are stored below ``sha256/<first two hex digits>/<hex digest>`` in the
+root directory. A blob is written to a temporary file while it is hashed and
+renamed into place once complete, so a blob present in the store is always
+whole and storing the same content twice keeps a single copy.
+
+Files elsewhere point at their blob with a relative symlink, which makes the
+digest of such a file known without reading it.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from os.path import basename, dirname, exists, join, lexists
+
+CHUNK_SIZE = 1024 * 1024
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    """Directory of blobs named by the sha256 digest of their content."""
+
+    def __init__(self, root):
+        """Instantiate the store, its directories are created on first write.
+
+        Args:
+            root (str): Directory holding the blobs
+        """
+        self.root = root
+        self.staging = join(root, "tmp")
+
+    def __contains__(self, digest):
+        """bool: Whether a blob is stored."""
+        return exists(self.path(digest))
+
+    def path(self, digest):
+        """Get the location of a blob.
+
+        Args:
+            digest (str): Hex sha256 digest of the blob
+
+        Returns:
+            str: Path of the blob, which may not exist
+        """
+        return join(self.root, "sha256", digest[:2], digest)
+
+    def put(self, chunks):
+        """Store a blob.
+
+        Args:
+            chunks (iterable): Byte strings making up the content
+
+        Returns:
+            str: Hex sha256 digest of the content
+        """
+        digest = hashlib.sha256()
+        os.makedirs(self.staging, exist_ok=True)
+        handle, staged = tempfile.mkstemp(dir=self.staging)
+        try:
+            with os.fdopen(handle, "wb") as blob:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    blob.write(chunk)
+            target = self.path(digest.hexdigest())
+            os.makedirs(dirname(target), exist_ok=True)
+            os.replace(staged, target)
+        except BaseException:
+            if exists(staged):
+                os.unlink(staged)
+            raise
+        return digest.hexdigest()
+
+    def put_file(self, path):
+        """Store a copy of a file.
+
+        Args:
+            path (str): Location of the file
+
+        Returns:
+            str: Hex sha256 digest of the file
+        """
+        with open(path, "rb") as source:
+            return self.put(iter(lambda: source.read(CHUNK_SIZE), b""))
+
+    def link(self, digest, path):
+        """Point a file at a blob, replacing the file if it exists.
+
+        Args:
+            digest (str): Hex sha256 digest of the blob
+            path (str): Location of the file
+        """
+        target = os.path.relpath(self.path(digest), dirname(path))
+        staged = join(dirname(path), ".{}.link".format(basename(path)))
+        if lexists(staged):
+            os.unlink(staged)
+        os.symlink(target, staged)
+        os.replace(staged, path)
+
+    def digests(self):
+        """List the stored blobs.
+
+        Returns:
+            list: Hex sha256 digests of all blobs
+        """
+        found = []
+        try:
+            prefixes = os.listdir(join(self.root, "sha256"))
+        except FileNotFoundError:
+            return found
+        for prefix in prefixes:
+            found.extend(name for name in os.listdir(join(self.root, "sha256", prefix))
+                         if DIGEST.match(name))
+        return found
+
+    def remove(self, digest):
+        """Remove a blob.
+
+        Args:
+            digest (str): Hex sha256 digest of the blob
+        """
+        os.unlink(self.path(digest))
+
+
+def blob_digest(path):
+    """Get the digest of the blob a file is, or points at.
+
+    Args:
+        path (str): Location of the file
+
+    Returns:
+        str: Hex sha256 digest, None if the file is not a blob
+    """
+    real = os.path.realpath(path)
+    digest = basename(real)
+    prefix = dirname(real)
+    if DIGEST.match(digest) and basename(prefix) == digest[:2] \
+            and basename(dirname(prefix)) == "sha256":
+        return digest
+    return None
@@ -0,0 +1,660 @@
+"""In-memory catalog of the modules held by a backend.
+
+The catalog maps namespace -> name -> provider -> sorted versions and keeps
+the parsed module metadata alongside, so read paths can be answered without
+touching the underlying storage.
+
+Readers work on an immutable snapshot of the catalog, writers build a new
+snapshot and swap it in, so a request never sees a half applied change.
+"""
+import threading
+
+from bisect import bisect_left
+from itertools import islice
+
+from ...serialization import dumps
+from .abstract import AbstractBackend
+from .pagination import has_more, paginate, page_meta
+from .records import ModuleRecord, module_details, render_listing, stream_listing
+from .search import SearchIndex
+from .versions import VersionList
+from ..exceptions import ModuleNotFoundException
+
+
+class ModuleEntry:
+    """Metadata and provider versions of a single module.
+
+    Only the metadata fields served by the API are kept, and the listing
+    record of each provider is rendered once when the entry is created.
+    """
+
+    __slots__ = ("owner", "description", "verified", "providers", "records")
+
+    def __init__(self, namespace, name, metadata, providers):
+        """Instantiate a module entry.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+            metadata (dict): Parsed module metadata
+            providers (dict): Provider name mapped to its VersionList
+        """
+        self.owner, self.description, self.verified = served_metadata(metadata)
+        self.providers = providers
+        self.records = {
+            provider: ModuleRecord(
+                namespace, name, provider, versions.latest, self.owner,
+                self.description, self.verified,
+                "dl/modules/{}/{}/{}/{}".format(namespace, name, provider,
+                                                versions.latest))
+            for provider, versions in providers.items()}
+
+    @property
+    def metadata(self):
+        """dict: The metadata fields kept for the module."""
+        return {"owner": self.owner, "description": self.description,
+                "verified": self.verified}
+
+
+class Snapshot:
+    """Read only view of the catalog at a point in time."""
+
+    __slots__ = ("_namespaces", "_keys", "generation")
+
+    def __init__(self, namespaces, keys, generation):
+        """Instantiate a snapshot.
+
+        Args:
+            namespaces (dict): namespace -> name -> ModuleEntry
+            keys (list): Sorted (namespace, name, provider) tuples
+            generation (int): Number of updates applied to the catalog
+        """
+        self._namespaces = namespaces
+        self._keys = keys
+        self.generation = generation
+
+    def namespaces(self):
+        """Get the namespaces held in the catalog.
+
+        Returns:
+            list: Sorted namespace names
+        """
+        return sorted(self._namespaces)
+
+    def names(self, namespace):
+        """Get the module names held in a namespace.
+
+        Args:
+            namespace (str): namespace for the modules
+
+        Returns:
+            list: Sorted module names
+        """
+        return sorted(self._namespaces.get(namespace, {}))
+
+    def modules(self, namespace=None):
+        """Get the modules held in the catalog.
+
+        Args:
+            namespace (str, optional): Restrict to a namespace. Defaults to None.
+
+        Returns:
+            list: Sorted (namespace, name, provider) tuples
+        """
+        keys = self._keys
+        if namespace is None:
+            return list(keys)
+        start = bisect_left(keys, (namespace,))
+        end = bisect_left(keys, (namespace + "\x00",))
+        return keys[start:end]
+
+    def iter_modules(self, namespace=None):
+        """Iterate the modules held in the catalog without copying them.
+
+        Args:
+            namespace (str, optional): Restrict to a namespace. Defaults to None.
+
+        Returns:
+            iterator: Sorted (namespace, name, provider) tuples
+        """
+        keys = self._keys
+        if namespace is None:
+            return iter(keys)
+        start = bisect_left(keys, (namespace,))
+        end = bisect_left(keys, (namespace + "\x00",))
+        return islice(keys, start, end)
+
+    def get(self, namespace, name):
+        """Get a module entry.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+
+        Returns:
+            ModuleEntry: The entry, or None if the module is unknown
+        """
+        return self._namespaces.get(namespace, {}).get(name)
+
+    def versions(self, namespace, name, provider):
+        """Get the versions of a module provider.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Returns:
+            VersionList: Sorted versions, or None if the provider is unknown
+        """
+        entry = self.get(namespace, name)
+        if entry is None:
+            return None
+        return entry.providers.get(provider)
+
+    def latest(self, namespace, name, provider):
+        """Get the latest version of a module provider.
+
+        Pre-releases are only returned if there is no stable version.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Returns:
+            str: Latest version, or None if there is none
+        """
+        versions = self.versions(namespace, name, provider)
+        if versions is None:
+            return None
+        return versions.latest
+
+
+class Catalog:
+    """Index of namespaces, modules, providers and versions.
+
+    Attributes:
+        search_index (SearchIndex): Search index kept in step with the catalog
+    """
+
+    def __init__(self):
+        """Instantiate an empty catalog."""
+        self._snapshot = Snapshot({}, [], 0)
+        self._lock = threading.Lock()
+        self.search_index = SearchIndex()
+
+    @property
+    def generation(self):
+        """int: Number of updates applied to the catalog."""
+        return self._snapshot.generation
+
+    def after_fork(self):
+        """Replace the locks, which a thread of the parent may have held."""
+        self._lock = threading.Lock()
+        self.search_index.after_fork()
+
+    def restore(self, modules):
+        """Replace the whole catalog with modules read back from a catalog file.
+
+        Args:
+            modules (iterable): (namespace, name, metadata, providers) tuples,
+                where providers maps the provider name to a VersionList
+        """
+        with self._lock:
+            namespaces = {}
+            keys = []
+            index = SearchIndex()
+            for namespace, name, metadata, providers in modules:
+                namespaces.setdefault(namespace, {})[name] = ModuleEntry(
+                    namespace, name, metadata, providers)
+                keys.extend((namespace, name, provider) for provider in providers)
+                index.set_module(namespace, name, metadata, providers)
+            keys.sort()
+            self.search_index = index
+            self._snapshot = Snapshot(namespaces, keys, self._snapshot.generation + 1)
+
+    def snapshot(self):
+        """Get the current state of the catalog.
+
+        Returns:
+            Snapshot: Read only view of the catalog
+        """
+        return self._snapshot
+
+    def update(self, modules=(), removed=()):
+        """Add, replace and remove modules in a single step.
+
+        Args:
+            modules (iterable, optional): (namespace, name, metadata, providers)
+                tuples, where providers maps the provider name to a VersionList
+                or an iterable of versions. Providers without any versions are
+                left out.
+            removed (iterable, optional): (namespace, name) tuples of the
+                modules to remove.
+        """
+        with self._lock:
+            current = self._snapshot
+            namespaces = dict(current._namespaces)
+            keys = list(current._keys)
+            copied = set()
+
+            def names_of(namespace):
+                if namespace not in copied:
+                    namespaces[namespace] = dict(namespaces.get(namespace, {}))
+                    copied.add(namespace)
+                return namespaces[namespace]
+
+            for namespace, name in removed:
+                if name in namespaces.get(namespace, {}):
+                    del names_of(namespace)[name]
+                    if not namespaces[namespace]:
+                        del namespaces[namespace]
+                    replace_keys(keys, namespace, name, [])
+                    self.search_index.remove_module(namespace, name)
+
+            for namespace, name, metadata, providers in modules:
+                providers = {provider: as_version_list(versions)
+                             for provider, versions in providers.items() if versions}
+                names_of(namespace)[name] = ModuleEntry(namespace, name, metadata,
+                                                        providers)
+                replace_keys(keys, namespace, name, sorted(providers))
+                self.search_index.set_module(namespace, name, metadata, providers)
+
+            self._snapshot = Snapshot(namespaces, keys, current.generation + 1)
+
+    def set_module(self, namespace, name, metadata, providers):
+        """Add or replace a module in the catalog.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+            metadata (dict): Parsed module metadata
+            providers (dict): Provider name mapped to a list of versions,
+                providers without any versions are left out
+        """
+        self.update(modules=[(namespace, name, metadata, providers)])
+
+    def set_versions(self, namespace, name, provider, added=(), removed=()):
+        """Add and remove versions of a single module provider.
+
+        The sorted version list of the provider is updated in place of
+        being rebuilt, the module has to be in the catalog already.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+            provider (str): Provider for the module
+            added (iterable, optional): Versions to add. Defaults to ().
+            removed (iterable, optional): Versions to remove. Defaults to ().
+        """
+        entry = self._snapshot.get(namespace, name)
+        providers = dict(entry.providers)
+        versions = providers[provider].copy() if provider in providers \
+            else VersionList()
+        for version in removed:
+            versions.remove(version)
+        for version in added:
+            versions.add(version)
+        providers[provider] = versions
+        self.update(modules=[(namespace, name, entry.metadata, providers)])
+
+    def remove_module(self, namespace, name):
+        """Remove a module from the catalog.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+        """
+        self.update(removed=[(namespace, name)])
+
+
+class CatalogBackend(AbstractBackend):
+    """Backend answering all read requests from an in-memory Catalog.
+
+    Subclasses load their modules into the catalog attribute and implement
+    download_version and download_module for their storage.
+    """
+
+    def __init__(self):
+        """Instantiate the backend with an empty catalog."""
+        self.catalog = Catalog()
+
+    @property
+    def generation(self):
+        """int: Changes whenever the catalog changes."""
+        return self.catalog.generation
+
+    def after_fork(self):
+        """Prepare the catalog inherited by a forked worker process."""
+        self.catalog.after_fork()
+
+    def get_versions(self, namespace, name, provider):
+        """Get The Versions.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            json: JSON object containing the versions of the module on the server
+        """
+        versions = self.catalog.snapshot().versions(namespace, name, provider)
+        if versions is not None:
+            response = {
+                "modules": [
+                    {
+                        "versions": [{"version": ver} for ver in versions]
+                    }
+                ]
+
+            }
+            return dumps(response)
+        else:
+            raise ModuleNotFoundException("Module Not Found")
+
+    def download_latest(self, baseurl, namespace, name, provider):
+        """Find the latest version of the module.
+
+        Find the latest version of the module and return
+        a 302 to the download url for the module.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            str: URL for downloading module
+        """
+        latest_version = self.catalog.snapshot().latest(namespace, name, provider)
+        if latest_version is not None:
+            url = "{base_url}/{namespace}/{name}/{provider}/{version}/download".format(
+                namespace=namespace, name=name,
+                provider=provider, version=latest_version,
+                base_url=baseurl + "v1/modules")
+            return url
+        raise ModuleNotFoundException("Module Not Found")
+
+    def get_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                    provider=None, verified=None):
+        """Get all modules in namespace provided.
+
+        Args:
+            namespace (str, optional): Namespace of modules. Defaults to None.
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+
+        Returns:
+            json: JSON representation of the modules within the namespace
+        """
+        catalog = self.catalog.snapshot()
+        modules = self.__filter_modules(catalog, catalog.modules(namespace),
+                                        provider, verified)
+        page, more = paginate(modules, offset, limit)
+        url = baseurl + "v1/modules"
+        if namespace is not None:
+            url = "{url}/{namespace}".format(url=url, namespace=namespace)
+        return render_listing(baseurl,
+                              page_meta(url, offset, limit, more,
+                                        provider=provider, verified=verified),
+                              self.__get_records(catalog, page))
+
+    def stream_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                       provider=None, verified=None):
+        """Get all modules in namespace provided as a stream of JSON chunks.
+
+        The modules are read from a single catalog snapshot, which is walked
+        once to find out whether there is a next page and once to render the
+        page, so only one chunk of records is held at a time.
+
+        Args:
+            namespace (str, optional): Namespace of modules. Defaults to None.
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+
+        Returns:
+            iterator: Chunks of the JSON representation of the modules
+        """
+        catalog = self.catalog.snapshot()
+
+        def modules():
+            return self.__filter_modules(catalog, catalog.iter_modules(namespace),
+                                         provider, verified)
+
+        more = has_more(modules(), offset, limit)
+        url = baseurl + "v1/modules"
+        if namespace is not None:
+            url = "{url}/{namespace}".format(url=url, namespace=namespace)
+        offset = max(offset or 0, 0)
+        end = offset + limit if limit and limit > 0 else None
+        records = (catalog.get(module[0], module[1]).records[module[2]]
+                   for module in islice(modules(), offset, end))
+        return stream_listing(baseurl,
+                              page_meta(url, offset, limit, more,
+                                        provider=provider, verified=verified),
+                              records)
+
+    def search_modules(self, baseurl, query, offset=0, limit=None,
+                       provider=None, verified=None, namespace=None):
+        """Search the module list based on the query.
+
+        The query is matched against the namespace, name and provider of
+        the modules as well as the owner and description from their
+        metadata. Results are ranked with the best matches first.
+
+        Args:
+            query (str): Query string used for the search
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+            namespace (str, optional): Only return modules in this namespace.
+                Defaults to None.
+
+        Returns:
+            json: List of modules including details
+        """
+        catalog = self.catalog.snapshot()
+        modules = (module for module in self.catalog.search_index.search(query)
+                   if catalog.versions(*module)
+                   and (namespace is None or module[0] == namespace))
+        page, more = paginate(
+            self.__filter_modules(catalog, modules, provider, verified),
+            offset, limit)
+        return render_listing(baseurl,
+                              page_meta(baseurl + "v1/modules/search", offset,
+                                        limit, more, q=query, provider=provider,
+                                        verified=verified, namespace=namespace),
+                              self.__get_records(catalog, page))
+
+    def get_latest_all_providers(self, baseurl, namespace, name, offset=0,
+                                 limit=None):
+        """Get Latest versions for each deployed provider.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            offset (int, optional): Number of providers to skip. Defaults to 0.
+            limit (int, optional): Maximum number of providers to return.
+                Defaults to None, which returns all providers.
+
+        Returns:
+            json: List of all provders and latest version for
+            defined namespace and name
+        """
+        catalog = self.catalog.snapshot()
+        entry = catalog.get(namespace, name)
+        if entry is not None:
+            providers = [(namespace, name, provider)
+                         for provider in sorted(entry.providers)]
+        else:
+            providers = []
+        page, more = paginate(providers, offset, limit)
+        url = "{baseurl}v1/modules/{namespace}/{name}".format(
+            baseurl=baseurl, namespace=namespace, name=name)
+        return render_listing(baseurl, page_meta(url, offset, limit, more),
+                              self.__get_records(catalog, page))
+
+    def get_module(self, baseurl, namespace, name, provider, version=None):
+        """Get module with extended details.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+            version (str, optional): Version for the module. Defaults to None.
+
+        Raises:
+            ModuleNotFoundException: If module not found raise exception
+
+        Returns:
+            dict: Module details with all extended attributes
+        """
+        catalog = self.catalog.snapshot()
+        versions = catalog.versions(namespace, name, provider)
+        if version is None and versions:
+            version = versions.latest
+        if versions is not None and version in versions:
+            entry = catalog.get(namespace, name)
+            return dumps(module_details(baseurl, namespace, name, provider, version,
+                                        entry.owner, entry.description,
+                                        entry.verified, sorted(entry.providers),
+                                        list(versions)))
+        else:
+            raise ModuleNotFoundException("Module Not Found")
+
+    @staticmethod
+    def __get_records(catalog, modules):
+        """Get the listing records of the modules in the list.
+
+        Args:
+            catalog (Snapshot): Catalog state to read the modules from
+            modules (list): (namespace, name, provider) of the modules
+
+        Returns:
+            list: ModuleRecord of each module
+        """
+        return [catalog.get(namespace, name).records[provider]
+                for namespace, name, provider in modules]
+
+    @staticmethod
+    def __filter_modules(catalog, modules, provider=None, verified=None):
+        """Filter modules by provider and verification.
+
+        Args:
+            catalog (Snapshot): Catalog state to read the modules from
+            modules (iterable): (namespace, name, provider) of the modules
+            provider (str, optional): Only keep this provider. Defaults to None.
+            verified (bool, optional): Only keep verified modules.
+                Defaults to None.
+
+        Returns:
+            iterable: The modules matching the filters
+        """
+        if provider is not None:
+            modules = (module for module in modules if module[2] == provider)
+        if verified:
+            modules = (module for module in modules
+                       if catalog.get(module[0], module[1]).verified)
+        return modules
+
+
+def served_metadata(metadata):
+    """Pick the metadata fields served by the API.
+
+    Args:
+        metadata (dict): Parsed module metadata
+
+    Returns:
+        tuple: owner, description and whether the module is verified
+    """
+    return (metadata.get("owner", ""), metadata.get("description", ""),
+            metadata.get("verified", True))
+
+
+def same_module(entry, metadata, providers):
+    """Check whether a scanned module matches its entry in the catalog.
+
+    Args:
+        entry (ModuleEntry): Entry of the module, None if it is not known
+        metadata (dict): Parsed module metadata
+        providers (dict): Provider name mapped to its versions
+
+    Returns:
+        bool: True if the entry serves the same metadata and versions
+    """
+    if entry is None or served_metadata(metadata) != (
+            entry.owner, entry.description, entry.verified):
+        return False
+    providers = {provider: versions for provider, versions in providers.items()
+                 if versions}
+    return providers.keys() == entry.providers.keys() and all(
+        len(versions) == len(entry.providers[provider])
+        and all(version in entry.providers[provider] for version in versions)
+        for provider, versions in providers.items())
+
+
+def replace_keys(keys, namespace, name, providers):
+    """Replace the sorted keys of a module in place.
+
+    Args:
+        keys (list): Sorted (namespace, name, provider) tuples
+        namespace (str): namespace for the module
+        name (str): Name of the module
+        providers (list): Sorted providers of the module
+    """
+    start = bisect_left(keys, (namespace, name))
+    end = bisect_left(keys, (namespace, name + "\x00"))
+    keys[start:end] = [(namespace, name, provider) for provider in providers]
+
+
+def as_version_list(versions):
+    """Turn versions into a VersionList.
+
+    Args:
+        versions (iterable): VersionList or version strings in any order
+
+    Returns:
+        VersionList: The sorted versions
+    """
+    if isinstance(versions, VersionList):
+        return versions
+    return VersionList(versions)
+
+
+def artifact_path(namespace, name, provider, version):
+    """Build the path of a module version tarball.
+
+    Args:
+        namespace (str): namespace for the module
+        name (str): Name of the module
+        provider (str): Provider for the module
+        version (str): Version for the module
+
+    Returns:
+        str: namespace/name/provider/version/<tarball>
+    """
+    filename = "{namespace}_{name}-{provider}-{version}.tar.gz".format(
+        namespace=namespace, name=name, provider=provider, version=version)
+    return "/".join((namespace, name, provider, version, filename))
@@ -0,0 +1,116 @@
+"""Catalog files, persisting a catalog across restarts.
+
+A catalog file is an SQLite database holding every module with the
+metadata fields served by the API and the versions of each provider, stored
+in semver order so they are restored without sorting. Files are written
+under a temporary name and renamed into place, so readers only ever open a
+complete file, and carry a format version and the module tree they were
+taken from, so a file of another format or tree is never restored.
+"""
+import json
+import os
+import sqlite3
+import uuid
+
+from urllib.parse import quote
+
+from .versions import VersionList
+
+FORMAT = 1
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE modules (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE providers (
+    module INTEGER NOT NULL REFERENCES modules (id),
+    provider TEXT NOT NULL,
+    versions TEXT NOT NULL
+);
+"""
+
+
+def save_catalog(path, snapshot, tree):
+    """Write a catalog file.
+
+    Args:
+        path (str): Location of the catalog file
+        snapshot (Snapshot): Catalog state to write
+        tree (str): Root of the module tree the catalog was read from
+    """
+    staging = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+    modules, providers = [], []
+    for namespace in snapshot.namespaces():
+        for name in snapshot.names(namespace):
+            entry = snapshot.get(namespace, name)
+            module = len(modules) + 1
+            modules.append((module, namespace, name, json.dumps(
+                [entry.owner, entry.description, entry.verified], default=str)))
+            providers.extend((module, provider, "\n".join(versions))
+                             for provider, versions in sorted(entry.providers.items()))
+    try:
+        database = sqlite3.connect(staging)
+        try:
+            with database:
+                database.executescript(SCHEMA)
+                database.executemany("INSERT INTO meta VALUES (?, ?)", [
+                    ("format", str(FORMAT)), ("tree", os.path.abspath(tree))])
+                database.executemany("INSERT INTO modules VALUES (?, ?, ?, ?)", modules)
+                database.executemany("INSERT INTO providers VALUES (?, ?, ?)",
+                                     providers)
+        finally:
+            database.close()
+        os.replace(staging, path)
+    except BaseException:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+
+
+def load_catalog(path, tree):
+    """Read a catalog file.
+
+    Args:
+        path (str): Location of the catalog file
+        tree (str): Root of the module tree the catalog is for
+
+    Returns:
+        list: (namespace, name, metadata, providers) of each module, where
+        providers maps the provider name to a VersionList, or None if there
+        is no usable catalog file for the tree
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        database = sqlite3.connect("file:{}?mode=ro".format(quote(path)), uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        meta = dict(database.execute("SELECT key, value FROM meta"))
+        if meta.get("format") != str(FORMAT) \
+                or meta.get("tree") != os.path.abspath(tree):
+            return None
+        rows = database.execute(
+            "SELECT modules.id, namespace, name, metadata, provider, versions "
+            "FROM modules LEFT JOIN providers ON providers.module = modules.id "
+            "ORDER BY modules.id")
+        modules = []
+        current = None
+        for module, namespace, name, metadata, provider, versions in rows:
+            if module != current:
+                owner, description, verified = json.loads(metadata)
+                modules.append((namespace, name, {"owner": owner,
+                                                  "description": description,
+                                                  "verified": verified}, {}))
+                current = module
+            if provider is not None:
+                modules[-1][3][provider] = VersionList.from_sorted(versions.split("\n"))
+        return modules
+    except sqlite3.Error:
+        return None
+    finally:
+        database.close()
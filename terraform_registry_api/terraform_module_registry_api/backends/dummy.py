@@ -1,15 +1,23 @@
-import json
-import tarfile
+import hashlib
+import io
+import threading
 
-from os.path import dirname, basename, join
+from functools import lru_cache
+from os.path import dirname
 
-from .abstract import AbstractBackend
+from ...serialization import dumps
+from .abstract import AbstractBackend, Artifact
+from .pagination import paginate, page_meta
+from .records import DOWNLOADS, PUBLISHED_AT, ModuleRecord, render_listing
 from ..exceptions import ModuleNotFoundException, FileNotFoundException
 
 
 class Dummy(AbstractBackend):
     """Dummy implementation of backend used for testing."""
 
+    __tarball = None
+    __tarball_lock = threading.Lock()
+
     dummy_data = {
         "modules":
             {
@@ -57,7 +65,7 @@ class Dummy(AbstractBackend):
                     }
                 ]
             }
-            return json.dumps(versions)
+            return dumps(versions)
         raise ModuleNotFoundException("Module Not Found: " + module_name)
 
     def download_version(self, namespace, name, provider, version):
@@ -114,11 +122,19 @@ class Dummy(AbstractBackend):
             return url
         raise ModuleNotFoundException("Module Not Found: " + module_name)
 
-    def get_modules(self, baseurl, namespace=None):
+    def get_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                    provider=None, verified=None):
         """Get all modules in namespace provided.
 
         Args:
             namespace (str, optional): Namespace of modules. Defaults to None.
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
 
         Returns:
             json: JSON representation of the modules within the namespace
@@ -127,45 +143,57 @@ class Dummy(AbstractBackend):
         if namespace is None:
             modules = self.dummy_data['modules'].keys()
         else:
-            search_string = "/" + namespace
+            search_string = "/" + namespace + "/"
             modules = [module for module in self.dummy_data['modules']
                        if module.startswith(search_string)]
-        details = {
-            'meta': {
-                'limit': 0,
-                'current_offset': 0,
-            },
-            'modules': get_module_details(baseurl, modules)
-        }
-        return json.dumps(details)
-
-    def search_modules(self, baseurl, query):
+        page, more = paginate(filter_modules(modules, provider), offset, limit)
+        url = baseurl + "v1/modules"
+        if namespace is not None:
+            url = "{url}/{namespace}".format(url=url, namespace=namespace)
+        return render_listing(baseurl,
+                              page_meta(url, offset, limit, more,
+                                        provider=provider, verified=verified),
+                              [module_record(module) for module in page])
+
+    def search_modules(self, baseurl, query, offset=0, limit=None,
+                       provider=None, verified=None, namespace=None):
         """Search the module list based on the query.
 
         Args:
             query (str): Query string used for the search
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+            namespace (str, optional): Only return modules in this namespace.
+                Defaults to None.
 
         Returns:
             json: List of modules including details
         """
         modules = [module for module in self.dummy_data['modules']
-                   if query in module]
-
-        response = {
-            "meta": {
-                "limit": 0,
-                "current_offset": 0,
-            },
-            "modules": get_module_details(baseurl, modules)
-        }
-        return json.dumps(response)
-
-    def get_latest_all_providers(self, baseurl, namespace, name):
+                   if query in module and
+                   (namespace is None or module.startswith("/" + namespace + "/"))]
+        page, more = paginate(filter_modules(modules, provider), offset, limit)
+        return render_listing(baseurl,
+                              page_meta(baseurl + "v1/modules/search", offset,
+                                        limit, more, q=query, provider=provider,
+                                        verified=verified, namespace=namespace),
+                              [module_record(module) for module in page])
+
+    def get_latest_all_providers(self, baseurl, namespace, name, offset=0,
+                                 limit=None):
         """Get Latest versions for each deployed provider.
 
         Args:
             namespace (str): namespace for the version
             name (str): Name of the module
+            offset (int, optional): Number of providers to skip. Defaults to 0.
+            limit (int, optional): Maximum number of providers to return.
+                Defaults to None, which returns all providers.
 
         Returns:
             json: List of all provders and latest version for
@@ -176,13 +204,11 @@ class Dummy(AbstractBackend):
 
         providers = [module for module in self.dummy_data['modules']
                      if module.startswith(module_name)]
-        return json.dumps({
-            "meta": {
-                "limit": 0,
-                "current_offset": 0
-            },
-            "modules": get_module_details(baseurl, providers)
-        })
+        page, more = paginate(providers, offset, limit)
+        url = "{baseurl}v1/modules/{namespace}/{name}".format(
+            baseurl=baseurl, namespace=namespace, name=name)
+        return render_listing(baseurl, page_meta(url, offset, limit, more),
+                              [module_record(module) for module in page])
 
     def get_module(self, baseurl, namespace, name, provider, version=None):
         """Get module with extended details.
@@ -205,11 +231,11 @@ class Dummy(AbstractBackend):
             namespace=namespace, name=name, provider=provider)
         if module_name in self.dummy_data['modules'].keys() and \
                 version in self.dummy_data['modules'][module_name]['versions']:
-            return json.dumps(get_extended_details(baseurl,
-                                                   namespace,
-                                                   name,
-                                                   provider,
-                                                   version))
+            return dumps(get_extended_details(baseurl,
+                                              namespace,
+                                              name,
+                                              provider,
+                                              version))
         raise ModuleNotFoundException("Module Not Found: " + module_name)
 
     def download_module(self, filepath):
@@ -222,23 +248,58 @@ class Dummy(AbstractBackend):
             FileNotFoundException: Raised if file does not exist
 
         Returns:
-            File: The bytearray representation of the requested file
+            Artifact: The content of the requested file
         """
         if "/" + dirname(dirname(filepath)) in self.dummy_data['modules'].keys():
-            filename = join("/", "tmp", basename(filepath))
-            # open file in write mode
-            file_obj = tarfile.open(name=filename, mode="w|gz")
-            with open(join("/", "tmp", basename("notsupported.txt")),
-                      mode="wt") as text:
-                text.write("This backend is for testing only.")
-            # Add other files to tar file
-            file_obj.add(join("/", "tmp", basename("notsupported.txt")))
-
-            # close file
-            file_obj.close()
-            return filename
+            return self.tarball()
         raise FileNotFoundException("The requested file was not found in this backend.")
 
+    def tarball(self):
+        """Get the tarball served for every module download.
+
+        The tarball and its ETag are built on first use and the same artifact
+        is returned afterwards, so downloads do not compress or hash anything.
+
+        Returns:
+            Artifact: Gzipped tarball holding a notsupported.txt
+        """
+        if Dummy.__tarball is None:
+            with Dummy.__tarball_lock:
+                if Dummy.__tarball is None:
+                    tarball = build_tarball(
+                        {"notsupported.txt": b"This backend is for testing only."})
+                    Dummy.__tarball = Artifact(tarball, len(tarball),
+                                               hashlib.sha256(tarball).hexdigest(),
+                                               None)
+        return Dummy.__tarball
+
+
+def build_tarball(files):
+    """Build a gzipped tarball in memory.
+
+    The gzip header and the members carry no timestamp, so every process
+    builds the same bytes and serves them with the same ETag.
+
+    Args:
+        files (dict): File name mapped to its content
+
+    Returns:
+        bytes: The tarball
+    """
+    import gzip  # only needed once a module is downloaded
+    import tarfile
+
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as compressed:
+        with tarfile.open(fileobj=compressed, mode="w") as tar:
+            for name, content in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mode = 0o644
+                info.mtime = 0
+                tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
 
 def get_extended_details(baseurl, namespace, name, provider, version):
     """Get Module with fully extended details.
@@ -265,8 +326,8 @@ def get_extended_details(baseurl, namespace, name, provider, version):
         'description': 'Fake Module.',
         'source': '{baseurl}storage/{module}'.format(
             baseurl=baseurl, module=module_name),
-        'published_at': '2021-10-17T01:22:17.792066Z',
-        'downloads': 213,
+        'published_at': PUBLISHED_AT,
+        'downloads': DOWNLOADS,
         'verified': True,
         "root": {
             "path": "",
@@ -292,31 +353,35 @@ def get_extended_details(baseurl, namespace, name, provider, version):
     }
 
 
-def get_module_details(baseurl, modules):
-    """Get extended details for the modules in the list.
+def filter_modules(modules, provider=None):
+    """Filter modules by provider.
+
+    All modules of this backend are verified, so there is no need
+    to filter on verification.
+
+    Args:
+        modules (iterable): Module names as /namespace/name/provider
+        provider (str, optional): Only keep this provider. Defaults to None.
+
+    Returns:
+        iterable: The modules matching the filter
+    """
+    if provider is None:
+        return modules
+    return (module for module in modules
+            if module.rsplit("/", 1)[1] == provider)
+
+
+@lru_cache(maxsize=None)
+def module_record(module):
+    """Get the listing record of a module.
 
     Args:
-        modules (list): [description]
+        module (str): Module name as /namespace/name/provider
 
     Returns:
-        list: List of modules including details
+        ModuleRecord: Listing record of the latest version
     """
-    module_details = []
-    for mod in modules:
-        data = mod.split("/")
-        details = {
-            'id': '{module}/2.0.0'.format(module=mod),
-            'owner': 'noone',
-            'namespace': data[1],
-            'name': data[2],
-            'version': '2.0.0',
-            'provider': data[3],
-            'description': 'Fake Module.',
-            'source': '{baseurl}storage{module}/2.0.0'.format(
-                baseurl=baseurl, module=mod),
-            'published_at': '2021-10-17T01:22:17.792066Z',
-            'downloads': 213,
-            'verified': True
-        }
-        module_details.append(details)
-    return module_details
+    namespace, name, provider = module.split("/")[1:]
+    return ModuleRecord(namespace, name, provider, "2.0.0", "noone", "Fake Module.",
+                        True, "storage{module}/2.0.0".format(module=module))
@@ -1,363 +1,414 @@
-import json
-import yaml
+import logging
+import os
+import threading
+import time
 
-from distutils.version import StrictVersion
-from os.path import join, exists, basename, relpath
+from os.path import join, exists, isdir, islink
 from os import scandir
-from .abstract import AbstractBackend
+from .blobstore import BlobStore, blob_digest
+from .catalog import CatalogBackend, artifact_path, same_module
+from .catalog_file import load_catalog, save_catalog
+from .ingest import publish_uploads
+from .metadata import MetadataCache
+from .watcher import create_watcher
 
 from ..exceptions import ModuleNotFoundException, FileNotFoundException
 
+logger = logging.getLogger(__name__)
 
-class Filesystem(AbstractBackend):
+
+class Filesystem(CatalogBackend):
     """Backend using local Filesystem for storage."""
 
-    def __init__(self, basedirectory):
+    def __init__(self, basedirectory, watch=None, poll_interval=5.0, workers=None,
+                 catalog_file=None, compile_metadata=False):
         """Instantiate Filesystem backend.
 
         Instantiate Filesystem backendusing basedirectory for
-        the root of the modules
+        the root of the modules. The directory tree is scanned once
+        into an in-memory catalog which serves all read paths.
+
+        Tarballs are either regular files or symlinks into the content
+        addressed store in ``.blobs``, where each distinct tarball is kept
+        once.
+
+        With a catalog file the catalog is restored from it instead, and the
+        tree is scanned in the background to reconcile the catalog with it.
+        The file is rewritten after every full scan of the tree. Processes
+        forking workers wait for the scan in before_fork, so it runs once.
 
         Args:
             basedirectory (str): basedirectory for modules.
+            watch (str, optional): Keep the catalog up to date by watching
+                the tree for changes, one of auto, inotify, poll or off.
+                Defaults to None, which does not watch.
+            poll_interval (float, optional): Seconds between polls when
+                polling for changes. Defaults to 5.0.
+            workers (int, optional): Threads checking and storing published
+                tarballs. Defaults to None, which picks one per CPU.
+            catalog_file (str, optional): Location of the catalog file.
+                Defaults to None, which scans the tree on every start.
+            compile_metadata (bool, optional): Write module_metadata.json
+                next to YAML metadata which changed. Defaults to False.
         """
-        self.basedir = basedirectory
         super().__init__()
+        self.basedir = basedirectory
+        self.metadata = MetadataCache(compile=compile_metadata)
+        self.blobs = BlobStore(join(basedirectory, ".blobs"))
+        self.workers = workers
+        self.__refresh_lock = threading.Lock()
+        self.catalog_file = catalog_file
+        self.reconciled = threading.Event()
+        self.__reconcile_thread = None
+        if self.__restore():
+            self.__start_reconcile()
+        else:
+            self.reload()
+            self.reconciled.set()
+        self.watch = watch
+        self.poll_interval = poll_interval
+        self.watcher = None
+        self.__start_watcher()
 
-    def get_versions(self, namespace, name, provider):
-        """Get The Versions.
+    def download_version(self, namespace, name, provider, version):
+        """Generate Download URL for module version.
 
         Args:
             namespace (str): namespace for the version
             name (str): Name of the module
             provider (str): Provider for the module
+            version (str): Version for the module
 
         Raises:
             ModuleNotFoundException: Error if module does not exist
 
         Returns:
-            json: JSON object containing the versions of the module on the server
+            str: Download url of the module itself
         """
-        provider_dir = join(self.basedir, namespace, name, provider)
-        if exists(provider_dir):
-            versions = [basename(f.path) for f in scandir(provider_dir) if f.is_dir()]
-            response = {
-                "modules": [
-                    {
-                        "versions": [{"version": ver} for ver in versions]
-                    }
-                ]
-
-            }
-            return json.dumps(response)
+        versions = self.catalog.snapshot().versions(namespace, name, provider)
+        if versions is not None and version in versions:
+            return artifact_path(namespace, name, provider, version)
         else:
             raise ModuleNotFoundException("Module Not Found")
 
-    def download_version(self, namespace, name, provider, version):
-        """Generate Download URL for module version.
+    def download_module(self, filepath):
+        """Download the module requested.
 
         Args:
-            namespace (str): namespace for the version
-            name (str): Name of the module
-            provider (str): Provider for the module
-            version (str): Version for the module
+            filepath (str): Path to the file requested
 
         Raises:
-            ModuleNotFoundException: Error if module does not exist
+            FileNotFoundException: Raised if file does not exist
 
         Returns:
-            str: Download url of the module itself
+            File: The bytearray representation of the requested file
         """
-        if exists(join(self.basedir, namespace, name, provider, version)):
-            filename = "{namespace}_{name}-{provider}-{version}.tar.gz".format(
-                namespace=namespace,
-                name=name,
-                provider=provider,
-                version=version)
-            return join(namespace, name, provider, version, filename)
-        else:
-            raise ModuleNotFoundException("Module Not Found")
+        if exists(join(self.basedir, filepath)):
+            return join(self.basedir, filepath)
+        raise FileNotFoundException("The requested file was not found in this backend.")
+
+    def before_fork(self):
+        """Finish reconciling the restored catalog before workers are forked.
+
+        Workers inherit the reconciled catalog instead of each scanning the
+        tree and rewriting the catalog file.
+        """
+        if self.__reconcile_thread is not None:
+            self.__reconcile_thread.join()
+
+    def after_fork(self):
+        """Watch the tree from the forked worker with a watcher of its own."""
+        super().after_fork()
+        self.metadata.after_fork()
+        self.__refresh_lock = threading.Lock()
+        if self.watcher is not None:
+            self.watcher.detach()
+            self.watcher = None
+        self.__start_watcher()
+
+    def __restore(self):
+        """Restore the catalog from the catalog file, if there is a usable one.
 
-    def __determine_latest(self, namespace, name, provider):
-        """Get latest version of module.
+        Returns:
+            bool: True if the catalog was restored
+        """
+        if self.catalog_file is None:
+            return False
+        modules = load_catalog(self.catalog_file, self.basedir)
+        if modules is None:
+            return False
+        self.catalog.restore(modules)
+        return True
+
+    def __start_reconcile(self):
+        """Reconcile the restored catalog with the tree in the background."""
+        self.__reconcile_thread = threading.Thread(
+            target=self.__reconcile, name="terra-store-reconcile", daemon=True)
+        self.__reconcile_thread.start()
+
+    def __reconcile(self):
+        """Rescan the tree the catalog was restored from."""
+        try:
+            self.reload()
+        except Exception:
+            logger.exception("Reconciling the catalog of %s failed", self.basedir)
+            return
+        self.reconciled.set()
+
+    def save_catalog(self):
+        """Write the catalog to the catalog file, if one is configured."""
+        if self.catalog_file is not None:
+            save_catalog(self.catalog_file, self.catalog.snapshot(), self.basedir)
+
+    def __start_watcher(self):
+        """Start watching the tree for changes, if configured."""
+        if self.watch and self.watch != "off":
+            self.watcher = create_watcher(self.basedir, self.__on_change,
+                                          self.watch, self.poll_interval)
+            self.watcher.start()
+
+    def store_artifact(self, namespace, name, provider, version, source):
+        """Store the tarball of a module version in the blob store.
 
         Args:
             namespace (str): namespace for the version
             name (str): Name of the module
             provider (str): Provider for the module
+            version (str): Version for the module
+            source (str): Location of the tarball, may be the version's own
 
         Returns:
-            [str]: Latest version found.
+            str: Hex sha256 digest of the tarball
         """
-        provider_dir = join(self.basedir, namespace, name, provider)
-        versions = [basename(f.path) for f in scandir(provider_dir) if f.is_dir()]
-        versions.sort(key=StrictVersion)
-        versions.reverse()
-        return versions[0]
+        path = join(self.basedir, artifact_path(namespace, name, provider, version))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        digest = self.blobs.put_file(source)
+        self.blobs.link(digest, path)
+        return digest
 
-    def download_latest(self, baseurl, namespace, name, provider):
-        """Find the latest version of the module.
+    def publish(self, uploads):
+        """Publish a batch of module versions.
 
-        Find the latest version of the module and return
-        a 302 to the download url for the module.
+        The batch is stored and linked into the tree by publish_uploads and
+        added to the catalog in a single update, so readers see either none
+        or all of it.
 
         Args:
-            namespace (str): namespace for the version
-            name (str): Name of the module
-            provider (str): Provider for the module
+            uploads (list): Upload of each version
 
         Raises:
-            ModuleNotFoundException: Error if module does not exist
+            InvalidModuleException: Raised if a tarball is invalid or a
+                version is given twice
+            ModuleExistsException: Raised if a version is already published
 
         Returns:
-            str: URL for downloading module
+            list: Hex sha256 digest of each tarball
         """
-        provider_dir = join(self.basedir, namespace, name, provider)
-        if exists(provider_dir):
-            latest_version = self.__determine_latest(namespace, name, provider)
-            url = "{base_url}/{namespace}/{name}/{provider}/{version}/download".format(
-                namespace=namespace, name=name,
-                provider=provider, version=latest_version,
-                base_url=baseurl + "v1/modules")
-            return url
-        raise ModuleNotFoundException("Module Not Found")
-
-    def get_modules(self, baseurl, namespace=None):
-        """Get all modules in namespace provided.
+        def record(held, modules):
+            self.catalog.update(modules=[self.__scan_module(namespace, name)
+                                         for namespace, name in modules])
 
-        Args:
-            namespace (str, optional): Namespace of modules. Defaults to None.
+        return publish_uploads(self.blobs, self.basedir, uploads,
+                               lambda: self.__refresh_lock, record, self.workers)
+
+    def dedupe(self):
+        """Move all tarballs still stored as regular files into the blob store.
 
         Returns:
-            json: JSON representation of the modules within the namespace
+            tuple: Number of tarballs moved and bytes freed
         """
-        if namespace is None:
-            namespaces = [basename(f.path) for f in scandir(self.basedir) if f.is_dir()]
-            namespaces.sort()
-        elif not exists(join(self.basedir, namespace)):
-            namespaces = []
-        else:
-            namespaces = [namespace]
-        modules = self.__get_all_modules(namespaces)
-        details = {
-            'meta': {
-                'limit': 0,
-                'current_offset': 0,
-            },
-            'modules': self.__get_module_details(baseurl, modules)
-        }
-        return json.dumps(details)
-
-    def search_modules(self, baseurl, query):
-        """Search the module list based on the query.
+        moved, freed = 0, 0
+        known = set(self.blobs.digests())
+        for namespace, name, provider, version in self.__artifacts():
+            path = join(self.basedir, artifact_path(namespace, name, provider, version))
+            if islink(path) or not exists(path):
+                continue
+            size = os.stat(path).st_size
+            digest = self.store_artifact(namespace, name, provider, version, path)
+            if digest in known:
+                freed += size
+            known.add(digest)
+            moved += 1
+        return moved, freed
+
+    def collect_blobs(self, grace=3600):
+        """Remove blobs no tarball points at.
+
+        Publishing stores the blobs of a batch before linking them, so blobs
+        stored within the grace period are kept, also when they are being
+        published by another process. Publishing in this process is held
+        off while collecting.
 
         Args:
-            query (str): Query string used for the search
+            grace (float, optional): Seconds a blob is kept after it was
+                stored. Defaults to 3600.
 
         Returns:
-            json: List of modules including details
+            list: Hex sha256 digests of the removed blobs
         """
-        namespaces = [basename(f.path) for f in scandir(self.basedir) if f.is_dir()]
-        namespaces.sort()
-        all_modules = self.__get_all_modules(namespaces)
-        modules = [module for module in all_modules if query.lstrip('/') in module]
-        results = {
-            "meta": {
-                "limit": 0,
-                "current_offset": 0,
-            },
-            "modules": self.__get_module_details(baseurl, modules)
-        }
-        return json.dumps(results)
-
-    def get_latest_all_providers(self, baseurl, namespace, name):
-        """Get Latest versions for each deployed provider.
-
-        Args:
-            namespace (str): namespace for the version
-            name (str): Name of the module
+        with self.__refresh_lock:
+            used = {blob_digest(join(self.basedir, artifact_path(*artifact)))
+                    for artifact in self.__artifacts()}
+            stored_before = time.time() - grace
+            unused = []
+            for digest in self.blobs.digests():
+                if digest in used:
+                    continue
+                try:
+                    if os.stat(self.blobs.path(digest)).st_mtime > stored_before:
+                        continue
+                    self.blobs.remove(digest)
+                except FileNotFoundError:
+                    continue
+                unused.append(digest)
+        return unused
+
+    def __artifacts(self):
+        """List the module versions in the catalog.
 
         Returns:
-            json: List of all provders and latest version for
-            defined namespace and name
+            list: (namespace, name, provider, version) of each version
         """
-        module_dir = join(self.basedir, namespace, name)
-        if exists(module_dir):
-            providers = [relpath(f.path, self.basedir)
-                         for f in scandir(module_dir) if f.is_dir()]
-            providers.sort()
-        else:
-            providers = []
-        return json.dumps({
-            "meta": {
-                "limit": 0,
-                "current_offset": 0
-            },
-            "modules": self.__get_module_details(baseurl, providers)
-        })
-
-    def get_module(self, baseurl, namespace, name, provider, version=None):
-        """Get module with extended details.
+        current = self.catalog.snapshot()
+        return [(namespace, name, provider, version)
+                for namespace in current.namespaces()
+                for name in current.names(namespace)
+                for provider, versions in current.get(namespace, name).providers.items()
+                for version in versions]
+
+    def __load_metadata(self, namespace, name):
+        """Load the module metadata from the filesystem.
 
         Args:
             namespace (str): namespace for the version
             name (str): Name of the module
-            provider (str): Provider for the module
-            version (str, optional): Version for the module. Defaults to None.
-
-        Raises:
-            ModuleNotFoundException: If module not found raise exception
 
         Returns:
-            dict: Module details with all extended attributes
+            dict: Full metadata dictonary for the module.
         """
-        provider_dir = join(self.basedir, namespace, name, provider)
-        if exists(provider_dir):
-            if version is None:
-                version = self.__determine_latest(namespace, name, provider)
-
-            return json.dumps(self.__get_extended_details(baseurl,
-                                                          namespace,
-                                                          name,
-                                                          provider,
-                                                          version))
-        else:
-            raise ModuleNotFoundException("Module Not Found")
-
-    def download_module(self, filepath):
-        """Download the module requested.
+        return self.metadata.load(join(self.basedir, namespace, name))
 
-        Args:
-            filepath (str): Path to the file requested
+    def reload(self):
+        """Rescan the whole directory tree into the catalog.
 
-        Raises:
-            FileNotFoundException: Raised if file does not exist
-
-        Returns:
-            File: The bytearray representation of the requested file
+        Only the modules which changed are replaced in the catalog. The
+        catalog file is rewritten afterwards.
         """
-        if exists(join(self.basedir, filepath)):
-            return join(self.basedir, filepath)
-        raise FileNotFoundException("The requested file was not found in this backend.")
-
-    def __get_extended_details(self, baseurl, namespace, name, provider, version):
-        """Get Module with fully extended details.
+        with self.__refresh_lock:
+            modules = [self.__scan_module(namespace, name)
+                       for namespace in self.__list_dirs()
+                       for name in self.__list_dirs(namespace)]
+            found = {(module[0], module[1]) for module in modules}
+            current = self.catalog.snapshot()
+            removed = [(namespace, name) for namespace in current.namespaces()
+                       for name in current.names(namespace)
+                       if (namespace, name) not in found]
+            changed = [module for module in modules
+                       if not same_module(current.get(module[0], module[1]),
+                                          module[2], module[3])]
+            if changed or removed:
+                self.catalog.update(modules=changed, removed=removed)
+        self.save_catalog()
+
+    def refresh(self, namespace=None, name=None, provider=None):
+        """Rescan part of the directory tree into the catalog.
+
+        Only the given subtree is read. Refreshing a namespace, or the
+        whole tree, picks up added and removed modules while the modules
+        already known are left untouched.
 
         Args:
-            namespace (str): namespace for the version
-            name (str): Name of the module
-            provider (str): Provider for the module
-            version (str): Version for the module
-
-        Returns:
-            dict: dict with all the module extended metadata
+            namespace (str, optional): namespace to refresh. Defaults to None.
+            name (str, optional): Name of the module to refresh. Defaults to None.
+            provider (str, optional): Provider to refresh. Defaults to None.
         """
-        module_name = "{namespace}/{name}/{provider}/{version}".format(
-            namespace=namespace, name=name,
-            provider=provider, version=version)
-        provider_dir = join(self.basedir,
-                            namespace,
-                            name,
-                            provider)
-        mod_dir = join(self.basedir, namespace, name)
-        meta = self.__load_metadata(namespace, name)
-        providers = [basename(f.path) for f in scandir(mod_dir) if f.is_dir()]
-        providers.sort()
-        versions = [basename(f.path) for f in scandir(provider_dir) if f.is_dir()]
-        versions.sort()
-        return {
-            'id': module_name,
-            'owner': meta['owner'],
-            'namespace': namespace,
-            'name': name,
-            'version': version,
-            'provider': provider,
-            'description': meta['description'],
-            'source': '{baseurl}dl/modules/{module}'.format(
-                baseurl=baseurl, module=module_name),
-            'published_at': '2021-10-17T01:22:17.792066Z',
-            'downloads': 213,
-            'verified': True,
-            "root": {
-                "path": "",
-                "readme": "# Title",
-                "empty": False,
-                "inputs": [
-                ],
-                "outputs": [
-                ],
-                "dependencies": [],
-                "resources": []
-            },
-            "submodules": [
-            ],
-            "providers": providers,
-            "versions": versions
-        }
-
-    def __get_module_details(self, baseurl, modules):
-        """Get extended details for the modules in the list.
+        with self.__refresh_lock:
+            current = self.catalog.snapshot()
+            if namespace is None:
+                on_disk = set(self.__list_dirs())
+                known = set(current.namespaces())
+                removed = [(ns, mod) for ns in sorted(known - on_disk)
+                           for mod in current.names(ns)]
+                added = [(ns, mod) for ns in sorted(on_disk - known)
+                         for mod in self.__list_dirs(ns)]
+            elif name is None:
+                on_disk = set(self.__list_dirs(namespace))
+                known = set(current.names(namespace))
+                removed = [(namespace, mod) for mod in sorted(known - on_disk)]
+                added = [(namespace, mod) for mod in sorted(on_disk - known)]
+            elif isdir(join(self.basedir, namespace, name)):
+                removed, added = [], [(namespace, name)]
+            else:
+                removed, added = [(namespace, name)], []
+            entry = current.get(namespace, name)
+            if provider is not None and entry is not None and added:
+                on_disk = set(self.__list_dirs(namespace, name, provider))
+                known = set(entry.providers.get(provider, ()))
+                self.catalog.set_versions(namespace, name, provider,
+                                          added=on_disk - known,
+                                          removed=known - on_disk)
+                return
+            modules = [self.__scan_module(ns, mod) for ns, mod in added]
+            self.catalog.update(modules=modules, removed=removed)
+
+    def __on_change(self, parts):
+        """Apply a change reported by the watcher.
 
         Args:
-            modules (list): List of modules to get the details for.
-
-        Returns:
-            list: List of modules including details
+            parts (tuple): Path components of the changed subtree, None
+                if the whole tree needs to be reconciled
         """
-        module_details = []
-        for mod in modules:
-            data = mod.split("/")
-            version = self.__determine_latest(data[0], data[1], data[2])
-            meta = self.__load_metadata(data[0], data[1])
-            details = {
-                'id': '/{module}/{version}'.format(
-                    module=mod, version=version),
-                'owner': meta['owner'],
-                'namespace': data[0],
-                'name': data[1],
-                'version': version,
-                'provider': data[2],
-                'description': meta['description'],
-                'source': '{baseurl}dl/modules/{module}/{version}'.format(
-                    baseurl=baseurl, module=mod, version=version),
-                'published_at': '2021-10-17T01:22:17.792066Z',
-                'downloads': 213,
-                'verified': True
-            }
-            module_details.append(details)
-        return module_details
+        if parts is None:
+            self.reload()
+        else:
+            self.refresh(*parts)
 
-    def __load_metadata(self, namespace, name):
-        """Load the module metadata from the filesystem.
+    def __scan_module(self, namespace, name):
+        """Scan a single module directory.
 
         Args:
-            namespace (str): namespace for the version
+            namespace (str): namespace for the module
             name (str): Name of the module
 
         Returns:
-            dict: Full metadata dictonary for the module.
+            tuple: (namespace, name, metadata, providers) of the module
         """
-        metafile = join(self.basedir, namespace, name, "module_metadata.yaml")
-        if exists(metafile):
-            with open(metafile) as metayaml:
-                return yaml.safe_load(metayaml)
-        raise FileNotFoundException("File was not found.")
+        try:
+            meta = self.__load_metadata(namespace, name)
+        except FileNotFoundException:
+            meta = {}
+        providers = {provider: self.__list_dirs(namespace, name, provider)
+                     for provider in self.__list_dirs(namespace, name)}
+        return (namespace, name, meta, providers)
 
-    def __get_all_modules(self, namespaces):
-        """Get all modules within the listed namespaces.
+    def __list_dirs(self, *parts):
+        """List the visible sub directories of a directory.
 
         Args:
-            namespaces (list): The namesapces in wbich to check for modules.
+            parts (str): Path components below basedir
 
         Returns:
-            list: List of modules in the namespaces
+            list: Sorted names of the sub directories
         """
-        modules = []
-        for namespace in namespaces:
-            nsdir = join(self.basedir, namespace)
-            for name in [basename(f.path) for f in scandir(nsdir) if f.is_dir()]:
-                ndir = join(nsdir, name)
-                modules.extend(
-                    [relpath(f.path, self.basedir) for f in scandir(ndir) if f.is_dir()])
-        modules.sort()
-        return modules
+        return list_dirs(self.basedir, *parts)
+
+
+def list_dirs(basedir, *parts):
+    """List the visible sub directories of a directory.
+
+    Args:
+        basedir (str): Root of the module tree
+        parts (str): Path components below basedir
+
+    Returns:
+        list: Sorted names of the sub directories, empty if the
+        directory does not exist
+    """
+    try:
+        entries = scandir(join(basedir, *parts))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    names = [f.name for f in entries
+             if f.is_dir() and not f.name.startswith(".")]
+    names.sort()
+    return names
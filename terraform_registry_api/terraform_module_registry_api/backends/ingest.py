@@ -0,0 +1,212 @@
+"""Collecting and checking module versions to publish.
+
+A batch of versions is given either as a directory or as a tar stream, both
+laid out like the Filesystem backend::
+
+    namespace/name/provider/version/namespace_name-provider-version.tar.gz
+
+Every tarball is checked to be a gzip compressed tar archive without members
+escaping the module directory before anything is published. Backends keeping
+their tarballs in a module tree publish a checked batch with publish_uploads.
+"""
+import functools
+import os
+import posixpath
+import re
+import shutil
+import tarfile
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from os.path import exists, join
+
+from .catalog import artifact_path
+from .versions import SEMVER
+from ..exceptions import InvalidModuleException, ModuleExistsException
+
+NAME = re.compile(r"^[0-9A-Za-z][0-9A-Za-z_-]*$")
+CHUNK_SIZE = 1024 * 1024
+
+Upload = namedtuple("Upload", ("namespace", "name", "provider", "version", "path"))
+
+
+def parse_artifact_path(path):
+    """Split the path of a tarball into the version it belongs to.
+
+    Args:
+        path (str): Path relative to the root of the layout
+
+    Returns:
+        tuple: (namespace, name, provider, version), None if the path is
+        not a tarball of the layout
+    """
+    parts = posixpath.normpath(path).split("/")
+    if len(parts) != 5 or "/".join(parts) != artifact_path(*parts[:4]):
+        return None
+    return tuple(parts[:4])
+
+
+def check_upload(upload):
+    """Check an upload is a valid module version.
+
+    Args:
+        upload (Upload): The version to check
+
+    Raises:
+        InvalidModuleException: Raised if the name, version or tarball is invalid
+    """
+    module = "/".join(upload[:4])
+    if not all(NAME.match(part) for part in upload[:3]):
+        raise InvalidModuleException("Invalid module name {}".format(module))
+    if SEMVER.match(upload.version) is None:
+        raise InvalidModuleException("Invalid version {}".format(module))
+    try:
+        with tarfile.open(upload.path, mode="r:gz") as tarball:
+            for member in tarball:
+                name = os.path.normpath(member.name)
+                if os.path.isabs(name) or name.split(os.sep)[0] == "..":
+                    raise InvalidModuleException(
+                        "Tarball of {} has a member outside the module".format(module))
+    except (tarfile.TarError, OSError, EOFError):
+        raise InvalidModuleException(
+            "Tarball of {} is not a valid .tar.gz".format(module))
+
+
+def store_upload(blobs, upload):
+    """Check an upload and copy its tarball into a blob store.
+
+    Args:
+        blobs (BlobStore): Store the tarball is copied into
+        upload (Upload): The version to store
+
+    Returns:
+        str: Hex sha256 digest of the tarball
+    """
+    check_upload(upload)
+    return blobs.put_file(upload.path)
+
+
+def publish_uploads(blobs, basedir, uploads, locked, record, workers=None):
+    """Publish a batch of module versions into a module tree.
+
+    The tarballs are checked and copied into the blob store by a pool of
+    threads. Only once all of them are stored are the versions linked into
+    the tree and recorded by the backend, both while holding locked, so
+    readers see either none or all of the batch. The links are removed again
+    if recording the batch fails.
+
+    Args:
+        blobs (BlobStore): Store the tarballs are copied into
+        basedir (str): Root of the module tree
+        uploads (list): Upload of each version
+        locked (callable): Returns the context manager held while linking
+            and recording the batch
+        record (callable): Called with the value of the context manager and
+            the sorted (namespace, name) of each module of the batch
+        workers (int, optional): Threads checking and storing the tarballs.
+            Defaults to None, which picks one per CPU.
+
+    Raises:
+        InvalidModuleException: Raised if a tarball is invalid or a version
+            is given twice
+        ModuleExistsException: Raised if a version is already published
+
+    Returns:
+        list: Hex sha256 digest of each tarball
+    """
+    seen = set()
+    for upload in uploads:
+        version = tuple(upload[:4])
+        if version in seen:
+            raise InvalidModuleException(
+                "Version {} is given twice".format("/".join(version)))
+        seen.add(version)
+    paths = [join(basedir, artifact_path(*upload[:4])) for upload in uploads]
+    check_unpublished(uploads, paths)
+    with ThreadPoolExecutor(workers) as pool:
+        digests = list(pool.map(functools.partial(store_upload, blobs), uploads))
+    with locked() as held:
+        check_unpublished(uploads, paths)
+        linked = []
+        try:
+            for path, digest in zip(paths, digests):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                blobs.link(digest, path)
+                linked.append(path)
+            record(held, sorted({tuple(upload[:2]) for upload in uploads}))
+        except BaseException:
+            for path in linked:
+                os.unlink(path)
+            raise
+    return digests
+
+
+def check_unpublished(uploads, paths):
+    """Check no version of a batch is in the module tree yet.
+
+    Args:
+        uploads (list): Upload of each version
+        paths (list): Location of the tarball of each version in the tree
+
+    Raises:
+        ModuleExistsException: Raised if a version is already published
+    """
+    for upload, path in zip(uploads, paths):
+        if exists(path):
+            raise ModuleExistsException(
+                "Version {} already exists".format("/".join(upload[:4])))
+
+
+def read_tree(directory):
+    """Collect the tarballs of a directory.
+
+    Args:
+        directory (str): Root of the layout
+
+    Returns:
+        list: Upload of each tarball found, files outside the layout are
+        ignored
+    """
+    uploads = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+        for filename in sorted(files):
+            path = join(root, filename)
+            version = parse_artifact_path(os.path.relpath(path, directory)
+                                          .replace(os.sep, "/"))
+            if version is not None:
+                uploads.append(Upload(*version, path))
+    return uploads
+
+
+def read_archive(stream, staging):
+    """Unpack the tarballs of a tar stream.
+
+    Args:
+        stream (file): Readable tar stream, optionally compressed
+        staging (str): Directory the tarballs are written to
+
+    Raises:
+        InvalidModuleException: Raised if the stream is not a tar archive
+            or holds files outside the layout
+
+    Returns:
+        list: Upload of each tarball
+    """
+    uploads = []
+    try:
+        with tarfile.open(fileobj=stream, mode="r|*") as archive:
+            for member in archive:
+                if member.isdir():
+                    continue
+                version = parse_artifact_path(member.name)
+                if version is None or not member.isfile():
+                    raise InvalidModuleException(
+                        "Unexpected entry {}".format(member.name))
+                path = join(staging, "{}.tar.gz".format(len(uploads)))
+                with open(path, "wb") as target:
+                    shutil.copyfileobj(archive.extractfile(member), target, CHUNK_SIZE)
+                uploads.append(Upload(*version, path))
+    except (tarfile.TarError, EOFError):
+        raise InvalidModuleException("The upload is not a valid tar archive")
+    return uploads
@@ -0,0 +1,176 @@
+"""Loading of module metadata files.
+
+Module metadata is written as ``module_metadata.yaml`` in the module
+directory. Next to it an optional ``module_metadata.json`` may hold the same
+metadata compiled to JSON, which is read in place of the YAML file while it
+is at least as recent, so loading never has to parse YAML. A cache created
+with compile set writes the JSON file whenever it has to parse the YAML
+file, so each change of the metadata is parsed as YAML once.
+
+Parsed metadata is cached keyed on the file path, modification time and
+size, and YAML is parsed with the libyaml ``CSafeLoader`` when PyYAML was
+built with it.
+"""
+import json
+import logging
+import os
+import threading
+
+from os.path import join
+
+import yaml
+
+from ..exceptions import FileNotFoundException
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = "module_metadata.yaml"
+COMPILED_METADATA_FILE = "module_metadata.json"
+METADATA_FILES = (METADATA_FILE, COMPILED_METADATA_FILE)
+
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class MetadataCache:
+    """Cache of parsed metadata files."""
+
+    def __init__(self, compile=False):
+        """Instantiate an empty cache.
+
+        Args:
+            compile (bool, optional): Write the compiled JSON metadata when
+                the YAML metadata is newer. Defaults to False.
+        """
+        self.compile = compile
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """int: Number of cached metadata files."""
+        return len(self._entries)
+
+    def after_fork(self):
+        """Replace the lock, which a thread of the parent may have held."""
+        self._lock = threading.Lock()
+
+    def load(self, directory):
+        """Load the metadata of a module.
+
+        Args:
+            directory (str): Module directory holding the metadata
+
+        Raises:
+            FileNotFoundException: Raised if there is no metadata file
+
+        Returns:
+            dict: The parsed metadata
+        """
+        source = stat(join(directory, METADATA_FILE))
+        compiled = stat(join(directory, COMPILED_METADATA_FILE))
+        if compiled is not None and (source is None or compiled[0] >= source[0]):
+            return self.__parse(join(directory, COMPILED_METADATA_FILE),
+                                compiled, json.load)
+        if source is not None and self.compile:
+            try:
+                metadata = compile_metadata(directory)
+            except OSError:
+                logger.warning("Could not compile the metadata of %s", directory,
+                               exc_info=True)
+            else:
+                with self._lock:
+                    self._entries[join(directory, COMPILED_METADATA_FILE)] = (
+                        stat(join(directory, COMPILED_METADATA_FILE)), metadata)
+                return metadata
+        if source is not None:
+            return self.__parse(join(directory, METADATA_FILE), source, parse_yaml)
+        with self._lock:
+            self._entries.pop(join(directory, METADATA_FILE), None)
+            self._entries.pop(join(directory, COMPILED_METADATA_FILE), None)
+        raise FileNotFoundException("File was not found.")
+
+    def clear(self):
+        """Drop all cached metadata."""
+        with self._lock:
+            self._entries.clear()
+
+    def __parse(self, path, version, parser):
+        """Parse a metadata file unless it is cached.
+
+        Args:
+            path (str): Path of the metadata file
+            version (tuple): Modification time and size of the file
+            parser (callable): Parses the opened file
+
+        Returns:
+            dict: The parsed metadata
+        """
+        cached = self._entries.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with open(path) as metafile:
+            metadata = parser(metafile) or {}
+        with self._lock:
+            self._entries[path] = (version, metadata)
+        return metadata
+
+
+def parse_yaml(stream):
+    """Parse YAML with the fastest safe loader available.
+
+    Args:
+        stream (file): Opened YAML file
+
+    Returns:
+        object: The parsed document
+    """
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def compile_metadata(directory):
+    """Write the compiled JSON metadata next to the YAML metadata.
+
+    The file is written under a temporary name and renamed into place, so
+    readers never see a partial file.
+
+    Args:
+        directory (str): Module directory holding module_metadata.yaml
+
+    Raises:
+        FileNotFoundException: Raised if there is no YAML metadata
+
+    Returns:
+        dict: The compiled metadata
+    """
+    try:
+        with open(join(directory, METADATA_FILE)) as metafile:
+            metadata = parse_yaml(metafile) or {}
+    except FileNotFoundError:
+        raise FileNotFoundException("File was not found.")
+    target = join(directory, COMPILED_METADATA_FILE)
+    staging = join(directory, "." + COMPILED_METADATA_FILE + ".tmp")
+    try:
+        with open(staging, "w") as compiled:
+            json.dump(metadata, compiled, default=str)
+        os.replace(staging, target)
+    except BaseException:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+    return metadata
+
+
+def stat(path):
+    """Get the version of a file for cache lookups.
+
+    Args:
+        path (str): Path of the file
+
+    Returns:
+        tuple: Modification time in nanoseconds and size, None if the file
+        does not exist
+    """
+    try:
+        result = os.stat(path)
+    except OSError:
+        return None
+    return (result.st_mtime_ns, result.st_size)
@@ -0,0 +1,77 @@
+"""Helpers for paginated module listings."""
+from itertools import islice
+from urllib.parse import urlencode
+
+
+def paginate(items, offset=0, limit=None):
+    """Take a single page from a sorted iterable.
+
+    Only the items up to the end of the page are consumed, plus one to find
+    out whether there is a next page.
+
+    Args:
+        items (iterable): Items in a stable sort order
+        offset (int, optional): Number of items to skip. Defaults to 0.
+        limit (int, optional): Maximum number of items on the page.
+            Defaults to None, which returns all remaining items.
+
+    Returns:
+        tuple: (list of items on the page, True if there are more items)
+    """
+    offset = max(offset or 0, 0)
+    if not limit or limit < 0:
+        return list(islice(items, offset, None)), False
+    page = list(islice(items, offset, offset + limit + 1))
+    return page[:limit], len(page) > limit
+
+
+def has_more(items, offset=0, limit=None):
+    """Find out whether a sorted iterable continues past a page.
+
+    Only the items up to the first one after the page are consumed.
+
+    Args:
+        items (iterable): Items in a stable sort order
+        offset (int, optional): Number of items to skip. Defaults to 0.
+        limit (int, optional): Maximum number of items on the page.
+            Defaults to None, in which case the page holds all items.
+
+    Returns:
+        bool: True if there are more items
+    """
+    if not limit or limit < 0:
+        return False
+    offset = max(offset or 0, 0)
+    return any(True for _ in islice(items, offset + limit, offset + limit + 1))
+
+
+def page_meta(url, offset=0, limit=None, more=False, **params):
+    """Build the meta section of a paginated response.
+
+    Args:
+        url (str): URL of the listing without any query string
+        offset (int, optional): Offset of the current page. Defaults to 0.
+        limit (int, optional): Requested page size. Defaults to None.
+        more (bool, optional): Whether there is a next page. Defaults to False.
+        params (str): Additional query parameters for the next page,
+            parameters which are None are left out
+
+    Returns:
+        dict: limit, current_offset and, if there is a next page,
+        next_offset and next_url
+    """
+    offset = max(offset or 0, 0)
+    limit = limit if limit and limit > 0 else 0
+    meta = {
+        'limit': limit,
+        'current_offset': offset,
+    }
+    if more:
+        query = {key: value for key, value in params.items() if value is not None}
+        query.update(limit=limit, offset=offset + limit)
+        meta['next_offset'] = offset + limit
+        meta['next_url'] = "{url}?{query}".format(
+            url=url, query=urlencode(
+                {key: str(value).lower() if isinstance(value, bool) else value
+                 for key, value in query.items()}))
+    return meta
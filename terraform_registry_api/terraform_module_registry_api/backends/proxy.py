@@ -0,0 +1,646 @@
+"""Pull-through caching proxy for an upstream module registry.
+
+Requests are forwarded to the upstream registry over a pooled keep-alive
+HTTP client and the responses kept in the cache directory:
+
+- API responses are cached for a configurable time in a bounded least
+  recently used cache in memory. Responses about a single module are also
+  kept on disk so they survive a restart, listings and searches, whose urls
+  carry a query string, are not. The page urls of listings are pointed at
+  this server.
+- Module archives are downloaded once and kept permanently in a content
+  addressed BlobStore, clients download them from this server.
+
+Concurrent requests for the same url result in a single upstream request,
+and cached responses are served past their expiry while the upstream cannot
+be reached. Without a cached response the request fails with
+UpstreamUnavailableException, answered with 502 Bad Gateway.
+
+Requires urllib3, installed with the proxy extra.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from os.path import exists, join
+from urllib.parse import quote, urlencode, urljoin, urlsplit
+
+try:
+    import urllib3
+except ImportError:  # pragma: no cover
+    urllib3 = None
+
+from .abstract import AbstractBackend
+from .blobstore import BlobStore, CHUNK_SIZE
+from .versions import VersionList
+from ...serialization import dumps
+from ..exceptions import (ModuleNotFoundException, FileNotFoundException,
+                          UpstreamUnavailableException)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE = re.compile(r"(\.tar\.gz|\.tgz|\.tar\.bz2|\.tar\.xz|\.zip)$")
+
+# Upstream responses which are cached, anything else counts as a failure
+CACHED_STATUSES = (200, 204, 404)
+
+
+class UpstreamError(Exception):
+    """The upstream registry could not be reached or failed."""
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into a single call."""
+
+    class Call:
+        """A call in progress."""
+
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            """Instantiate a pending call."""
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        """Instantiate without calls in progress."""
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """Call a function unless a call for the key is in progress.
+
+        Callers arriving while the call is in progress wait for it and get
+        its result, or its exception raised.
+
+        Args:
+            key (hashable): Identifies the call
+            function (callable): Function to call without arguments
+
+        Returns:
+            object: Result of the function
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight.Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class Proxy(AbstractBackend):
+    """Backend forwarding requests to an upstream registry."""
+
+    def __init__(self, upstream, cache_dir, ttl=300.0, timeout=10.0,
+                 max_connections=10, max_responses=1024, pool=None):
+        """Instantiate Proxy backend.
+
+        Args:
+            upstream (str): Root url of the upstream registry, e.g.
+                https://registry.terraform.io/
+            cache_dir (str): Directory holding cached responses and archives
+            ttl (float, optional): Seconds API responses are fresh.
+                Defaults to 300.
+            timeout (float, optional): Seconds to wait for the upstream to
+                connect and to send data. Defaults to 10.
+            max_connections (int, optional): Connections kept open per
+                upstream host. Defaults to 10.
+            max_responses (int, optional): Responses kept in memory.
+                Defaults to 1024.
+            pool (object, optional): urllib3 PoolManager to use. Defaults to
+                None, which creates one.
+
+        Raises:
+            ImportError: Raised if urllib3 is not installed
+        """
+        if pool is None:
+            if urllib3 is None:
+                raise ImportError("The Proxy backend requires urllib3, install "
+                                  "terraform_registry_api[proxy]")
+            pool = urllib3.PoolManager(
+                maxsize=max_connections, block=False, retries=False,
+                timeout=urllib3.Timeout(connect=timeout, read=timeout),
+                headers={"User-Agent": "terra-store"})
+        self.pool = pool
+        self.upstream = upstream.rstrip("/") + "/"
+        self.ttl = ttl
+        self.responses_dir = join(cache_dir, "responses")
+        self.refs_dir = join(cache_dir, "refs")
+        os.makedirs(self.responses_dir, exist_ok=True)
+        self.blobs = BlobStore(join(cache_dir, "blobs"))
+        self.max_responses = max_responses
+        self._responses = OrderedDict()
+        self._responses_lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def after_fork(self):
+        """Drop the upstream connections and fetches inherited from the parent.
+
+        Fetches in flight in the parent at fork time never finish in the
+        child, so its callers would wait on them forever.
+        """
+        self.pool.clear()
+        self._responses_lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def get_versions(self, namespace, name, provider):
+        """Get The Versions.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            json: JSON object containing the versions of the module on the server
+        """
+        return self.__module_request(namespace, name, provider, "versions")["body"]
+
+    def download_version(self, namespace, name, provider, version):
+        """Generate Download URL for module version.
+
+        Archives over http(s) are cached and served by this server, other
+        sources such as git repositories are returned as they are.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+            version (str): Version for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            str: Download url of the module itself
+        """
+        source = self.__source(namespace, name, provider, version)
+        extension = archive_extension(source)
+        if extension is None:
+            return source
+        return "/".join((namespace, name, provider, version, "{}_{}-{}-{}{}".format(
+            namespace, name, provider, version, extension)))
+
+    def download_latest(self, baseurl, namespace, name, provider):
+        """Find the latest version of the module.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            str: URL for downloading module
+        """
+        try:
+            modules = json.loads(self.get_versions(namespace, name, provider))["modules"]
+            latest = VersionList(version["version"] for module in modules
+                                 for version in module["versions"]).latest
+        except (ValueError, KeyError, TypeError):
+            latest = None
+        if latest is None:
+            raise ModuleNotFoundException("Module Not Found")
+        return "{base_url}/{namespace}/{name}/{provider}/{version}/download".format(
+            namespace=namespace, name=name, provider=provider, version=latest,
+            base_url=baseurl + "v1/modules")
+
+    def get_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                    provider=None, verified=None):
+        """Get all modules in namespace provided.
+
+        Args:
+            namespace (str, optional): Namespace of modules. Defaults to None.
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+
+        Returns:
+            json: JSON representation of the modules within the namespace
+        """
+        parts = (namespace,) if namespace is not None else ()
+        return self.__listing(baseurl, *parts, params=dict(
+            offset=offset, limit=limit, provider=provider, verified=verified))
+
+    def search_modules(self, baseurl, query, offset=0, limit=None,
+                       provider=None, verified=None, namespace=None):
+        """Search the module list based on the query.
+
+        Args:
+            query (str): Query string used for the search
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+            namespace (str, optional): Only return modules in this namespace.
+                Defaults to None.
+
+        Returns:
+            json: List of modules including details
+        """
+        return self.__listing(baseurl, "search", params=dict(
+            q=query, offset=offset, limit=limit, provider=provider,
+            verified=verified, namespace=namespace))
+
+    def get_latest_all_providers(self, baseurl, namespace, name, offset=0,
+                                 limit=None):
+        """Get Latest versions for each deployed provider.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            offset (int, optional): Number of providers to skip. Defaults to 0.
+            limit (int, optional): Maximum number of providers to return.
+                Defaults to None.
+
+        Returns:
+            json: List of all provders and latest version for
+            defined namespace and name
+        """
+        return self.__listing(baseurl, namespace, name, params=dict(
+            offset=offset, limit=limit))
+
+    def get_module(self, baseurl, namespace, name, provider, version=None):
+        """Get module with extended details.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+            version (str, optional): Version for the module. Defaults to None.
+
+        Raises:
+            ModuleNotFoundException: If module not found raise exception
+
+        Returns:
+            dict: Module details with all extended attributes
+        """
+        parts = (namespace, name, provider) + ((version,) if version else ())
+        return self.__module_request(*parts)["body"]
+
+    def download_module(self, filepath):
+        """Download the module requested.
+
+        The archive is fetched from the upstream source on first request
+        and kept in the blob store from then on.
+
+        Args:
+            filepath (str): Path to the file requested
+
+        Raises:
+            FileNotFoundException: Raised if file does not exist
+
+        Returns:
+            str: Location of the cached archive
+        """
+        parts = filepath.split("/")
+        if len(parts) != 5 or any(not part or part.startswith(".") for part in parts):
+            raise FileNotFoundException("The requested file was not found.")
+        ref = join(self.refs_dir, *parts)
+        digest = read_ref(ref)
+        if digest is not None and digest in self.blobs:
+            return self.blobs.path(digest)
+        try:
+            if self.download_version(*parts[:4]) != filepath:
+                raise FileNotFoundException("The requested file was not found.")
+            source = self.__source(*parts[:4])
+            digest = self._flight.do(("archive", filepath),
+                                     lambda: self.__store_archive(source, ref))
+        except (ModuleNotFoundException, UpstreamUnavailableException, UpstreamError):
+            raise FileNotFoundException("The requested file was not found.")
+        return self.blobs.path(digest)
+
+    def fetch(self, url):
+        """Get an upstream response, from the cache while it is fresh.
+
+        Args:
+            url (str): Upstream url
+
+        Raises:
+            UpstreamError: Raised if the upstream failed and nothing is cached
+
+        Returns:
+            dict: status, body, location and fetched time of the response
+        """
+        cached = self.__cached(url)
+        if cached is not None and cached["fetched"] + self.ttl > time.time():
+            return cached
+        try:
+            return self._flight.do(url, lambda: self.__refresh(url))
+        except UpstreamError as error:
+            if cached is None:
+                raise
+            logger.warning("Serving stale %s: %s", url, error)
+            return cached
+
+    def __module_request(self, *parts, params=None):
+        """Request an url of the upstream modules API.
+
+        Args:
+            parts (str): Path components below the modules API
+            params (dict, optional): Query parameters, None values are left
+                out. Defaults to None.
+
+        Raises:
+            ModuleNotFoundException: Raised if the upstream has no such module
+            UpstreamUnavailableException: Raised if the upstream failed and
+                nothing is cached
+
+        Returns:
+            dict: See fetch
+        """
+        url = self.__modules_url() + "/".join(quote(part, safe="") for part in parts)
+        params = {key: str(value).lower() if isinstance(value, bool) else value
+                  for key, value in (params or {}).items() if value is not None}
+        if params:
+            url += "?" + urlencode(params)
+        try:
+            response = self.fetch(url)
+        except UpstreamError:
+            raise UpstreamUnavailableException("Upstream registry unavailable")
+        if response["status"] == 404:
+            raise ModuleNotFoundException("Module Not Found")
+        return response
+
+    def __listing(self, baseurl, *parts, params=None):
+        """Request a listing of the upstream modules API.
+
+        The urls of the previous and next page are pointed at this server.
+
+        Args:
+            baseurl (str): Root url of the request
+            parts (str): Path components below the modules API
+            params (dict, optional): Query parameters, see __module_request.
+                Defaults to None.
+
+        Raises:
+            ModuleNotFoundException: Raised if the upstream has no such listing
+            UpstreamUnavailableException: Raised if the upstream failed and
+                nothing is cached
+
+        Returns:
+            bytes: JSON representation of the listing
+        """
+        body = self.__module_request(*parts, params=params)["body"]
+        try:
+            listing = json.loads(body)
+            meta = listing["meta"]
+            url = baseurl + "/".join(("v1", "modules") + tuple(
+                quote(part, safe="") for part in parts))
+            for key in ("prev_url", "next_url"):
+                if meta.get(key):
+                    meta[key] = "{}?{}".format(url, urlsplit(meta[key]).query)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return body
+        return dumps(listing)
+
+    def __modules_url(self):
+        """Discover the modules API of the upstream.
+
+        Returns:
+            str: Url of the upstream modules API, ending with a slash
+        """
+        try:
+            response = self.fetch(self.upstream + ".well-known/terraform.json")
+            if response["status"] == 200:
+                return urljoin(self.upstream, json.loads(response["body"])[
+                    "modules.v1"]).rstrip("/") + "/"
+        except (UpstreamError, ValueError, KeyError):
+            pass
+        return self.upstream + "v1/modules/"
+
+    def __source(self, namespace, name, provider, version):
+        """Get the upstream source of a module version.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+            version (str): Version for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            str: Absolute source address of the module
+        """
+        response = self.__module_request(namespace, name, provider, version, "download")
+        if not response["location"]:
+            raise ModuleNotFoundException("Module Not Found")
+        location = response["location"]
+        if "::" not in location and not urlsplit(location).scheme:
+            location = urljoin(response["url"], location)
+        return location
+
+    def __cached(self, url):
+        """Look up a cached response, in memory first and then on disk.
+
+        Args:
+            url (str): Upstream url
+
+        Returns:
+            dict: See fetch, None if the url was never fetched
+        """
+        with self._responses_lock:
+            cached = self._responses.get(url)
+            if cached is not None:
+                self._responses.move_to_end(url)
+                return cached
+        if not persisted(url):
+            return None
+        try:
+            with open(self.__response_path(url)) as stored:
+                cached = json.load(stored)
+        except (OSError, ValueError):
+            return None
+        self.__remember(url, cached)
+        return cached
+
+    def __remember(self, url, cached):
+        """Keep a response in memory, dropping the least recently used.
+
+        Args:
+            url (str): Upstream url
+            cached (dict): See fetch
+        """
+        with self._responses_lock:
+            self._responses[url] = cached
+            self._responses.move_to_end(url)
+            while len(self._responses) > self.max_responses:
+                self._responses.popitem(last=False)
+
+    def __refresh(self, url):
+        """Fetch a response from the upstream and cache it.
+
+        Args:
+            url (str): Upstream url
+
+        Raises:
+            UpstreamError: Raised if the upstream could not be reached or
+                returned an unexpected status
+
+        Returns:
+            dict: See fetch
+        """
+        response = self.__request(url)
+        if response.status not in CACHED_STATUSES:
+            raise UpstreamError("{} returned {}".format(url, response.status))
+        cached = {
+            "url": url,
+            "status": response.status,
+            "body": response.data.decode("utf-8"),
+            "location": response.headers.get("X-Terraform-Get"),
+            "fetched": time.time(),
+        }
+        if persisted(url) and response.status != 404:
+            handle, staged = tempfile.mkstemp(dir=self.responses_dir)
+            with os.fdopen(handle, "w") as stored:
+                json.dump(cached, stored)
+            os.replace(staged, self.__response_path(url))
+        elif persisted(url) and exists(self.__response_path(url)):
+            # answers for modules which do not exist are not kept either
+            os.remove(self.__response_path(url))
+        self.__remember(url, cached)
+        return cached
+
+    def __store_archive(self, source, ref):
+        """Download an archive into the blob store.
+
+        Args:
+            source (str): Url of the archive
+            ref (str): Path of the file recording the digest of the archive
+
+        Raises:
+            UpstreamError: Raised if the archive could not be downloaded
+
+        Returns:
+            str: Hex sha256 digest of the archive
+        """
+        response = self.__request(source, preload_content=False, redirect=True)
+        try:
+            if response.status != 200:
+                raise UpstreamError("{} returned {}".format(source, response.status))
+            digest = self.blobs.put(response.stream(CHUNK_SIZE))
+        except urllib3.exceptions.HTTPError as error:
+            raise UpstreamError(str(error))
+        finally:
+            response.release_conn()
+        os.makedirs(os.path.dirname(ref), exist_ok=True)
+        handle, staged = tempfile.mkstemp(dir=os.path.dirname(ref))
+        with os.fdopen(handle, "w") as stored:
+            stored.write(digest)
+        os.replace(staged, ref)
+        return digest
+
+    def __request(self, url, **kwargs):
+        """Send a GET request to the upstream.
+
+        Args:
+            url (str): Url to request
+            kwargs: Passed on to the urllib3 request
+
+        Raises:
+            UpstreamError: Raised if the request failed
+
+        Returns:
+            HTTPResponse: The response
+        """
+        kwargs.setdefault("redirect", False)
+        try:
+            return self.pool.request("GET", url, **kwargs)
+        except urllib3.exceptions.HTTPError as error:
+            raise UpstreamError(str(error))
+
+    def __response_path(self, url):
+        """Get the file a response is stored in.
+
+        Args:
+            url (str): Upstream url
+
+        Returns:
+            str: Path of the stored response
+        """
+        return join(self.responses_dir,
+                    hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def archive_extension(source):
+    """Get the archive type of a module source.
+
+    Args:
+        source (str): Source address of a module
+
+    Returns:
+        str: Extension of the archive, None unless the source is an archive
+        downloaded over http(s) that can be cached
+    """
+    if "::" in source:
+        return None
+    parts = urlsplit(source)
+    if parts.scheme not in ("http", "https") or "//" in parts.path:
+        return None
+    match = ARCHIVE.search(parts.path)
+    return match.group(1) if match else None
+
+
+def persisted(url):
+    """Tell whether a response is kept on disk.
+
+    Listings and searches are left out, their query strings are chosen by
+    clients and would fill the disk with responses nobody asks for again.
+
+    Args:
+        url (str): Upstream url
+
+    Returns:
+        bool: True unless the url has a query string
+    """
+    return not urlsplit(url).query
+
+
+def read_ref(path):
+    """Read the digest recorded for an archive.
+
+    Args:
+        path (str): Path of the ref file
+
+    Returns:
+        str: Hex sha256 digest, None if the archive was never stored
+    """
+    if not exists(path):
+        return None
+    with open(path) as ref:
+        return ref.read().strip() or None
@@ -0,0 +1,162 @@
+"""Compact records of listed modules and their JSON serialization.
+
+A module provider is listed with the same JSON object on every request,
+only the root url of the request differs. A ModuleRecord holds that object
+encoded once, split around the root url, so a listing is written by
+joining byte strings rather than by building and encoding a dict for each
+module.
+"""
+from itertools import islice
+
+from ...serialization import dumps, escape
+
+PUBLISHED_AT = "2021-10-17T01:22:17.792066Z"
+DOWNLOADS = 213
+STREAM_CHUNK = 256
+
+
+class ModuleRecord:
+    """Listing entry of the latest version of a module provider."""
+
+    __slots__ = ("head", "tail")
+
+    def __init__(self, namespace, name, provider, version, owner, description,
+                 verified, source):
+        """Render the listing entry.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+            provider (str): Provider for the module
+            version (str): Latest version of the module
+            owner (str): Owner from the module metadata
+            description (str): Description from the module metadata
+            verified (bool): Whether the module is verified
+            source (str): Download location relative to the root url
+        """
+        fields = dumps({
+            "id": "/{}/{}/{}/{}".format(namespace, name, provider, version),
+            "owner": owner,
+            "namespace": namespace,
+            "name": name,
+            "version": version,
+            "provider": provider,
+            "description": description
+        })
+        trailer = dumps({
+            "published_at": PUBLISHED_AT,
+            "downloads": DOWNLOADS,
+            "verified": verified
+        })
+        self.head = fields[:-1] + b',"source":"'
+        self.tail = escape(source) + b'",' + trailer[1:]
+
+    def render(self, baseurl):
+        """Render the record as JSON.
+
+        Args:
+            baseurl (str): Root url of the request
+
+        Returns:
+            bytes: The JSON object
+        """
+        return self.head + escape(baseurl) + self.tail
+
+
+def module_details(baseurl, namespace, name, provider, version, owner, description,
+                   verified, providers, versions):
+    """Build the extended details of a module version.
+
+    Args:
+        baseurl (str): Root url of the request
+        namespace (str): namespace for the module
+        name (str): Name of the module
+        provider (str): Provider for the module
+        version (str): Version for the module
+        owner (str): Owner from the module metadata
+        description (str): Description from the module metadata
+        verified (bool): Whether the module is verified
+        providers (list): Sorted providers of the module
+        versions (list): Sorted versions of the provider
+
+    Returns:
+        dict: dict with all the module extended metadata
+    """
+    module_name = "{namespace}/{name}/{provider}/{version}".format(
+        namespace=namespace, name=name,
+        provider=provider, version=version)
+    return {
+        'id': module_name,
+        'owner': owner,
+        'namespace': namespace,
+        'name': name,
+        'version': version,
+        'provider': provider,
+        'description': description,
+        'source': '{baseurl}dl/modules/{module}'.format(
+            baseurl=baseurl, module=module_name),
+        'published_at': PUBLISHED_AT,
+        'downloads': DOWNLOADS,
+        'verified': verified,
+        "root": {
+            "path": "",
+            "readme": "# Title",
+            "empty": False,
+            "inputs": [
+            ],
+            "outputs": [
+            ],
+            "dependencies": [],
+            "resources": []
+        },
+        "submodules": [
+        ],
+        "providers": providers,
+        "versions": versions
+    }
+
+
+def render_listing(baseurl, meta, records):
+    """Render a page of listed modules.
+
+    Args:
+        baseurl (str): Root url of the request
+        meta (dict): Pagination metadata of the page
+        records (iterable): ModuleRecord of each module on the page
+
+    Returns:
+        bytes: JSON object holding the meta and modules of the page
+    """
+    escaped = escape(baseurl)
+    modules = b",".join(record.head + escaped + record.tail for record in records)
+    return b'{"meta":' + dumps(meta) + b',"modules":[' + modules + b']}'
+
+
+def stream_listing(baseurl, meta, records, chunk=STREAM_CHUNK):
+    """Render a page of listed modules as a stream.
+
+    The chunks join to the same document as render_listing.
+
+    Args:
+        baseurl (str): Root url of the request
+        meta (dict): Pagination metadata of the page
+        records (iterable): ModuleRecord of each module on the page, read
+            lazily
+        chunk (int, optional): Records rendered into each chunk.
+            Defaults to 256.
+
+    Yields:
+        bytes: Consecutive parts of the JSON object
+    """
+    escaped = escape(baseurl)
+    records = iter(records)
+    separator = b""
+    yield b'{"meta":' + dumps(meta) + b',"modules":['
+    while True:
+        batch = [record.head + escaped + record.tail
+                 for record in islice(records, chunk)]
+        if not batch:
+            break
+        yield separator + b",".join(batch)
+        separator = b","
+    yield b"]}"
@@ -0,0 +1,273 @@
+"""Backend storing modules in an S3 compatible bucket.
+
+Objects are laid out like the Filesystem backend, below an optional prefix::
+
+    namespace/name/module_metadata.yaml
+    namespace/name/provider/version/namespace_name-provider-version.tar.gz
+
+The bucket is listed into the in-memory catalog on start and then again in
+the background, so requests never list the bucket. Each refresh compares
+the listing against the previous one and only fetches metadata objects whose
+ETag changed. S3 cannot list only the objects changed since a point in time,
+so every refresh still lists the whole prefix, one ListObjectsV2 request per
+1000 objects; pick the refresh interval with the size of the bucket in mind.
+Downloads are answered with presigned urls, so tarballs go straight from the
+bucket to the client.
+
+Requires boto3, installed with the s3 extra.
+"""
+import json
+import logging
+import threading
+
+import yaml
+
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover
+    boto3 = None
+    ClientError = Exception
+
+from .abstract import Artifact
+from .catalog import CatalogBackend, artifact_path
+from .metadata import METADATA_FILE, COMPILED_METADATA_FILE, parse_yaml
+from ..exceptions import ModuleNotFoundException, FileNotFoundException
+
+logger = logging.getLogger(__name__)
+
+
+class S3(CatalogBackend):
+    """Backend using an S3 compatible bucket for storage."""
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, region=None,
+                 refresh_interval=60.0, url_expiry=3600, max_connections=50,
+                 client=None):
+        """Instantiate S3 backend.
+
+        Args:
+            bucket (str): Name of the bucket holding the modules
+            prefix (str, optional): Key prefix of the modules. Defaults to "".
+            endpoint_url (str, optional): Endpoint of an S3 compatible
+                service such as MinIO. Defaults to None, which uses AWS.
+            region (str, optional): Region of the bucket. Defaults to None.
+            refresh_interval (float, optional): Seconds between listings of
+                the bucket, 0 only lists it once. Each listing costs one
+                request per 1000 objects below the prefix. Defaults to 60.
+            url_expiry (int, optional): Seconds presigned download urls are
+                valid. Defaults to 3600.
+            max_connections (int, optional): Size of the HTTP connection
+                pool. Defaults to 50.
+            client (object, optional): boto3 S3 client to use. Defaults to
+                None, which creates one.
+
+        Raises:
+            ImportError: Raised if boto3 is not installed
+        """
+        self.__connect = None
+        if client is None:
+            if boto3 is None:
+                raise ImportError("The S3 backend requires boto3, install "
+                                  "terraform_registry_api[s3]")
+            config = Config(max_pool_connections=max_connections,
+                            retries={"max_attempts": 3, "mode": "standard"})
+            self.__connect = lambda: boto3.client(
+                "s3", endpoint_url=endpoint_url, region_name=region, config=config)
+            client = self.__connect()
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.url_expiry = url_expiry
+        self._listing = {}
+        self._metadata = {}
+        self.__refresh_lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.refresh()
+        self.refresh_interval = refresh_interval
+        self.refresher = None
+        self.__start_refresher()
+
+    def download_version(self, namespace, name, provider, version):
+        """Generate Download URL for module version.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+            version (str): Version for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            str: Presigned url of the module tarball
+        """
+        versions = self.catalog.snapshot().versions(namespace, name, provider)
+        if versions is None or version not in versions:
+            raise ModuleNotFoundException("Module Not Found")
+        return self.client.generate_presigned_url(
+            "get_object", ExpiresIn=self.url_expiry,
+            Params={"Bucket": self.bucket,
+                    "Key": self.prefix + artifact_path(namespace, name, provider,
+                                                       version)})
+
+    def download_module(self, filepath):
+        """Download the module requested.
+
+        Clients are sent to presigned urls, this is only used if a module
+        is requested through the API server itself. The object is streamed
+        from the bucket instead of being read into memory.
+
+        Args:
+            filepath (str): Path to the file requested
+
+        Raises:
+            FileNotFoundException: Raised if file does not exist
+
+        Returns:
+            Artifact: The open body of the object, with its size and ETag
+        """
+        parts = tuple(filepath.split("/"))
+        if len(parts) != 5 or filepath != artifact_path(*parts[:4]) \
+                or parts[3] not in (self.catalog.snapshot().versions(*parts[:3]) or ()):
+            raise FileNotFoundException(
+                "The requested file was not found in this backend.")
+        try:
+            response = self.client.get_object(Bucket=self.bucket,
+                                              Key=self.prefix + filepath)
+        except ClientError:
+            raise FileNotFoundException(
+                "The requested file was not found in this backend.")
+        return Artifact(response["Body"], response["ContentLength"],
+                        response["ETag"].strip('"'),
+                        int(response["LastModified"].timestamp()))
+
+    def refresh(self):
+        """List the bucket and apply the changes to the catalog.
+
+        Only modules whose objects changed since the previous listing are
+        updated, and metadata is only fetched when its ETag changed. The
+        listing is only recorded once the catalog is updated, and modules
+        whose metadata could not be fetched or parsed are left out of it, so
+        the next refresh tries them again.
+        """
+        with self.__refresh_lock:
+            listing = self.__list()
+            previous = self._listing
+            changed = [module for module, state in listing.items()
+                       if previous.get(module) != state]
+            removed = [module for module in previous if module not in listing]
+            if not changed and not removed:
+                return
+            modules = []
+            committed = dict(listing)
+            for namespace, name in changed:
+                providers, metadata_key, etag = listing[(namespace, name)]
+                metadata = self.__load_metadata(metadata_key, etag)
+                if metadata is None:
+                    # not recorded as listed, so the next refresh fetches it again
+                    committed[(namespace, name)] = None
+                    cached = self._metadata.get(metadata_key)
+                    metadata = {} if cached is None else cached[1]
+                modules.append((namespace, name, metadata,
+                                {provider: versions for provider, versions in providers}))
+            live = {state[1] for state in listing.values()}
+            self._metadata = {key: cached for key, cached in self._metadata.items()
+                              if key in live}
+            self.catalog.update(modules=modules, removed=removed)
+            self._listing = committed
+
+    def close(self):
+        """Stop refreshing the listing in the background."""
+        self.__stopped.set()
+
+    def after_fork(self):
+        """Connect and refresh the listing from the forked worker."""
+        super().after_fork()
+        if self.__connect is not None:
+            self.client = self.__connect()
+        self.__refresh_lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__start_refresher()
+
+    def __start_refresher(self):
+        """Start refreshing the listing in the background, if configured."""
+        if self.refresh_interval:
+            self.refresher = threading.Thread(target=self.__run,
+                                              args=(self.refresh_interval,),
+                                              name="s3-refresh", daemon=True)
+            self.refresher.start()
+
+    def __run(self, interval):
+        """Refresh the listing until closed.
+
+        Args:
+            interval (float): Seconds between listings
+        """
+        while not self.__stopped.wait(interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Refreshing the listing of %s failed", self.bucket)
+
+    def __list(self):
+        """List the modules in the bucket.
+
+        Returns:
+            dict: (namespace, name) mapped to a tuple of its sorted
+            (provider, versions) pairs, the key and the ETag of its metadata
+        """
+        found = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", ()):
+                parts = item["Key"][len(self.prefix):].split("/")
+                if len(parts) < 3 or any(part.startswith(".") or not part
+                                         for part in parts):
+                    continue
+                module = found.setdefault(tuple(parts[:2]), [{}, None, None])
+                if len(parts) == 3 and parts[2] in (METADATA_FILE,
+                                                    COMPILED_METADATA_FILE):
+                    if module[1] is None or parts[2] == COMPILED_METADATA_FILE:
+                        module[1], module[2] = item["Key"], item["ETag"]
+                elif len(parts) == 5 and "/".join(parts) == artifact_path(*parts[:4]):
+                    module[0].setdefault(parts[2], set()).add(parts[3])
+        return {key: (tuple(sorted((provider, tuple(sorted(versions)))
+                                   for provider, versions in providers.items())),
+                      metadata_key, etag)
+                for key, (providers, metadata_key, etag) in found.items()
+                if providers}
+
+    def __load_metadata(self, key, etag):
+        """Fetch and parse a metadata object unless it is cached.
+
+        Args:
+            key (str): Key of the metadata object, None if there is none
+            etag (str): ETag of the metadata object
+
+        Returns:
+            dict: The parsed metadata, empty if the module has none, None if
+            it could not be fetched or parsed
+        """
+        if key is None:
+            return {}
+        cached = self._metadata.get(key)
+        if cached is not None and cached[0] == etag:
+            return cached[1]
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except ClientError:
+            logger.warning("Could not fetch %s", key)
+            return None
+        try:
+            if key.endswith(".json"):
+                metadata = json.loads(body) or {}
+            else:
+                metadata = parse_yaml(body) or {}
+        except (ValueError, yaml.YAMLError):
+            logger.warning("Could not parse %s", key)
+            return None
+        self._metadata[key] = (etag, metadata)
+        return metadata
@@ -0,0 +1,158 @@
+"""Trigram index used to search the modules of a catalog.
+
+Every module provider is indexed with its namespace/name/provider path and
+the owner and description from its metadata. Each field is split into
+trigrams, so a substring query only has to intersect the posting sets of its
+own trigrams before the few remaining candidates are checked and ranked.
+"""
+import threading
+
+# Fields of an indexed document, in the order they are stored
+FIELDS = ("path", "namespace", "name", "provider", "owner", "description")
+
+# Score for a match on a field, exact and prefix matches rank higher
+EXACT_SCORES = {"path": 100, "name": 90, "namespace": 60, "provider": 50}
+PREFIX_SCORES = {"path": 80, "name": 70, "namespace": 40, "provider": 30}
+MATCH_SCORES = {"path": 20, "name": 20, "namespace": 10, "provider": 10,
+                "owner": 5, "description": 1}
+
+
+class SearchIndex:
+    """Inverted trigram index over module providers."""
+
+    def __init__(self):
+        """Instantiate an empty index."""
+        self._documents = {}
+        self._postings = {}
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """int: Number of indexed module providers."""
+        return len(self._documents)
+
+    def after_fork(self):
+        """Replace the lock, which a thread of the parent may have held."""
+        self._lock = threading.Lock()
+
+    def set_module(self, namespace, name, metadata, providers):
+        """Index a module, replacing what was indexed for it before.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+            metadata (dict): Parsed module metadata
+            providers (iterable): Providers of the module
+        """
+        owner = str(metadata.get("owner") or "")
+        description = str(metadata.get("description") or "")
+        with self._lock:
+            self._remove(namespace, name)
+            keys = []
+            for provider in providers:
+                key = (namespace, name, provider)
+                fields = tuple(field.lower() for field in (
+                    "/".join(key), namespace, name, provider, owner, description))
+                self._documents[key] = fields
+                for gram in set().union(*(trigrams(field) for field in fields)):
+                    self._postings.setdefault(gram, set()).add(key)
+                keys.append(key)
+            if keys:
+                self._modules[(namespace, name)] = keys
+
+    def remove_module(self, namespace, name):
+        """Remove a module from the index.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+        """
+        with self._lock:
+            self._remove(namespace, name)
+
+    def search(self, query):
+        """Find the module providers matching a query.
+
+        The query matches if it is a substring of any indexed field, ignoring
+        case. Results are ranked with exact and prefix matches on the path
+        and the name first.
+
+        Args:
+            query (str): Query string
+
+        Returns:
+            list: (namespace, name, provider) tuples, best match first
+        """
+        query = query.lstrip("/").lower()
+        with self._lock:
+            if not query:
+                candidates = list(self._documents)
+            elif len(query) < 3:
+                candidates = set()
+                for gram, keys in self._postings.items():
+                    if query in gram:
+                        candidates.update(keys)
+            else:
+                postings = sorted((self._postings.get(gram, ()) for gram in
+                                   trigrams(query)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            ranked = []
+            for key in candidates:
+                score = rank(self._documents[key], query)
+                if score:
+                    ranked.append((-score, key))
+        ranked.sort()
+        return [key for _, key in ranked]
+
+    def _remove(self, namespace, name):
+        """Remove a module from the index, the lock must be held.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+        """
+        for key in self._modules.pop((namespace, name), ()):
+            for gram in set().union(*(trigrams(field)
+                                      for field in self._documents.pop(key))):
+                keys = self._postings[gram]
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+
+def trigrams(text):
+    """Split text into its trigrams.
+
+    Args:
+        text (str): Text to split
+
+    Returns:
+        set: Trigrams of the text, or the text itself if it is shorter
+    """
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def rank(fields, query):
+    """Score how well a document matches a query.
+
+    Args:
+        fields (tuple): Lower cased document fields, see FIELDS
+        query (str): Lower cased query
+
+    Returns:
+        int: Score of the best matching field, 0 if none match
+    """
+    best = 0
+    for field, value in zip(FIELDS, fields):
+        if value == query:
+            score = EXACT_SCORES.get(field, MATCH_SCORES[field])
+        elif value.startswith(query):
+            score = PREFIX_SCORES.get(field, MATCH_SCORES[field])
+        elif query in value:
+            score = MATCH_SCORES[field]
+        else:
+            continue
+        best = max(best, score)
+    return best
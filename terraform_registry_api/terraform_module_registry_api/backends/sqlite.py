@@ -0,0 +1,710 @@
+"""Backend keeping the module catalog in an SQLite database.
+
+Modules, providers and versions are rows of indexed tables, so listings,
+pagination and version lookups are answered by single index range queries
+instead of from a catalog held in memory. Search runs on an FTS5 table with
+the trigram tokenizer, which matches substrings like the in-memory search
+index, and ranks with the scores of search.rank computed in SQL.
+
+The tarballs stay in a module tree on disk laid out like the Filesystem
+backend. The database is synced with the tree on start, with ``terra-store
+index`` and whenever versions are published through the backend.
+
+Every thread reads through a connection of its own, the database is in WAL
+mode so readers are not blocked by a write in progress.
+"""
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+from os.path import join, exists
+
+from ...serialization import dumps
+from .abstract import AbstractBackend
+from .blobstore import BlobStore
+from .catalog import artifact_path, served_metadata
+from .filesystem import list_dirs
+from .ingest import publish_uploads
+from .metadata import MetadataCache
+from .pagination import page_meta
+from .records import ModuleRecord, module_details, render_listing
+from .search import EXACT_SCORES, FIELDS, MATCH_SCORES, PREFIX_SCORES
+from .versions import VersionList
+from ..exceptions import ModuleNotFoundException, FileNotFoundException
+
+FORMAT = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS modules (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    owner TEXT,
+    description TEXT,
+    verified INTEGER NOT NULL,
+    UNIQUE (namespace, name)
+);
+CREATE TABLE IF NOT EXISTS providers (
+    id INTEGER PRIMARY KEY,
+    module INTEGER NOT NULL REFERENCES modules (id),
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    latest TEXT NOT NULL,
+    UNIQUE (namespace, name, provider)
+);
+CREATE INDEX IF NOT EXISTS providers_by_module ON providers (module);
+CREATE INDEX IF NOT EXISTS providers_by_provider ON providers (provider, namespace, name);
+CREATE TABLE IF NOT EXISTS versions (
+    provider INTEGER NOT NULL REFERENCES providers (id),
+    position INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    PRIMARY KEY (provider, position)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS versions_by_name ON versions (provider, version);
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5 (
+    path, namespace, name, provider, owner, description, tokenize = 'trigram'
+);
+"""
+
+LISTING = """
+SELECT providers.namespace, providers.name, providers.provider, latest, owner,
+       description, verified
+FROM {source} JOIN modules ON modules.id = providers.module
+"""
+
+
+def score_expression():
+    """Build the SQL expression scoring a row of the search table.
+
+    The expression gives the same scores as search.rank for the lower cased
+    query bound to :query.
+
+    Returns:
+        str: The expression
+    """
+    terms = []
+    for field in FIELDS:
+        terms.append(
+            "CASE instr({field}, :query) WHEN 0 THEN 0 WHEN 1 THEN "
+            "CASE WHEN {field} = :query THEN {exact} ELSE {prefix} END "
+            "ELSE {match} END".format(
+                field=field, exact=EXACT_SCORES.get(field, MATCH_SCORES[field]),
+                prefix=PREFIX_SCORES.get(field, MATCH_SCORES[field]),
+                match=MATCH_SCORES[field]))
+    return "max({})".format(", ".join(terms))
+
+
+SCORE = score_expression()
+
+
+class SQLite(AbstractBackend):
+    """Backend serving a module tree through an SQLite catalog."""
+
+    def __init__(self, basedirectory, database, sync=True, workers=None,
+                 compile_metadata=False):
+        """Instantiate SQLite backend.
+
+        Args:
+            basedirectory (str): basedirectory for modules.
+            database (str): Location of the SQLite database, which is
+                created if it does not exist.
+            sync (bool, optional): Sync the database with the module tree.
+                Defaults to True.
+            workers (int, optional): Threads checking and storing published
+                tarballs. Defaults to None, which picks one per CPU.
+            compile_metadata (bool, optional): Write module_metadata.json
+                next to YAML metadata which changed. Defaults to False.
+        """
+        self.basedir = basedirectory
+        self.database = database
+        self.workers = workers
+        self.metadata = MetadataCache(compile=compile_metadata)
+        self.blobs = BlobStore(join(basedirectory, ".blobs"))
+        self.__local = threading.local()
+        self.__write_lock = threading.Lock()
+        self.__create()
+        if sync:
+            self.sync()
+
+    @property
+    def generation(self):
+        """int: Number of writes applied to the database."""
+        return self.__connection().execute(
+            "SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def after_fork(self):
+        """Open new connections from the forked worker process."""
+        self.metadata.after_fork()
+        self.__local = threading.local()
+        self.__write_lock = threading.Lock()
+
+    def get_versions(self, namespace, name, provider):
+        """Get The Versions.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            json: JSON object containing the versions of the module on the server
+        """
+        versions = self.__versions(self.__connection(), namespace, name, provider)
+        if not versions:
+            raise ModuleNotFoundException("Module Not Found")
+        return dumps({"modules": [{"versions": [{"version": version}
+                                                for version in versions]}]})
+
+    def download_version(self, namespace, name, provider, version):
+        """Generate Download URL for module version.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+            version (str): Version for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            str: Download url of the module itself
+        """
+        found = self.__connection().execute(
+            "SELECT 1 FROM providers JOIN versions ON versions.provider = providers.id "
+            "WHERE namespace = ? AND name = ? AND providers.provider = ? "
+            "AND version = ?", (namespace, name, provider, version)).fetchone()
+        if found is None:
+            raise ModuleNotFoundException("Module Not Found")
+        return artifact_path(namespace, name, provider, version)
+
+    def download_latest(self, baseurl, namespace, name, provider):
+        """Find the latest version of the module.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Raises:
+            ModuleNotFoundException: Error if module does not exist
+
+        Returns:
+            str: URL for downloading module
+        """
+        row = self.__connection().execute(
+            "SELECT latest FROM providers WHERE namespace = ? AND name = ? "
+            "AND provider = ?", (namespace, name, provider)).fetchone()
+        if row is None:
+            raise ModuleNotFoundException("Module Not Found")
+        return "{base_url}/{namespace}/{name}/{provider}/{version}/download".format(
+            namespace=namespace, name=name, provider=provider, version=row[0],
+            base_url=baseurl + "v1/modules")
+
+    def get_modules(self, baseurl, namespace=None, offset=0, limit=None,
+                    provider=None, verified=None):
+        """Get all modules in namespace provided.
+
+        Args:
+            namespace (str, optional): Namespace of modules. Defaults to None.
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+
+        Returns:
+            json: JSON representation of the modules within the namespace
+        """
+        conditions, params = filters(namespace, provider, verified)
+        rows, more = self.__page(
+            LISTING.format(source="providers") + where(conditions)
+            + " ORDER BY providers.namespace, providers.name, providers.provider",
+            params, offset, limit)
+        url = baseurl + "v1/modules"
+        if namespace is not None:
+            url = "{url}/{namespace}".format(url=url, namespace=namespace)
+        return render_listing(baseurl,
+                              page_meta(url, offset, limit, more,
+                                        provider=provider, verified=verified),
+                              records(rows))
+
+    def search_modules(self, baseurl, query, offset=0, limit=None,
+                       provider=None, verified=None, namespace=None):
+        """Search the module list based on the query.
+
+        The query is matched against the namespace, name and provider of
+        the modules as well as the owner and description from their
+        metadata. Results are ranked with the best matches first.
+
+        Args:
+            query (str): Query string used for the search
+            offset (int, optional): Number of modules to skip. Defaults to 0.
+            limit (int, optional): Maximum number of modules to return.
+                Defaults to None, which returns all modules.
+            provider (str, optional): Only return modules for this provider.
+                Defaults to None.
+            verified (bool, optional): Only return verified modules.
+                Defaults to None.
+            namespace (str, optional): Only return modules in this namespace.
+                Defaults to None.
+
+        Returns:
+            json: List of modules including details
+        """
+        term = query.lstrip("/").lower()
+        conditions, params = filters(namespace, provider, verified)
+        params["query"] = term
+        matches = "SELECT rowid, {} AS score FROM search".format(SCORE)
+        if len(term) >= 3:
+            # a quoted phrase of trigrams matches the documents holding the term
+            matches += " WHERE search MATCH :phrase"
+            params["phrase"] = '"{}"'.format(term.replace('"', '""'))
+        rows, more = self.__page(
+            LISTING.format(source="({}) AS matches JOIN providers "
+                           "ON providers.id = matches.rowid".format(matches))
+            + where(conditions + ["score > 0"])
+            + " ORDER BY score DESC, providers.namespace, providers.name, "
+            "providers.provider", params, offset, limit)
+        return render_listing(baseurl,
+                              page_meta(baseurl + "v1/modules/search", offset,
+                                        limit, more, q=query, provider=provider,
+                                        verified=verified, namespace=namespace),
+                              records(rows))
+
+    def get_latest_all_providers(self, baseurl, namespace, name, offset=0,
+                                 limit=None):
+        """Get Latest versions for each deployed provider.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            offset (int, optional): Number of providers to skip. Defaults to 0.
+            limit (int, optional): Maximum number of providers to return.
+                Defaults to None, which returns all providers.
+
+        Returns:
+            json: List of all provders and latest version for
+            defined namespace and name
+        """
+        rows, more = self.__page(
+            LISTING.format(source="providers") + "WHERE providers.namespace = :namespace "
+            "AND providers.name = :name ORDER BY providers.provider",
+            {"namespace": namespace, "name": name}, offset, limit)
+        url = "{baseurl}v1/modules/{namespace}/{name}".format(
+            baseurl=baseurl, namespace=namespace, name=name)
+        return render_listing(baseurl, page_meta(url, offset, limit, more),
+                              records(rows))
+
+    def get_module(self, baseurl, namespace, name, provider, version=None):
+        """Get module with extended details.
+
+        Args:
+            namespace (str): namespace for the version
+            name (str): Name of the module
+            provider (str): Provider for the module
+            version (str, optional): Version for the module. Defaults to None.
+
+        Raises:
+            ModuleNotFoundException: If module not found raise exception
+
+        Returns:
+            dict: Module details with all extended attributes
+        """
+        connection = self.__connection()
+        with transaction(connection):
+            row = connection.execute(
+                "SELECT id, owner, description, verified FROM modules "
+                "WHERE namespace = ? AND name = ?", (namespace, name)).fetchone()
+            versions = self.__versions(connection, namespace, name, provider)
+            if row is None or not versions:
+                raise ModuleNotFoundException("Module Not Found")
+            if version is None:
+                version = VersionList.from_sorted(versions).latest
+            if version not in versions:
+                raise ModuleNotFoundException("Module Not Found")
+            providers = [provider for provider, in connection.execute(
+                "SELECT provider FROM providers WHERE module = ? ORDER BY provider",
+                (row[0],))]
+        return dumps(module_details(baseurl, namespace, name, provider, version,
+                                    row[1], row[2], bool(row[3]), providers,
+                                    versions))
+
+    def download_module(self, filepath):
+        """Download the module requested.
+
+        Args:
+            filepath (str): Path to the file requested
+
+        Raises:
+            FileNotFoundException: Raised if file does not exist
+
+        Returns:
+            File: The bytearray representation of the requested file
+        """
+        if exists(join(self.basedir, filepath)):
+            return join(self.basedir, filepath)
+        raise FileNotFoundException("The requested file was not found in this backend.")
+
+    def publish(self, uploads):
+        """Publish a batch of module versions.
+
+        The batch is stored and linked into the tree by publish_uploads and
+        written to the database in a single transaction, so readers see
+        either none or all of it.
+
+        Args:
+            uploads (list): Upload of each version
+
+        Raises:
+            InvalidModuleException: Raised if a tarball is invalid or a
+                version is given twice
+            ModuleExistsException: Raised if a version is already published
+
+        Returns:
+            list: Hex sha256 digest of each tarball
+        """
+        def record(connection, modules):
+            for namespace, name in modules:
+                write_module(connection, *self.__scan_module(namespace, name))
+            next_generation(connection)
+
+        return publish_uploads(self.blobs, self.basedir, uploads, self.__writing,
+                               record, self.workers)
+
+    def sync(self):
+        """Sync the database with the module tree.
+
+        Modules whose metadata or versions differ from the tree are
+        rewritten and modules no longer in the tree are removed, all in a
+        single transaction.
+
+        Returns:
+            tuple: Number of modules written and removed
+        """
+        with self.__writing() as connection:
+            stored = stored_modules(connection)
+            changed, found = [], set()
+            for namespace in list_dirs(self.basedir):
+                for name in list_dirs(self.basedir, namespace):
+                    module = self.__scan_module(namespace, name)
+                    state = module_state(*module[2:])
+                    if not state[3]:
+                        continue
+                    found.add((namespace, name))
+                    if stored.get((namespace, name)) != state:
+                        changed.append(module)
+            removed = [module for module in stored if module not in found]
+            for module in changed:
+                write_module(connection, *module)
+            for namespace, name in removed:
+                delete_module(connection, namespace, name)
+            if changed or removed:
+                next_generation(connection)
+        return len(changed), len(removed)
+
+    def __create(self):
+        """Create the tables if the database is new."""
+        connection = self.__connection()
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.executescript(SCHEMA)
+        with transaction(connection, "IMMEDIATE"):
+            connection.execute("INSERT OR IGNORE INTO meta VALUES ('format', ?)",
+                               (FORMAT,))
+            connection.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+            found = connection.execute(
+                "SELECT value FROM meta WHERE key = 'format'").fetchone()[0]
+        if found != FORMAT:
+            raise ValueError("{} is a catalog of format {}, expected {}".format(
+                self.database, found, FORMAT))
+
+    def __connection(self):
+        """Get the database connection of the current thread.
+
+        Returns:
+            sqlite3.Connection: The connection, opened on first use
+        """
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.database, isolation_level=None)
+            self.__local.connection = connection
+        return connection
+
+    @contextmanager
+    def __writing(self):
+        """Run a write transaction, one at a time within the process.
+
+        Yields:
+            sqlite3.Connection: The connection of the transaction
+        """
+        connection = self.__connection()
+        with self.__write_lock, transaction(connection, "IMMEDIATE"):
+            yield connection
+
+    def __page(self, sql, params, offset, limit):
+        """Read one page of a query.
+
+        Args:
+            sql (str): Query with named parameters, without LIMIT
+            params (dict): Values of the parameters
+            offset (int): Number of rows to skip
+            limit (int): Maximum number of rows, None or 0 for all rows
+
+        Returns:
+            tuple: (list of rows on the page, True if there are more rows)
+        """
+        offset = max(offset or 0, 0)
+        if not limit or limit < 0:
+            rows = self.__connection().execute(
+                sql + " LIMIT -1 OFFSET :offset", dict(params, offset=offset))
+            return rows.fetchall(), False
+        rows = self.__connection().execute(
+            sql + " LIMIT :limit OFFSET :offset",
+            dict(params, offset=offset, limit=limit + 1)).fetchall()
+        return rows[:limit], len(rows) > limit
+
+    @staticmethod
+    def __versions(connection, namespace, name, provider):
+        """Read the versions of a module provider.
+
+        Args:
+            connection (sqlite3.Connection): Connection to read from
+            namespace (str): namespace for the module
+            name (str): Name of the module
+            provider (str): Provider for the module
+
+        Returns:
+            list: Versions sorted by semver precedence, empty if the
+            provider is unknown
+        """
+        return [version for version, in connection.execute(
+            "SELECT version FROM providers JOIN versions "
+            "ON versions.provider = providers.id WHERE namespace = ? AND name = ? "
+            "AND providers.provider = ? ORDER BY position",
+            (namespace, name, provider))]
+
+    def __scan_module(self, namespace, name):
+        """Scan a single module directory.
+
+        Args:
+            namespace (str): namespace for the module
+            name (str): Name of the module
+
+        Returns:
+            tuple: (namespace, name, metadata, providers) of the module
+        """
+        try:
+            meta = self.metadata.load(join(self.basedir, namespace, name))
+        except FileNotFoundException:
+            meta = {}
+        providers = {provider: list_dirs(self.basedir, namespace, name, provider)
+                     for provider in list_dirs(self.basedir, namespace, name)}
+        return (namespace, name, meta, providers)
+
+
+@contextmanager
+def transaction(connection, mode="DEFERRED"):
+    """Run statements in a transaction, committed unless an exception is raised.
+
+    Args:
+        connection (sqlite3.Connection): Connection in autocommit mode
+        mode (str, optional): DEFERRED, IMMEDIATE or EXCLUSIVE.
+            Defaults to DEFERRED.
+
+    Yields:
+        sqlite3.Connection: The connection
+    """
+    connection.execute("BEGIN " + mode)
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def next_generation(connection):
+    """Count a write to the database, so cached responses are invalidated.
+
+    Args:
+        connection (sqlite3.Connection): Connection in a write transaction
+    """
+    connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+
+def filters(namespace=None, provider=None, verified=None):
+    """Build the conditions of a listing.
+
+    Args:
+        namespace (str, optional): Only keep this namespace. Defaults to None.
+        provider (str, optional): Only keep this provider. Defaults to None.
+        verified (bool, optional): Only keep verified modules. Defaults to None.
+
+    Returns:
+        tuple: (list of SQL conditions, dict of their parameters)
+    """
+    conditions, params = [], {}
+    if namespace is not None:
+        conditions.append("providers.namespace = :namespace")
+        params["namespace"] = namespace
+    if provider is not None:
+        conditions.append("providers.provider = :provider")
+        params["provider"] = provider
+    if verified:
+        conditions.append("modules.verified")
+    return conditions, params
+
+
+def where(conditions):
+    """Join conditions into a WHERE clause.
+
+    Args:
+        conditions (list): SQL conditions, all of which have to hold
+
+    Returns:
+        str: The clause, empty if there are no conditions
+    """
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def records(rows):
+    """Build the listing records of the rows of a listing query.
+
+    Args:
+        rows (list): Rows selected by LISTING
+
+    Yields:
+        ModuleRecord: Record of each row
+    """
+    for namespace, name, provider, latest, owner, description, verified in rows:
+        yield ModuleRecord(namespace, name, provider, latest, owner, description,
+                           bool(verified), "dl/modules/{}/{}/{}/{}".format(
+                               namespace, name, provider, latest))
+
+
+def stored_metadata(metadata):
+    """Pick the metadata fields served by the API as they are stored.
+
+    Args:
+        metadata (dict): Parsed module metadata
+
+    Returns:
+        tuple: owner, description and whether the module is verified
+    """
+    owner, description, verified = served_metadata(metadata)
+    return text(owner), text(description), bool(verified)
+
+
+def text(value):
+    """Turn a metadata value into a value of a TEXT column.
+
+    Args:
+        value (object): Value from the parsed metadata
+
+    Returns:
+        str: The value as a string, None if it is None
+    """
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def module_state(metadata, providers):
+    """Describe a module the way it is stored.
+
+    Args:
+        metadata (dict): Parsed module metadata
+        providers (dict): Provider name mapped to its versions
+
+    Returns:
+        tuple: owner, description, verified and the provider names mapped to
+        their sorted versions, providers without versions are left out
+    """
+    return stored_metadata(metadata) + ({
+        provider: list(VersionList(versions))
+        for provider, versions in providers.items() if versions},)
+
+
+def stored_modules(connection):
+    """Read all modules from the database.
+
+    Args:
+        connection (sqlite3.Connection): Connection to read from
+
+    Returns:
+        dict: (namespace, name) mapped to the module_state of the module
+    """
+    modules = {}
+    rows = connection.execute(
+        "SELECT modules.namespace, modules.name, owner, description, verified, "
+        "providers.provider, version FROM modules "
+        "JOIN providers ON providers.module = modules.id "
+        "JOIN versions ON versions.provider = providers.id "
+        "ORDER BY modules.id, providers.provider, position")
+    for namespace, name, owner, description, verified, provider, version in rows:
+        state = modules.get((namespace, name))
+        if state is None:
+            state = modules[(namespace, name)] = (owner, description, bool(verified),
+                                                  {})
+        state[3].setdefault(provider, []).append(version)
+    return modules
+
+
+def write_module(connection, namespace, name, metadata, providers):
+    """Write a module, replacing what was stored for it before.
+
+    Args:
+        connection (sqlite3.Connection): Connection in a write transaction
+        namespace (str): namespace for the module
+        name (str): Name of the module
+        metadata (dict): Parsed module metadata
+        providers (dict): Provider name mapped to its versions, a module
+            without any versions is removed
+    """
+    delete_module(connection, namespace, name)
+    owner, description, verified, providers = module_state(metadata, providers)
+    if not providers:
+        return
+    module = connection.execute(
+        "INSERT INTO modules (namespace, name, owner, description, verified) "
+        "VALUES (?, ?, ?, ?, ?)", (namespace, name, owner, description,
+                                   verified)).lastrowid
+    for provider, versions in sorted(providers.items()):
+        row = connection.execute(
+            "INSERT INTO providers (module, namespace, name, provider, latest) "
+            "VALUES (?, ?, ?, ?, ?)", (module, namespace, name, provider,
+                                       VersionList.from_sorted(versions).latest)
+        ).lastrowid
+        connection.executemany("INSERT INTO versions VALUES (?, ?, ?)",
+                               [(row, position, version)
+                                for position, version in enumerate(versions)])
+        connection.execute(
+            "INSERT INTO search (rowid, {}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(
+                ", ".join(FIELDS)),
+            [row] + [field.lower() for field in (
+                "/".join((namespace, name, provider)), namespace, name, provider,
+                owner or "", description or "")])
+
+
+def delete_module(connection, namespace, name):
+    """Delete a module with its providers and versions.
+
+    Args:
+        connection (sqlite3.Connection): Connection in a write transaction
+        namespace (str): namespace for the module
+        name (str): Name of the module
+    """
+    providers = connection.execute(
+        "SELECT id FROM providers WHERE namespace = ? AND name = ?",
+        (namespace, name)).fetchall()
+    connection.executemany("DELETE FROM search WHERE rowid = ?", providers)
+    connection.executemany("DELETE FROM versions WHERE provider = ?", providers)
+    connection.execute("DELETE FROM providers WHERE namespace = ? AND name = ?",
+                       (namespace, name))
+    connection.execute("DELETE FROM modules WHERE namespace = ? AND name = ?",
+                       (namespace, name))
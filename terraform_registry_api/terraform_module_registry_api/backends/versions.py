@@ -0,0 +1,179 @@
+"""Semantic version ordering for module versions.
+
+Versions are ordered following the semver precedence rules, so pre-releases
+sort before their release and numeric pre-release identifiers compare as
+numbers. Strings which are not a version sort before all valid versions and
+are never picked as the latest version while a valid one exists.
+"""
+import re
+
+from bisect import bisect_left
+
+SEMVER = re.compile(
+    r"^v?(?P<release>\d+(?:\.\d+){0,2})"
+    r"(?:-(?P<prerelease>[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?"
+    r"(?:\+[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)?$")
+
+
+def version_key(version):
+    """Build a sort key for a version string.
+
+    Args:
+        version (str): Version string, e.g. 1.2.0 or 1.2.0-beta.1
+
+    Returns:
+        tuple: Key ordering versions by semver precedence
+    """
+    match = SEMVER.match(version)
+    if match is None:
+        return (0, (), 0, (), version)
+    release = tuple(int(part) for part in match.group("release").split("."))
+    release += (0,) * (3 - len(release))
+    prerelease = match.group("prerelease")
+    if prerelease is None:
+        return (1, release, 1, (), version)
+    identifiers = tuple((0, int(part), "") if part.isdigit() else (1, 0, part)
+                        for part in prerelease.split("."))
+    return (1, release, 0, identifiers, version)
+
+
+def is_stable(version):
+    """Check whether a version is a valid release.
+
+    Args:
+        version (str): Version string
+
+    Returns:
+        bool: True if it is a version without a pre-release tag
+    """
+    match = SEMVER.match(version)
+    return match is not None and match.group("prerelease") is None
+
+
+class VersionList:
+    """Versions of a module provider, sorted by semver precedence.
+
+    The list is kept sorted as versions are added and removed, and the
+    latest version is tracked alongside so it never needs a sort. The sort
+    keys of a list restored in order are only built once they are needed.
+    """
+
+    __slots__ = ("_keys", "_versions", "latest")
+
+    def __init__(self, versions=()):
+        """Instantiate the list.
+
+        Args:
+            versions (iterable, optional): Versions in any order. Defaults to ().
+        """
+        pairs = sorted((version_key(version), version) for version in set(versions))
+        self._keys = [key for key, _ in pairs]
+        self._versions = [version for _, version in pairs]
+        self.latest = None
+        self._update_latest()
+
+    @classmethod
+    def from_sorted(cls, versions):
+        """Restore a list from versions already in ascending order.
+
+        Args:
+            versions (list): Distinct versions sorted by semver precedence
+
+        Returns:
+            VersionList: The list, holding the given versions
+        """
+        restored = cls.__new__(cls)
+        restored._keys = None
+        restored._versions = list(versions)
+        restored._update_latest()
+        return restored
+
+    def __iter__(self):
+        """Iterate the versions in ascending order."""
+        return iter(self._versions)
+
+    def __len__(self):
+        """int: Number of versions."""
+        return len(self._versions)
+
+    def __getitem__(self, index):
+        """Get a version by position in ascending order."""
+        return self._versions[index]
+
+    def __contains__(self, version):
+        """bool: Whether the version is in the list."""
+        keys = self._sort_keys()
+        key = version_key(version)
+        index = bisect_left(keys, key)
+        return index < len(keys) and keys[index] == key
+
+    def __eq__(self, other):
+        """bool: Whether both hold the same versions."""
+        return list(self) == list(other)
+
+    def __repr__(self):
+        """str: Representation of the versions."""
+        return "VersionList({!r})".format(self._versions)
+
+    def copy(self):
+        """Copy the list.
+
+        Returns:
+            VersionList: A list holding the same versions
+        """
+        copied = VersionList()
+        copied._keys = list(self._sort_keys())
+        copied._versions = list(self._versions)
+        copied.latest = self.latest
+        return copied
+
+    def add(self, version):
+        """Add a version.
+
+        Args:
+            version (str): Version to add
+        """
+        keys = self._sort_keys()
+        key = version_key(version)
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            return
+        keys.insert(index, key)
+        self._versions.insert(index, version)
+        if self.latest is None or not is_stable(self.latest):
+            self._update_latest()
+        elif is_stable(version) and key > version_key(self.latest):
+            self.latest = version
+
+    def remove(self, version):
+        """Remove a version if it is in the list.
+
+        Args:
+            version (str): Version to remove
+        """
+        keys = self._sort_keys()
+        key = version_key(version)
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            del keys[index]
+            del self._versions[index]
+            if version == self.latest:
+                self._update_latest()
+
+    def _sort_keys(self):
+        """Get the sort keys of the versions, building them if needed.
+
+        Returns:
+            list: Sort key of each version, in the order of the versions
+        """
+        if self._keys is None:
+            self._keys = [version_key(version) for version in self._versions]
+        return self._keys
+
+    def _update_latest(self):
+        """Find the latest stable version, or the highest one if none is."""
+        for version in reversed(self._versions):
+            if is_stable(version):
+                self.latest = version
+                return
+        self.latest = self._versions[-1] if self._versions else None
@@ -0,0 +1,345 @@
+"""Change watching for directory trees laid out as namespace/name/provider.
+
+Watchers report the smallest changed subtree as a tuple of path components
+below the base directory, e.g. ``("namespace1", "sample1", "aws")`` when a
+version was added to that provider, or ``None`` when the whole tree has to be
+reconciled. Changes are collected for a short while and handed to the
+callback in batches so a burst of events results in a single refresh.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+
+from os.path import join
+
+from .metadata import METADATA_FILES
+
+# Directories below the base directory that are watched: namespace, name
+# and provider. Version directories are picked up by their provider.
+WATCH_DEPTH = 3
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CLOSE_WRITE | IN_MODIFY | IN_DELETE_SELF | IN_MOVE_SELF
+              | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+logger = logging.getLogger(__name__)
+
+
+class Watcher(threading.Thread):
+    """Base class collecting changed subtrees for a callback."""
+
+    def __init__(self, basedir, callback, settle=0.25):
+        """Instantiate the watcher.
+
+        Args:
+            basedir (str): Root of the watched tree
+            callback (callable): Called with the changed subtree tuple, or
+                None if the whole tree needs to be reconciled
+            settle (float, optional): Seconds to wait for more events before
+                handing a batch to the callback. Defaults to 0.25.
+        """
+        super().__init__(name="terra-store-watcher", daemon=True)
+        self.basedir = basedir
+        self.callback = callback
+        self.settle = settle
+        self._pending = set()
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """Stop watching."""
+        self._stopped.set()
+
+    def detach(self):
+        """Release what a forked child inherited from a running watcher.
+
+        The thread itself does not survive the fork, only its resources.
+        """
+        self._stopped.set()
+
+    def changed(self, parts):
+        """Record a changed subtree.
+
+        Args:
+            parts (tuple): Path components of the subtree, None for all
+        """
+        self._pending.add(parts)
+
+    def flush(self):
+        """Hand the recorded changes to the callback.
+
+        Subtrees already covered by a changed parent are skipped.
+        """
+        pending, self._pending = self._pending, set()
+        if None in pending:
+            pending = {None}
+        for parts in sorted(pending, key=lambda parts: len(parts or ())):
+            if parts is not None and any(parts[:depth] in pending
+                                         for depth in range(len(parts))):
+                continue
+            try:
+                self.callback(parts)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to apply change to %s", parts)
+
+    def list_dirs(self, parts):
+        """List the visible sub directories of a watched directory.
+
+        Args:
+            parts (tuple): Path components below basedir
+
+        Returns:
+            list: Names of the sub directories, empty if it vanished
+        """
+        try:
+            return [f.name for f in os.scandir(join(self.basedir, *parts))
+                    if f.is_dir() and not f.name.startswith(".")]
+        except OSError:
+            return []
+
+
+class InotifyWatcher(Watcher):
+    """Watcher using the Linux inotify API."""
+
+    def __init__(self, basedir, callback, settle=0.25):
+        """Instantiate the watcher and register the existing directories.
+
+        Args:
+            basedir (str): Root of the watched tree
+            callback (callable): See Watcher
+            settle (float, optional): See Watcher. Defaults to 0.25.
+
+        Raises:
+            OSError: If inotify is not available
+        """
+        super().__init__(basedir, callback, settle)
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._watches = {}
+        self.watch_tree(())
+
+    def watch_tree(self, parts):
+        """Watch a directory and its sub directories down to the providers.
+
+        Args:
+            parts (tuple): Path components below basedir
+        """
+        path = os.fsencode(join(self.basedir, *parts))
+        wd = self._add_watch(self._fd, path, WATCH_MASK)
+        if wd < 0:
+            return
+        self._watches[wd] = parts
+        if len(parts) < WATCH_DEPTH:
+            for child in self.list_dirs(parts):
+                self.watch_tree(parts + (child,))
+
+    def run(self):
+        """Read inotify events until stopped."""
+        try:
+            while not self._stopped.is_set():
+                timeout = self.settle if self._pending else 1.0
+                ready, _, _ = select.select([self._fd], [], [], timeout)
+                if ready:
+                    self.read_events()
+                elif self._pending:
+                    self.flush()
+        finally:
+            os.close(self._fd)
+
+    def detach(self):
+        """Release what a forked child inherited from a running watcher.
+
+        The thread itself does not survive the fork, only its resources.
+        """
+        super().detach()
+        os.close(self._fd)
+
+    def read_events(self):
+        """Translate the queued inotify events into changed subtrees."""
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.changed(None)
+            elif mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+            elif wd in self._watches and name:
+                self.handle(self._watches[wd], name, mask)
+
+    def handle(self, parts, name, mask):
+        """Record the subtree affected by an event on a directory entry.
+
+        Args:
+            parts (tuple): Path components of the watched directory
+            name (str): Name of the entry the event is about
+            mask (int): inotify event mask
+        """
+        if name.startswith("."):
+            return
+        if len(parts) == WATCH_DEPTH:
+            if mask & IN_ISDIR:
+                self.changed(parts)
+            return
+        if not mask & IN_ISDIR:
+            if len(parts) == 2 and name in METADATA_FILES:
+                self.changed(parts)
+            return
+        child = parts + (name,)
+        if mask & (IN_CREATE | IN_MOVED_TO):
+            self.watch_tree(child)
+        self.changed(child if mask & (IN_CREATE | IN_MOVED_TO) else parts)
+
+
+class PollingWatcher(Watcher):
+    """Watcher comparing directory modification times at an interval."""
+
+    def __init__(self, basedir, callback, interval=5.0, settle=0.25):
+        """Instantiate the watcher and record the current state of the tree.
+
+        Args:
+            basedir (str): Root of the watched tree
+            callback (callable): See Watcher
+            interval (float, optional): Seconds between polls. Defaults to 5.0.
+            settle (float, optional): See Watcher. Defaults to 0.25.
+        """
+        super().__init__(basedir, callback, settle)
+        self.interval = interval
+        self._mtimes = {}
+        self.track_tree(())
+
+    def track_tree(self, parts):
+        """Record the modification times of a subtree.
+
+        Args:
+            parts (tuple): Path components below basedir
+        """
+        self._mtimes[parts] = self.mtime(parts)
+        if len(parts) == 2:
+            for metafile in METADATA_FILES:
+                self._mtimes[parts + (metafile,)] = self.mtime(parts + (metafile,))
+        if len(parts) < WATCH_DEPTH:
+            for child in self.list_dirs(parts):
+                self.track_tree(parts + (child,))
+
+    def untrack_tree(self, parts):
+        """Forget a subtree.
+
+        Args:
+            parts (tuple): Path components below basedir
+        """
+        for tracked in [tracked for tracked in self._mtimes
+                        if tracked[:len(parts)] == parts]:
+            del self._mtimes[tracked]
+
+    def mtime(self, parts):
+        """Get the modification time of a path.
+
+        Args:
+            parts (tuple): Path components below basedir
+
+        Returns:
+            int: Modification time in nanoseconds, None if it does not exist
+        """
+        try:
+            return os.stat(join(self.basedir, *parts)).st_mtime_ns
+        except OSError:
+            return None
+
+    def run(self):
+        """Poll the tree until stopped."""
+        while not self._stopped.wait(self.interval):
+            self.poll()
+            if self._pending:
+                self.flush()
+
+    def poll(self):
+        """Compare the tree against the recorded modification times."""
+        for parts, previous in list(self._mtimes.items()):
+            if parts not in self._mtimes:
+                continue
+            current = self.mtime(parts)
+            if current == previous:
+                continue
+            self._mtimes[parts] = current
+            if len(parts) == 3 and parts[-1] in METADATA_FILES:
+                self.changed(parts[:-1])
+            elif current is None:
+                self.untrack_tree(parts)
+                self.changed(parts[:-1])
+            elif len(parts) < WATCH_DEPTH:
+                self.rescan(parts)
+            else:
+                self.changed(parts)
+
+    def rescan(self, parts):
+        """Track new and forget removed children of a changed directory.
+
+        Args:
+            parts (tuple): Path components below basedir
+        """
+        children = set(self.list_dirs(parts))
+        for tracked in [tracked for tracked in self._mtimes
+                        if len(tracked) == len(parts) + 1
+                        and tracked[:len(parts)] == parts
+                        and tracked[-1] not in METADATA_FILES]:
+            if tracked[-1] not in children:
+                self.untrack_tree(tracked)
+                self.changed(parts)
+        for child in children:
+            if parts + (child,) not in self._mtimes:
+                self.track_tree(parts + (child,))
+                self.changed(parts + (child,))
+
+
+def create_watcher(basedir, callback, mode="auto", interval=5.0):
+    """Create a watcher for a module tree.
+
+    Args:
+        basedir (str): Root of the watched tree
+        callback (callable): See Watcher
+        mode (str, optional): inotify, poll or auto to use inotify where it
+            is available and polling otherwise. Defaults to auto.
+        interval (float, optional): Seconds between polls. Defaults to 5.0.
+
+    Returns:
+        Watcher: The watcher, not yet started
+    """
+    if mode in ("auto", "inotify"):
+        try:
+            return InotifyWatcher(basedir, callback)
+        except (OSError, AttributeError):
+            if mode == "inotify":
+                raise
+    return PollingWatcher(basedir, callback, interval)
@@ -0,0 +1,100 @@
+"""Cache of rendered API responses.
+
+Responses are stored as the serialized body together with a strong ETag.
+Entries expire after a configurable time and the whole cache is dropped as
+soon as the backend reports a different generation, i.e. its data changed.
+"""
+import hashlib
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """Rendered response body and its ETag."""
+
+    __slots__ = ("body", "etag", "expires")
+
+    def __init__(self, body, expires):
+        """Instantiate a cached response.
+
+        Args:
+            body (bytes): Serialized response body
+            expires (float): Monotonic time after which the entry is stale
+        """
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()
+        self.expires = expires
+
+
+class ResponseCache:
+    """Least recently used cache of rendered responses."""
+
+    def __init__(self, size=1024, ttl=300.0):
+        """Instantiate the cache.
+
+        Args:
+            size (int, optional): Maximum number of responses to keep, 0
+                disables the cache. Defaults to 1024.
+            ttl (float, optional): Seconds a response is kept. Defaults to 300.
+        """
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """bool: Whether responses are cached at all."""
+        return self.size > 0
+
+    def get(self, key, generation):
+        """Look up a response.
+
+        Args:
+            key (tuple): Route, arguments and root url of the request
+            generation (int): Current generation of the backend
+
+        Returns:
+            CachedResponse: The response, None if it is not cached
+        """
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, generation, body):
+        """Store a response.
+
+        Args:
+            key (tuple): Route, arguments and root url of the request
+            generation (int): Generation of the backend the body was built from
+            body (bytes): Serialized response body
+
+        Returns:
+            CachedResponse: The stored response
+        """
+        entry = CachedResponse(body, time.monotonic() + self.ttl)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drop all cached responses."""
+        with self._lock:
+            self._entries.clear()
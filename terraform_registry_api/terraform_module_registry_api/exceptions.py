@@ -31,3 +31,54 @@ class FileNotFoundException(Exception):
         """
         self.message = message
         super().__init__(self.message)
+
+
+class InvalidModuleException(Exception):
+    """InvalidModuleException.
+
+    An Exception thrown when a module offered for publishing is not a
+    valid module version
+    """
+
+    def __init__(self, message):
+        """Initialize the Exception.
+
+        Args:
+            message (str): Description of the exception cause
+        """
+        self.message = message
+        super().__init__(self.message)
+
+
+class ModuleExistsException(Exception):
+    """ModuleExistsException.
+
+    An Exception thrown when a module version offered for publishing
+    already exists in the configured backend
+    """
+
+    def __init__(self, message):
+        """Initialize the Exception.
+
+        Args:
+            message (str): Description of the exception cause
+        """
+        self.message = message
+        super().__init__(self.message)
+
+
+class UpstreamUnavailableException(Exception):
+    """UpstreamUnavailableException.
+
+    An Exception thrown when the backend could not answer because the
+    upstream registry it relies on could not be reached or failed
+    """
+
+    def __init__(self, message):
+        """Initialize the Exception.
+
+        Args:
+            message (str): Description of the exception cause
+        """
+        self.message = message
+        super().__init__(self.message)
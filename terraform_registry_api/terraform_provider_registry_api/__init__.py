@@ -0,0 +1,4 @@
+"""Module Implementing the Terraform Provider Registry Protocol.
+
+See https://www.terraform.io/docs/internals/provider-registry-protocol.html
+"""
@@ -0,0 +1,101 @@
+from flask import make_response, request
+from os import environ
+
+from ..metrics import TimedBackend
+from ..serialization import dumps
+from . import backends
+from .backends import Dummy
+from .exceptions import ProviderNotFoundException
+
+backend = TimedBackend(Dummy(), "providers")
+
+
+def list_versions(namespace, type_):
+    """List the available versions of a provider.
+
+    Response format:
+    {
+        "versions": [
+            {
+                "version": "2.0.0",
+                "protocols": ["4.0", "5.1"],
+                "platforms": [
+                    {"os": "darwin", "arch": "amd64"},
+                    {"os": "linux", "arch": "amd64"}
+                ]
+            }
+        ]
+    }
+
+    Args:
+        namespace (str): namespace for the provider
+        type_ (str): Type of the provider
+
+    Returns:
+        response: JSON formatted response
+    """
+    try:
+        return json_response(backend.get_versions(namespace, type_), 200)
+    except ProviderNotFoundException as provider_not_found:
+        return json_response(dumps({"errors": [provider_not_found.message]}),
+                             404)
+
+
+def get_download(namespace, type_, version, os, arch):
+    """Get the download details of a provider package.
+
+    Args:
+        namespace (str): namespace for the provider
+        type_ (str): Type of the provider
+        version (str): Version of the provider
+        os (str): Operating system of the package
+        arch (str): Architecture of the package
+
+    Returns:
+        response: JSON formatted response
+    """
+    try:
+        return json_response(backend.get_download(
+            request.url_root, namespace, type_, version, os, arch), 200)
+    except ProviderNotFoundException as provider_not_found:
+        return json_response(dumps({"errors": [provider_not_found.message]}),
+                             404)
+
+
+def download_provider(filepath):
+    """Download the provider file at the requested filepath.
+
+    Args:
+        filepath (str): path to requested file
+
+    Returns:
+        str|bytes: Location of the file on disk, or its content
+    """
+    return backend.download_provider(filepath)
+
+
+def json_response(body, status):
+    """Build a JSON response.
+
+    Args:
+        body (str): Serialized JSON body
+        status (int): HTTP status code
+
+    Returns:
+        response: The response
+    """
+    resp = make_response(body, status)
+    resp.content_type = "application/json"
+    return resp
+
+
+def set_backend(backendtype):
+    """Set backend.
+
+    Args:
+        backendtype (str): Type of backend requested
+    """
+    if backendtype == "Filesystem":
+        global backend
+        backend = TimedBackend(backends.Filesystem(environ.get("fs_provider_path")),
+                               "providers")
@@ -0,0 +1,45 @@
+"""Provider Backends Module.
+
+Current Implementations:
+ - Dummy
+ - Filesystem
+
+Like the module backends, a backend is only imported once it is looked up.
+"""
+from importlib import import_module
+
+# Backend class mapped to the module implementing it
+BACKENDS = {
+    "Dummy": "dummy",
+    "Filesystem": "filesystem",
+}
+
+__all__ = sorted(BACKENDS)
+
+
+def __getattr__(name):
+    """Import a backend on first use.
+
+    Args:
+        name (str): Name of the backend class
+
+    Raises:
+        AttributeError: Raised if there is no backend of that name
+
+    Returns:
+        type: The backend class
+    """
+    if name not in BACKENDS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    backend = getattr(import_module("." + BACKENDS[name], __name__), name)
+    globals()[name] = backend
+    return backend
+
+
+def __dir__():
+    """List the attributes of the module, including backends not yet imported.
+
+    Returns:
+        list: Sorted attribute names
+    """
+    return sorted(set(globals()) | set(BACKENDS))
@@ -0,0 +1,60 @@
+from abc import ABC, abstractmethod
+
+
+class AbstractBackend(ABC):
+    """Abstract Class defining the provider backend structure."""
+
+    @property
+    def generation(self):
+        """int: Changes whenever the data served by the backend changes."""
+        return 0
+
+    @abstractmethod
+    def get_versions(self, namespace, provider_type):
+        """Get the available versions of a provider.
+
+        Args:
+            namespace (str): namespace for the provider
+            provider_type (str): Type of the provider, e.g. aws
+
+        Raises:
+            ProviderNotFoundException: Error if the provider does not exist
+
+        Returns:
+            json: JSON object listing each version with its protocols
+            and platforms
+        """
+
+    @abstractmethod
+    def get_download(self, baseurl, namespace, provider_type, version, os, arch):
+        """Get the download details of a provider package.
+
+        Args:
+            baseurl (str): Root url of the server
+            namespace (str): namespace for the provider
+            provider_type (str): Type of the provider, e.g. aws
+            version (str): Version of the provider
+            os (str): Operating system of the package
+            arch (str): Architecture of the package
+
+        Raises:
+            ProviderNotFoundException: Error if the package does not exist
+
+        Returns:
+            json: JSON object with the download url, checksum and
+            signing keys of the package
+        """
+
+    @abstractmethod
+    def download_provider(self, filepath):
+        """Download a provider file.
+
+        Args:
+            filepath (str): Path to the file requested
+
+        Raises:
+            FileNotFoundException: Raised if file does not exist
+
+        Returns:
+            str|bytes: Location of the file on disk, or its content
+        """
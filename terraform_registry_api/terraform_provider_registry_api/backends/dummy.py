@@ -0,0 +1,56 @@
+import hashlib
+import io
+import zipfile
+
+from .index import IndexedBackend, Package, ProviderIndex, Release, format_shasums
+
+
+class Dummy(IndexedBackend):
+    """Dummy implementation of provider backend used for testing."""
+
+    dummy_data = {
+        "terra/dummy": {
+            "1.0.0": [("darwin", "arm64"), ("linux", "amd64")],
+            "2.0.0": [("darwin", "arm64"), ("linux", "amd64"), ("windows", "amd64")],
+        }
+    }
+
+    def __init__(self):
+        """Instantiate the backend, building its packages in memory."""
+        super().__init__()
+        index = ProviderIndex()
+        for provider, versions in self.dummy_data.items():
+            namespace, provider_type = provider.split("/")
+            for version, platforms in versions.items():
+                files, packages, shasums = {}, [], {}
+                for os, arch in platforms:
+                    filename = "terraform-provider-{}_{}_{}_{}.zip".format(
+                        provider_type, version, os, arch)
+                    files[filename] = build_zip(
+                        "terraform-provider-{}_v{}".format(provider_type, version),
+                        b"This backend is for testing only.")
+                    shasums[filename] = hashlib.sha256(files[filename]).hexdigest()
+                    packages.append(Package(os, arch, filename, shasums[filename]))
+                sums = "terraform-provider-{}_{}_SHA256SUMS".format(
+                    provider_type, version)
+                files[sums] = format_shasums(shasums)
+                index.add_release(namespace, provider_type,
+                                  Release(version, packages, sums), files)
+        self.index = index
+
+
+def build_zip(name, content):
+    """Build a zip archive holding a single file in memory.
+
+    Args:
+        name (str): Name of the file
+        content (bytes): Content of the file
+
+    Returns:
+        bytes: The zip archive
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0)),
+                         content)
+    return buffer.getvalue()
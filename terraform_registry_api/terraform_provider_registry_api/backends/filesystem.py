@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+
+from os import scandir
+from os.path import join
+
+from ...terraform_module_registry_api.backends.filesystem import list_dirs
+from .index import IndexedBackend, Package, ProviderIndex, Release, \
+    DEFAULT_PROTOCOLS, format_shasums, parse_shasums
+
+logger = logging.getLogger(__name__)
+
+SIGNING_KEYS_FILE = "signing_keys.json"
+PACKAGE = re.compile(r"^terraform-provider-(?P<type>.+)_(?P<version>[^_]+)"
+                     r"_(?P<os>[^_]+)_(?P<arch>[^_]+)\.zip$")
+
+
+class Filesystem(IndexedBackend):
+    """Provider backend using local Filesystem for storage.
+
+    Providers are laid out as namespace/type/version, each version directory
+    holding the release files as published by HashiCorp::
+
+        terraform-provider-<type>_<version>_<os>_<arch>.zip
+        terraform-provider-<type>_<version>_SHA256SUMS
+        terraform-provider-<type>_<version>_SHA256SUMS.sig
+        terraform-provider-<type>_<version>_manifest.json
+
+    The signing keys of a namespace are read from namespace/signing_keys.json
+    in the format of the signing_keys field of the registry protocol.
+    """
+
+    def __init__(self, basedirectory):
+        """Instantiate Filesystem provider backend.
+
+        The directory tree is ingested once into an in-memory index which
+        serves all requests.
+
+        Args:
+            basedirectory (str): basedirectory for providers.
+        """
+        super().__init__()
+        self.basedir = basedirectory
+        self.__reload_lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Ingest the whole directory tree into a new index."""
+        with self.__reload_lock:
+            index = ProviderIndex(self.index.generation + 1)
+            for namespace in list_dirs(self.basedir):
+                index.set_signing_keys(namespace, self.__load_signing_keys(namespace))
+                for provider_type in list_dirs(self.basedir, namespace):
+                    for version in list_dirs(self.basedir, namespace, provider_type):
+                        self.__ingest(index, namespace, provider_type, version)
+            self.index = index
+
+    def __ingest(self, index, namespace, provider_type, version):
+        """Add a release directory to the index.
+
+        The checksums are read from the SHA256SUMS file of the release.
+        Packages it does not list are hashed here, and a SHA256SUMS file is
+        served from memory if the release has none.
+
+        Args:
+            index (ProviderIndex): Index being built
+            namespace (str): namespace for the provider
+            provider_type (str): Type of the provider
+            version (str): Version of the provider
+        """
+        directory = join(self.basedir, namespace, provider_type, version)
+        prefix = "terraform-provider-{}_{}".format(provider_type, version)
+        filenames = {entry.name for entry in scandir(directory) if entry.is_file()}
+        files = {filename: join(directory, filename) for filename in filenames}
+
+        sums = prefix + "_SHA256SUMS"
+        shasums = {}
+        if sums in filenames:
+            with open(files[sums]) as sumsfile:
+                shasums = parse_shasums(sumsfile.read())
+        packages = []
+        for filename in sorted(filenames):
+            match = PACKAGE.match(filename)
+            if match is None or match.group("type") != provider_type \
+                    or match.group("version") != version:
+                continue
+            if filename not in shasums:
+                logger.warning("%s is not listed in %s, hashing it", filename, sums)
+                shasums[filename] = hash_file(files[filename])
+            packages.append(Package(match.group("os"), match.group("arch"),
+                                    filename, shasums[filename]))
+        if not packages:
+            return
+        if sums not in filenames:
+            files[sums] = format_shasums({package.filename: package.shasum
+                                          for package in packages})
+        signature = sums + ".sig" if sums + ".sig" in filenames else None
+        protocols = DEFAULT_PROTOCOLS
+        manifest = prefix + "_manifest.json"
+        if manifest in filenames:
+            with open(files[manifest]) as manifestfile:
+                protocols = json.load(manifestfile).get("metadata", {}).get(
+                    "protocol_versions", DEFAULT_PROTOCOLS)
+        index.add_release(namespace, provider_type,
+                          Release(version, packages, sums, signature, protocols),
+                          files)
+
+    def __load_signing_keys(self, namespace):
+        """Load the signing keys of a namespace.
+
+        Args:
+            namespace (str): namespace for the providers
+
+        Returns:
+            list: GPG public keys, empty if the namespace has none
+        """
+        try:
+            with open(join(self.basedir, namespace, SIGNING_KEYS_FILE)) as keysfile:
+                return json.load(keysfile).get("gpg_public_keys", [])
+        except FileNotFoundError:
+            return []
+
+
+def hash_file(path):
+    """Compute the sha256 digest of a file.
+
+    Args:
+        path (str): Location of the file
+
+    Returns:
+        str: Hex digest of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as package:
+        for chunk in iter(lambda: package.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
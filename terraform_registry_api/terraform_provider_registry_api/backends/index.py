@@ -0,0 +1,318 @@
+"""In-memory index of the provider packages held by a backend.
+
+The index is built when a backend ingests its providers. Every package is
+keyed on (namespace, type, version, os, arch) and carries the checksum read
+from the release's SHA256SUMS file, so answering a request is a dictionary
+lookup and never hashes or lists anything. A backend swaps in a new index
+as a whole once it is built.
+"""
+from ...serialization import dumps
+from ...terraform_module_registry_api.backends.versions import VersionList
+from ...terraform_module_registry_api.exceptions import FileNotFoundException
+from ..exceptions import ProviderNotFoundException
+from .abstract import AbstractBackend
+
+DEFAULT_PROTOCOLS = ("5.0",)
+
+
+class Package:
+    """A provider build for a single platform."""
+
+    __slots__ = ("os", "arch", "filename", "shasum")
+
+    def __init__(self, os, arch, filename, shasum):
+        """Instantiate a package.
+
+        Args:
+            os (str): Operating system of the build
+            arch (str): Architecture of the build
+            filename (str): Name of the zip archive
+            shasum (str): Hex sha256 digest of the zip archive
+        """
+        self.os = os
+        self.arch = arch
+        self.filename = filename
+        self.shasum = shasum
+
+
+class Release:
+    """A provider version and the packages built for it."""
+
+    __slots__ = ("version", "protocols", "packages", "shasums", "signature")
+
+    def __init__(self, version, packages, shasums, signature=None,
+                 protocols=DEFAULT_PROTOCOLS):
+        """Instantiate a release.
+
+        Args:
+            version (str): Version of the provider
+            packages (list): Packages of the release
+            shasums (str): File name of the SHA256SUMS file
+            signature (str, optional): File name of the detached signature
+                of the SHA256SUMS file. Defaults to None.
+            protocols (iterable, optional): Supported plugin protocol
+                versions. Defaults to 5.0.
+        """
+        self.version = version
+        self.protocols = list(protocols)
+        self.packages = sorted(packages, key=lambda package: (package.os,
+                                                              package.arch))
+        self.shasums = shasums
+        self.signature = signature
+
+
+class ProviderIndex:
+    """Index of provider releases, packages and their files."""
+
+    def __init__(self, generation=0):
+        """Instantiate an empty index.
+
+        Args:
+            generation (int, optional): Generation of the backend the index
+                is built for. Defaults to 0.
+        """
+        self.generation = generation
+        self._versions = {}
+        self._releases = {}
+        self._packages = {}
+        self._files = {}
+        self._signing_keys = {}
+
+    def __len__(self):
+        """int: Number of indexed packages."""
+        return len(self._packages)
+
+    def add_release(self, namespace, provider_type, release, files=None):
+        """Add a release to the index.
+
+        Args:
+            namespace (str): namespace for the provider
+            provider_type (str): Type of the provider
+            release (Release): The release
+            files (dict, optional): File name mapped to the location of the
+                file on disk, or its content, for every downloadable file of
+                the release. Defaults to None.
+        """
+        key = (namespace, provider_type)
+        self._versions.setdefault(key, VersionList()).add(release.version)
+        self._releases[key + (release.version,)] = release
+        for package in release.packages:
+            self._packages[key + (release.version, package.os, package.arch)] = \
+                (release, package)
+        for filename, source in (files or {}).items():
+            self._files[file_path(namespace, provider_type, release.version,
+                                  filename)] = source
+
+    def set_signing_keys(self, namespace, keys):
+        """Set the keys signing the releases of a namespace.
+
+        Args:
+            namespace (str): namespace for the providers
+            keys (list): GPG public keys, dicts holding key_id and
+                ascii_armor
+        """
+        self._signing_keys[namespace] = keys
+
+    def versions(self, namespace, provider_type):
+        """Get the releases of a provider.
+
+        Args:
+            namespace (str): namespace for the provider
+            provider_type (str): Type of the provider
+
+        Returns:
+            list: Releases in ascending version order, None if the provider
+            is unknown
+        """
+        key = (namespace, provider_type)
+        if key not in self._versions:
+            return None
+        return [self._releases[key + (version,)] for version in self._versions[key]]
+
+    def package(self, namespace, provider_type, version, os, arch):
+        """Look up a package.
+
+        Args:
+            namespace (str): namespace for the provider
+            provider_type (str): Type of the provider
+            version (str): Version of the provider
+            os (str): Operating system of the package
+            arch (str): Architecture of the package
+
+        Returns:
+            tuple: The Release and Package, None if there is no such package
+        """
+        return self._packages.get((namespace, provider_type, version, os, arch))
+
+    def file(self, filepath):
+        """Look up a downloadable file.
+
+        Args:
+            filepath (str): Path of the file below the provider download url
+
+        Returns:
+            str|bytes: Location of the file on disk or its content, None if
+            the file is unknown
+        """
+        return self._files.get(filepath)
+
+    def signing_keys(self, namespace):
+        """Get the keys signing the releases of a namespace.
+
+        Args:
+            namespace (str): namespace for the providers
+
+        Returns:
+            list: GPG public keys of the namespace
+        """
+        return self._signing_keys.get(namespace, [])
+
+
+class IndexedBackend(AbstractBackend):
+    """Provider backend answering all requests from a ProviderIndex.
+
+    Subclasses ingest their providers into a ProviderIndex and assign it to
+    the index attribute.
+    """
+
+    def __init__(self):
+        """Instantiate the backend with an empty index."""
+        self.index = ProviderIndex()
+
+    @property
+    def generation(self):
+        """int: Generation of the current index."""
+        return self.index.generation
+
+    def get_versions(self, namespace, provider_type):
+        """Get the available versions of a provider.
+
+        Args:
+            namespace (str): namespace for the provider
+            provider_type (str): Type of the provider, e.g. aws
+
+        Raises:
+            ProviderNotFoundException: Error if the provider does not exist
+
+        Returns:
+            json: JSON object listing each version with its protocols
+            and platforms
+        """
+        releases = self.index.versions(namespace, provider_type)
+        if releases is None:
+            raise ProviderNotFoundException(
+                "Provider Not Found: {}/{}".format(namespace, provider_type))
+        return dumps({"versions": [{
+            "version": release.version,
+            "protocols": release.protocols,
+            "platforms": [{"os": package.os, "arch": package.arch}
+                          for package in release.packages],
+        } for release in releases]})
+
+    def get_download(self, baseurl, namespace, provider_type, version, os, arch):
+        """Get the download details of a provider package.
+
+        Args:
+            baseurl (str): Root url of the server
+            namespace (str): namespace for the provider
+            provider_type (str): Type of the provider, e.g. aws
+            version (str): Version of the provider
+            os (str): Operating system of the package
+            arch (str): Architecture of the package
+
+        Raises:
+            ProviderNotFoundException: Error if the package does not exist
+
+        Returns:
+            json: JSON object with the download url, checksum and
+            signing keys of the package
+        """
+        found = self.index.package(namespace, provider_type, version, os, arch)
+        if found is None:
+            raise ProviderNotFoundException(
+                "Provider Package Not Found: {}/{}/{}/{}_{}".format(
+                    namespace, provider_type, version, os, arch))
+        release, package = found
+
+        def url(filename):
+            if filename is None:
+                return None
+            return "{root}dl/provider/{path}".format(
+                root=baseurl,
+                path=file_path(namespace, provider_type, version, filename))
+
+        return dumps({
+            "protocols": release.protocols,
+            "os": package.os,
+            "arch": package.arch,
+            "filename": package.filename,
+            "download_url": url(package.filename),
+            "shasums_url": url(release.shasums),
+            "shasums_signature_url": url(release.signature),
+            "shasum": package.shasum,
+            "signing_keys": {"gpg_public_keys": self.index.signing_keys(namespace)},
+        })
+
+    def download_provider(self, filepath):
+        """Download a provider file.
+
+        Only files registered in the index are served.
+
+        Args:
+            filepath (str): Path to the file requested
+
+        Raises:
+            FileNotFoundException: Raised if file does not exist
+
+        Returns:
+            str|bytes: Location of the file on disk, or its content
+        """
+        source = self.index.file(filepath)
+        if source is None:
+            raise FileNotFoundException("The requested file was not found.")
+        return source
+
+
+def file_path(namespace, provider_type, version, filename):
+    """Build the download path of a release file.
+
+    Args:
+        namespace (str): namespace for the provider
+        provider_type (str): Type of the provider
+        version (str): Version of the provider
+        filename (str): Name of the file
+
+    Returns:
+        str: Path of the file below the provider download url
+    """
+    return "/".join((namespace, provider_type, version, filename))
+
+
+def parse_shasums(text):
+    """Parse the content of a SHA256SUMS file.
+
+    Args:
+        text (str): Lines of "<hex digest>  <file name>"
+
+    Returns:
+        dict: File name mapped to its hex digest
+    """
+    shasums = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            shasums[parts[1].lstrip("*")] = parts[0].lower()
+    return shasums
+
+
+def format_shasums(shasums):
+    """Build the content of a SHA256SUMS file.
+
+    Args:
+        shasums (dict): File name mapped to its hex digest
+
+    Returns:
+        bytes: Lines of "<hex digest>  <file name>", sorted by file name
+    """
+    return "".join("{}  {}\n".format(shasums[filename], filename)
+                   for filename in sorted(shasums)).encode()
@@ -0,0 +1,15 @@
+class ProviderNotFoundException(Exception):
+    """ProviderNotFoundException.
+
+    An Exception thrown when a provider, or a version or platform of it,
+    was requested that was not found in the configured backend
+    """
+
+    def __init__(self, message):
+        """Initialize the Exception.
+
+        Args:
+            message (str): Description of the exception cause
+        """
+        self.message = message
+        super().__init__(self.message)
@@ -0,0 +1,27 @@
+import asyncio
+import json
+import pytest
+
+from terraform_registry_api.terraform_module_registry_api.backends import Dummy
+from terraform_registry_api.terraform_module_registry_api.backends.asynchronous \
+    import AsyncBackend, ThreadPoolBackend, as_async
+from terraform_registry_api.terraform_module_registry_api.exceptions \
+    import ModuleNotFoundException
+
+
+def test_thread_pool_backend():
+    backend = as_async(Dummy())
+    assert isinstance(backend, ThreadPoolBackend)
+    assert as_async(backend) is backend
+
+    async def calls():
+        versions = await backend.get_versions("terra", "test", "aws")
+        modules = await backend.get_modules("http://localhost/", limit=1)
+        with pytest.raises(ModuleNotFoundException):
+            await backend.get_versions("terra", "nothing", "aws")
+        return versions, modules
+
+    versions, modules = asyncio.run(calls())
+    assert json.loads(versions)["modules"][0]["versions"]
+    assert len(json.loads(modules)["modules"]) == 1
+    assert isinstance(backend, AsyncBackend)
@@ -3,6 +3,8 @@ import yaml
 import pytest
 import shutil
 import os
+import threading
+import time
 
 from os.path import join, exists
 
@@ -74,7 +76,7 @@ def test_get_versions_valid(backend):
         ]
     }
     response_versions = backend.get_versions("namespace1", "sample1", "aws")
-    assert response_versions == json.dumps(versions)
+    assert json.loads(response_versions) == versions
 
 
 def test_get_versions_invalid(backend):
@@ -451,3 +453,295 @@ def test_download_module_found(backend):
 def test_download_module_notfound(backend):
     with pytest.raises(FileNotFoundException):
         backend.download_module('/namespace2/sample1/aws/1.0.0/namespace1_sample1-aws-1.0.0.tar.gz')
+
+
+def test_reads_served_from_catalog(backend, monkeypatch):
+    def no_scandir(path):
+        raise AssertionError("unexpected directory scan of " + path)
+    monkeypatch.setattr(
+        "terraform_registry_api.terraform_module_registry_api.backends.filesystem.scandir",
+        no_scandir)
+    assert len(json.loads(backend.get_modules("http://localhost/"))['modules']) == 3
+    assert len(json.loads(backend.search_modules("http://localhost/", "sample"))['modules']) == 3
+    assert backend.get_module("http://localhost/", "namespace1", "sample1", "aws")
+    assert backend.get_latest_all_providers("http://localhost/", "namespace1", "sample1")
+
+
+def test_catalog_skips_hidden_and_empty(backend):
+    base = "./tests/backend/modules"
+    os.makedirs(join(base, ".staging/sample1/aws/1.0.0"))
+    os.makedirs(join(base, "namespace1/sample1/azure"))
+    rescanned = Filesystem(base)
+    assert rescanned.catalog.snapshot().namespaces() == ["namespace1"]
+    assert rescanned.catalog.snapshot().versions("namespace1", "sample1", "azure") is None
+
+
+def test_get_modules_paginated(backend):
+    response = json.loads(backend.get_modules("http://localhost/", "namespace1",
+                                              offset=1, limit=1))
+    assert response['meta'] == {
+        'limit': 1,
+        'current_offset': 1,
+        'next_offset': 2,
+        'next_url': 'http://localhost/v1/modules/namespace1?limit=1&offset=2'
+    }
+    assert [module['id'] for module in response['modules']] == \
+        ['/namespace1/sample1/gcp/1.0.0']
+    response = json.loads(backend.get_modules("http://localhost/", offset=2, limit=1))
+    assert response['meta'] == {'limit': 1, 'current_offset': 2}
+    assert [module['id'] for module in response['modules']] == \
+        ['/namespace1/sample2/aws/2.0.0']
+
+
+def test_get_modules_provider_filter(backend):
+    response = json.loads(backend.get_modules("http://localhost/", provider="gcp"))
+    assert [module['id'] for module in response['modules']] == \
+        ['/namespace1/sample1/gcp/1.0.0']
+
+
+def test_search_modules_paginated(backend):
+    response = json.loads(backend.search_modules("http://localhost/", "sample1",
+                                                 limit=1, provider="aws"))
+    assert [module['id'] for module in response['modules']] == \
+        ['/namespace1/sample1/aws/2.0.0']
+    assert 'next_url' not in response['meta']
+
+
+def test_get_latest_for_all_paginated(backend):
+    response = json.loads(backend.get_latest_all_providers(
+        "http://localhost/", "namespace1", "sample1", offset=0, limit=1))
+    assert response['meta']['next_url'] == \
+        'http://localhost/v1/modules/namespace1/sample1?limit=1&offset=1'
+    assert len(response['modules']) == 1
+
+
+def test_search_modules_description_and_refresh(backend):
+    base = "./tests/backend/modules"
+    response = json.loads(backend.search_modules("http://localhost/", "a module"))
+    assert len(response['modules']) == 3
+    os.makedirs(join(base, "namespace1/network/aws/1.0.0"))
+    backend.refresh("namespace1")
+    response = json.loads(backend.search_modules("http://localhost/", "netw"))
+    assert [module['id'] for module in response['modules']] == \
+        ['/namespace1/network/aws/1.0.0']
+
+
+def test_prerelease_versions(backend):
+    base = "./tests/backend/modules"
+    os.makedirs(join(base, "namespace1/sample1/aws/2.1.0-beta.1"))
+    backend.refresh("namespace1", "sample1", "aws")
+    assert json.loads(backend.get_versions("namespace1", "sample1", "aws")) == {
+        "modules": [{"versions": [{"version": "1.0.0"}, {"version": "1.1.0"},
+                                  {"version": "2.0.0"}, {"version": "2.1.0-beta.1"}]}]
+    }
+    assert backend.download_latest('http://localhost/', 'namespace1', 'sample1', 'aws') \
+        == "http://localhost/v1/modules/namespace1/sample1/aws/2.0.0/download"
+    details = json.loads(backend.get_module("http://localhost/", "namespace1",
+                                            "sample1", "aws", "2.1.0-beta.1"))
+    assert details['version'] == "2.1.0-beta.1"
+
+
+def make_tree(base, tarballs):
+    for (namespace, name, provider, version), content in tarballs.items():
+        directory = base / namespace / name / provider / version
+        directory.mkdir(parents=True)
+        (directory / "{}_{}-{}-{}.tar.gz".format(namespace, name, provider,
+                                                 version)).write_bytes(content)
+
+
+def test_dedupe(tmp_path):
+    make_tree(tmp_path, {("ns", "vpc", "aws", "1.0.0"): b"same",
+                         ("ns", "vpc", "aws", "1.0.1"): b"same",
+                         ("ns", "vpc", "gcp", "1.0.0"): b"other"})
+    backend = Filesystem(str(tmp_path))
+    assert backend.dedupe() == (3, 4)
+    assert len(backend.blobs.digests()) == 2
+    path = backend.download_module("ns/vpc/aws/1.0.1/ns_vpc-aws-1.0.1.tar.gz")
+    assert os.path.islink(path)
+    with open(path, "rb") as tarball:
+        assert tarball.read() == b"same"
+    # links are not moved again, and the module tree is unchanged
+    assert backend.dedupe() == (0, 0)
+    backend.reload()
+    assert json.loads(backend.get_versions("ns", "vpc", "aws"))["modules"][0][
+        "versions"] == [{"version": "1.0.0"}, {"version": "1.0.1"}]
+
+
+def test_store_artifact_and_collect(tmp_path):
+    make_tree(tmp_path, {("ns", "vpc", "aws", "1.0.0"): b"first"})
+    backend = Filesystem(str(tmp_path))
+    backend.dedupe()
+    source = tmp_path / "upload.tar.gz"
+    source.write_bytes(b"second")
+    digest = backend.store_artifact("ns", "vpc", "aws", "1.0.0", str(source))
+    assert digest in backend.blobs
+    # the replaced blob is new, it may still be about to be linked
+    assert backend.collect_blobs() == []
+    assert backend.collect_blobs(grace=0) == [
+        "a7937b64b8caa58f03721bb6bacf5c78cb235febe0e70b1b84cd99541461a08e"]
+    assert backend.blobs.digests() == [digest]
+
+
+def test_collect_keeps_blobs_being_published(tmp_path):
+    make_tree(tmp_path, {("ns", "vpc", "aws", "1.0.0"): b"first"})
+    backend = Filesystem(str(tmp_path))
+    source = tmp_path / "upload.tar.gz"
+    source.write_bytes(b"stored")
+    # stored but not linked yet, as between the two steps of publishing
+    digest = backend.blobs.put_file(str(source))
+    assert backend.collect_blobs() == []
+    assert digest in backend.blobs
+
+
+def test_publish(tmp_path):
+    from terraform_registry_api.terraform_module_registry_api.backends.ingest \
+        import Upload
+    from terraform_registry_api.terraform_module_registry_api.exceptions \
+        import InvalidModuleException, ModuleExistsException
+    import io
+    import tarfile
+    tree = tmp_path / "modules"
+    make_tree(tree, {("ns", "vpc", "aws", "1.0.0"): b"first"})
+    tarball = tmp_path / "upload.tar.gz"
+    with tarfile.open(tarball, mode="w:gz") as upload:
+        info = tarfile.TarInfo("main.tf")
+        info.size = 2
+        upload.addfile(info, io.BytesIO(b"{}"))
+    backend = Filesystem(str(tree), workers=2)
+    generation = backend.generation
+    uploads = [Upload("ns", "vpc", "aws", "1.1.0", str(tarball)),
+               Upload("ns", "db", "gcp", "0.1.0", str(tarball))]
+    digests = backend.publish(uploads)
+    assert digests[0] == digests[1]
+    assert backend.generation == generation + 1
+    assert json.loads(backend.get_versions("ns", "vpc", "aws"))["modules"][0][
+        "versions"] == [{"version": "1.0.0"}, {"version": "1.1.0"}]
+    assert os.path.islink(backend.download_module("ns/db/gcp/0.1.0/ns_db-gcp-0.1.0.tar.gz"))
+
+    with pytest.raises(ModuleExistsException):
+        backend.publish([Upload("ns", "vpc", "aws", "1.0.0", str(tarball))])
+    broken = tmp_path / "broken.tar.gz"
+    broken.write_bytes(b"broken")
+    # a broken tarball fails the whole batch
+    with pytest.raises(InvalidModuleException):
+        backend.publish([Upload("ns", "vpc", "aws", "1.2.0", str(tarball)),
+                         Upload("ns", "vpc", "aws", "1.3.0", str(broken))])
+    assert backend.generation == generation + 1
+    assert not os.path.exists(join(str(tree), "ns/vpc/aws/1.2.0"))
+
+
+def test_stream_modules_matches_get_modules(tmp_path):
+    make_tree(tmp_path, {(namespace, name, provider, "1.0.0"): b""
+                         for namespace in ("ns1", "ns2")
+                         for name in ("vpc", "dns", "lb")
+                         for provider in ("aws", "gcp")})
+    backend = Filesystem(str(tmp_path))
+    for namespace in (None, "ns2"):
+        for offset, limit in ((0, None), (0, 4), (4, 4), (10, 4), (20, 4)):
+            for provider in (None, "gcp"):
+                chunks = list(backend.stream_modules(
+                    "http://localhost/", namespace, offset=offset, limit=limit,
+                    provider=provider))
+                assert b"".join(chunks) == backend.get_modules(
+                    "http://localhost/", namespace, offset=offset, limit=limit,
+                    provider=provider)
+
+
+def test_catalog_file_restored(tmp_path, monkeypatch):
+    tree = tmp_path / "tree"
+    make_tree(tree, {("ns", "vpc", "aws", "1.0.0"): b"",
+                     ("ns", "vpc", "aws", "1.1.0"): b"",
+                     ("ns", "dns", "gcp", "0.1.0"): b""})
+    catalog_file = str(tmp_path / "catalog.sqlite")
+    Filesystem(str(tree), catalog_file=catalog_file)
+    listing = Filesystem(str(tree)).get_modules("http://localhost/")
+    shutil.rmtree(str(tree / "ns" / "dns"))
+    make_tree(tree, {("ns", "vpc", "aws", "2.0.0"): b""})
+
+    monkeypatch.setattr(Filesystem, "_Filesystem__start_reconcile", lambda self: None)
+    backend = Filesystem(str(tree), catalog_file=catalog_file)
+    assert not backend.reconciled.is_set()
+    assert backend.get_modules("http://localhost/") == listing
+    assert json.loads(backend.get_versions("ns", "vpc", "aws"))["modules"][0][
+        "versions"] == [{"version": "1.0.0"}, {"version": "1.1.0"}]
+    backend.reload()
+    assert json.loads(backend.get_versions("ns", "vpc", "aws"))["modules"][0][
+        "versions"][-1] == {"version": "2.0.0"}
+    assert json.loads(backend.get_modules("http://localhost/"))["modules"][0][
+        "name"] == "vpc"
+    assert len(json.loads(backend.get_modules("http://localhost/"))["modules"]) == 1
+
+
+def test_catalog_file_searchable_before_reconcile(tmp_path, monkeypatch):
+    tree = tmp_path / "tree"
+    make_tree(tree, {("ns", "vpc", "aws", "1.0.0"): b"",
+                     ("ns", "dns", "gcp", "0.1.0"): b""})
+    catalog_file = str(tmp_path / "catalog.sqlite")
+    expected = Filesystem(str(tree), catalog_file=catalog_file).search_modules(
+        "http://localhost/", "vpc")
+
+    monkeypatch.setattr(Filesystem, "_Filesystem__start_reconcile", lambda self: None)
+    backend = Filesystem(str(tree), catalog_file=catalog_file)
+    assert not backend.reconciled.is_set()
+    assert backend.search_modules("http://localhost/", "vpc") == expected
+    found = json.loads(expected)["modules"]
+    assert [module["id"] for module in found] == ["/ns/vpc/aws/1.0.0"]
+
+
+def test_catalog_file_reconciled_in_background(tmp_path):
+    tree = tmp_path / "tree"
+    make_tree(tree, {("ns", "vpc", "aws", "1.0.0"): b""})
+    catalog_file = str(tmp_path / "catalog.sqlite")
+    Filesystem(str(tree), catalog_file=catalog_file)
+    make_tree(tree, {("ns", "dns", "aws", "1.0.0"): b""})
+    backend = Filesystem(str(tree), catalog_file=catalog_file)
+    assert backend.reconciled.wait(10)
+    found = json.loads(backend.search_modules("http://localhost/", "dns"))["modules"]
+    assert [module["id"] for module in found] == ["/ns/dns/aws/1.0.0"]
+    # the rewritten file holds the reconciled catalog, other trees ignore it
+    restored = Filesystem(str(tree), catalog_file=catalog_file)
+    assert restored.get_modules("http://localhost/") == backend.get_modules(
+        "http://localhost/")
+    restored.reconciled.wait(10)
+    other = tmp_path / "other"
+    other.mkdir()
+    assert json.loads(Filesystem(str(other), catalog_file=catalog_file).get_modules(
+        "http://localhost/"))["modules"] == []
+
+
+def test_catalog_file_reconciled_before_fork(tmp_path, monkeypatch):
+    tree = tmp_path / "tree"
+    make_tree(tree, {("ns", "vpc", "aws", "1.0.0"): b""})
+    catalog_file = str(tmp_path / "catalog.sqlite")
+    Filesystem(str(tree), catalog_file=catalog_file)
+    make_tree(tree, {("ns", "dns", "aws", "1.0.0"): b""})
+    started = threading.Event()
+    reload = Filesystem.reload
+
+    def slow_reload(self):
+        started.set()
+        time.sleep(0.2)
+        reload(self)
+
+    monkeypatch.setattr(Filesystem, "reload", slow_reload)
+    backend = Filesystem(str(tree), catalog_file=catalog_file)
+    assert started.wait(10)
+    backend.before_fork()
+    assert backend.reconciled.is_set()
+    scans = []
+    monkeypatch.setattr(Filesystem, "reload", lambda self: scans.append(self))
+    backend.after_fork()
+    assert scans == []
+    assert len(json.loads(backend.get_modules("http://localhost/"))["modules"]) == 2
+
+
+def test_compile_metadata(tmp_path):
+    make_tree(tmp_path, {("ns", "vpc", "aws", "1.0.0"): b""})
+    (tmp_path / "ns" / "vpc" / "module_metadata.yaml").write_text("owner: terra\n")
+    Filesystem(str(tmp_path))
+    assert not (tmp_path / "ns" / "vpc" / "module_metadata.json").exists()
+    backend = Filesystem(str(tmp_path), compile_metadata=True)
+    assert json.loads((tmp_path / "ns" / "vpc" / "module_metadata.json").read_text()) \
+        == {"owner": "terra"}
+    assert json.loads(backend.get_module("http://localhost/", "ns", "vpc", "aws"))[
+        "owner"] == "terra"
@@ -0,0 +1,106 @@
+import io
+import os
+import tarfile
+import threading
+import pytest
+
+from terraform_registry_api.terraform_module_registry_api.backends.ingest \
+    import (Upload, check_upload, parse_artifact_path, publish_uploads,
+            read_archive, read_tree)
+from terraform_registry_api.terraform_module_registry_api.backends.blobstore \
+    import BlobStore
+from terraform_registry_api.terraform_module_registry_api.exceptions \
+    import InvalidModuleException, ModuleExistsException
+
+
+def make_tarball(path, members=("main.tf",)):
+    with tarfile.open(path, mode="w:gz") as tarball:
+        for name in members:
+            info = tarfile.TarInfo(name)
+            info.size = 2
+            tarball.addfile(info, io.BytesIO(b"{}"))
+    return str(path)
+
+
+def test_parse_artifact_path():
+    assert parse_artifact_path("./ns/vpc/aws/1.0.0/ns_vpc-aws-1.0.0.tar.gz") == \
+        ("ns", "vpc", "aws", "1.0.0")
+    assert parse_artifact_path("ns/vpc/aws/1.0.0/other.tar.gz") is None
+    assert parse_artifact_path("ns/vpc/aws/1.0.0") is None
+
+
+def test_check_upload(tmp_path):
+    valid = make_tarball(tmp_path / "valid.tar.gz")
+    check_upload(Upload("ns", "vpc", "aws", "1.0.0", valid))
+    with pytest.raises(InvalidModuleException):
+        check_upload(Upload("ns", "vpc", "aws", "latest", valid))
+    with pytest.raises(InvalidModuleException):
+        check_upload(Upload("ns", "-vpc", "aws", "1.0.0", valid))
+    escaping = make_tarball(tmp_path / "escaping.tar.gz", ("../main.tf",))
+    with pytest.raises(InvalidModuleException):
+        check_upload(Upload("ns", "vpc", "aws", "1.0.0", escaping))
+    garbage = tmp_path / "garbage.tar.gz"
+    garbage.write_bytes(b"not a tarball")
+    with pytest.raises(InvalidModuleException):
+        check_upload(Upload("ns", "vpc", "aws", "1.0.0", str(garbage)))
+
+
+def test_read_tree(tmp_path):
+    directory = tmp_path / "ns" / "vpc" / "aws" / "1.0.0"
+    directory.mkdir(parents=True)
+    path = make_tarball(directory / "ns_vpc-aws-1.0.0.tar.gz")
+    (directory / "README").write_text("ignored")
+    assert read_tree(str(tmp_path)) == [Upload("ns", "vpc", "aws", "1.0.0", path)]
+
+
+def test_read_archive(tmp_path):
+    tarball = make_tarball(tmp_path / "module.tar.gz")
+    stream = io.BytesIO()
+    with tarfile.open(fileobj=stream, mode="w") as archive:
+        archive.add(tarball, "ns/vpc/aws/1.0.0/ns_vpc-aws-1.0.0.tar.gz")
+    stream.seek(0)
+    staging = tmp_path / "staging"
+    staging.mkdir()
+    uploads = read_archive(stream, str(staging))
+    assert [upload[:4] for upload in uploads] == [("ns", "vpc", "aws", "1.0.0")]
+    with open(uploads[0].path, "rb") as staged, open(tarball, "rb") as original:
+        assert staged.read() == original.read()
+    with pytest.raises(InvalidModuleException):
+        read_archive(io.BytesIO(b"not an archive"), str(staging))
+
+
+def test_publish_uploads(tmp_path):
+    tree = tmp_path / "tree"
+    blobs = BlobStore(str(tree / ".blobs"))
+    tarball = make_tarball(tmp_path / "upload.tar.gz")
+    uploads = [Upload("ns", "vpc", "aws", "1.0.0", tarball),
+               Upload("ns", "db", "gcp", "0.1.0", tarball)]
+    recorded = []
+    lock = threading.Lock()
+
+    def record(held, modules):
+        assert held
+        recorded.extend(modules)
+
+    digests = publish_uploads(blobs, str(tree), uploads, lambda: lock, record)
+    assert digests[0] == digests[1]
+    assert recorded == [("ns", "db"), ("ns", "vpc")]
+    assert os.path.islink(tree / "ns/vpc/aws/1.0.0/ns_vpc-aws-1.0.0.tar.gz")
+    with pytest.raises(ModuleExistsException):
+        publish_uploads(blobs, str(tree), uploads[:1], lambda: lock, record)
+    with pytest.raises(InvalidModuleException):
+        publish_uploads(blobs, str(tree), uploads[:1] * 2, lambda: lock, record)
+
+
+def test_publish_uploads_rolled_back(tmp_path):
+    tree = tmp_path / "tree"
+    blobs = BlobStore(str(tree / ".blobs"))
+    tarball = make_tarball(tmp_path / "upload.tar.gz")
+
+    def record(held, modules):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        publish_uploads(blobs, str(tree), [Upload("ns", "vpc", "aws", "1.0.0", tarball)],
+                        threading.Lock, record)
+    assert not os.path.lexists(tree / "ns/vpc/aws/1.0.0/ns_vpc-aws-1.0.0.tar.gz")
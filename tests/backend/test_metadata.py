@@ -0,0 +1,87 @@
+import json
+import os
+import pytest
+import time
+
+from terraform_registry_api.terraform_module_registry_api.backends.metadata \
+    import MetadataCache, compile_metadata, COMPILED_METADATA_FILE, METADATA_FILE
+from terraform_registry_api.terraform_module_registry_api.exceptions \
+    import FileNotFoundException
+
+
+def write(path, text, mtime=None):
+    path.write_text(text)
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def test_load_is_cached(tmp_path):
+    write(tmp_path / METADATA_FILE, "owner: terra\n")
+    cache = MetadataCache()
+    first = cache.load(str(tmp_path))
+    assert first == {"owner": "terra"}
+    assert cache.load(str(tmp_path)) is first
+    assert len(cache) == 1
+
+
+def test_load_picks_up_changes(tmp_path):
+    write(tmp_path / METADATA_FILE, "owner: terra\n", 1_000_000_000)
+    cache = MetadataCache()
+    cache.load(str(tmp_path))
+    write(tmp_path / METADATA_FILE, "owner: other\n", 2_000_000_000)
+    assert cache.load(str(tmp_path)) == {"owner": "other"}
+
+
+def test_load_empty_file(tmp_path):
+    write(tmp_path / METADATA_FILE, "")
+    assert MetadataCache().load(str(tmp_path)) == {}
+
+
+def test_load_missing(tmp_path):
+    with pytest.raises(FileNotFoundException):
+        MetadataCache().load(str(tmp_path))
+
+
+def test_compiled_metadata_preferred(tmp_path):
+    write(tmp_path / METADATA_FILE, "owner: terra\nverified: false\n",
+          1_000_000_000)
+    assert compile_metadata(str(tmp_path)) == {"owner": "terra", "verified": False}
+    assert json.loads((tmp_path / COMPILED_METADATA_FILE).read_text()) == {
+        "owner": "terra", "verified": False}
+    write(tmp_path / COMPILED_METADATA_FILE, '{"owner": "compiled"}', 2_000_000_000)
+    assert MetadataCache().load(str(tmp_path)) == {"owner": "compiled"}
+
+
+def test_stale_compiled_metadata_ignored(tmp_path):
+    write(tmp_path / COMPILED_METADATA_FILE, '{"owner": "compiled"}', 1_000_000_000)
+    write(tmp_path / METADATA_FILE, "owner: terra\n", 2_000_000_000)
+    assert MetadataCache().load(str(tmp_path)) == {"owner": "terra"}
+
+
+def test_compile_missing(tmp_path):
+    with pytest.raises(FileNotFoundException):
+        compile_metadata(str(tmp_path))
+
+
+def test_load_compiles(tmp_path):
+    write(tmp_path / METADATA_FILE, "owner: terra\n", 1_000_000_000)
+    cache = MetadataCache(compile=True)
+    assert cache.load(str(tmp_path)) == {"owner": "terra"}
+    assert json.loads((tmp_path / COMPILED_METADATA_FILE).read_text()) == {
+        "owner": "terra"}
+    # changed YAML metadata is compiled again
+    write(tmp_path / METADATA_FILE, "owner: other\n", time.time_ns() + 10 ** 10)
+    assert cache.load(str(tmp_path)) == {"owner": "other"}
+    assert json.loads((tmp_path / COMPILED_METADATA_FILE).read_text()) == {
+        "owner": "other"}
+
+
+def test_load_compile_fails(tmp_path, monkeypatch):
+    write(tmp_path / METADATA_FILE, "owner: terra\n")
+
+    def failing(*args, **kwargs):
+        raise PermissionError("read only")
+
+    monkeypatch.setattr(json, "dump", failing)
+    assert MetadataCache(compile=True).load(str(tmp_path)) == {"owner": "terra"}
+    assert os.listdir(str(tmp_path)) == [METADATA_FILE]
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import pytest
+
+from terraform_registry_api.terraform_module_registry_api.exceptions \
+    import FileNotFoundException
+from terraform_registry_api.terraform_provider_registry_api.backends \
+    import Filesystem
+from terraform_registry_api.terraform_provider_registry_api.exceptions \
+    import ProviderNotFoundException
+
+KEYS = {"gpg_public_keys": [{"key_id": "51852D87348FFC4C",
+                             "ascii_armor": "-----BEGIN PGP PUBLIC KEY BLOCK-----"}]}
+
+
+def write_release(basedir, version, platforms, sums=True, signature=True,
+                  protocols=None):
+    directory = basedir / "hashicorp" / "random" / version
+    directory.mkdir(parents=True)
+    shasums = {}
+    for platform in platforms:
+        filename = "terraform-provider-random_{}_{}.zip".format(version, platform)
+        (directory / filename).write_bytes(filename.encode())
+        shasums[filename] = hashlib.sha256(filename.encode()).hexdigest()
+    prefix = "terraform-provider-random_{}".format(version)
+    if sums:
+        (directory / (prefix + "_SHA256SUMS")).write_text("".join(
+            "{}  {}\n".format(digest, name) for name, digest in shasums.items()))
+    if signature:
+        (directory / (prefix + "_SHA256SUMS.sig")).write_bytes(b"signature")
+    if protocols:
+        (directory / (prefix + "_manifest.json")).write_text(json.dumps(
+            {"version": 1, "metadata": {"protocol_versions": protocols}}))
+    return shasums
+
+
+@pytest.fixture
+def basedir(tmp_path):
+    write_release(tmp_path, "3.1.0", ["linux_amd64", "darwin_arm64"],
+                  protocols=["5.0", "6.0"])
+    write_release(tmp_path, "3.0.0", ["linux_amd64"], sums=False, signature=False)
+    (tmp_path / "hashicorp" / "signing_keys.json").write_text(json.dumps(KEYS))
+    return tmp_path
+
+
+def test_get_versions(basedir):
+    backend = Filesystem(str(basedir))
+    versions = json.loads(backend.get_versions("hashicorp", "random"))["versions"]
+    assert versions == [
+        {"version": "3.0.0", "protocols": ["5.0"],
+         "platforms": [{"os": "linux", "arch": "amd64"}]},
+        {"version": "3.1.0", "protocols": ["5.0", "6.0"],
+         "platforms": [{"os": "darwin", "arch": "arm64"},
+                       {"os": "linux", "arch": "amd64"}]},
+    ]
+
+
+def test_get_versions_notfound(basedir):
+    with pytest.raises(ProviderNotFoundException):
+        Filesystem(str(basedir)).get_versions("hashicorp", "aws")
+
+
+def test_get_download(basedir):
+    backend = Filesystem(str(basedir))
+    package = json.loads(backend.get_download("http://localhost/", "hashicorp",
+                                              "random", "3.1.0", "darwin", "arm64"))
+    assert package["shasum"] == hashlib.sha256(
+        b"terraform-provider-random_3.1.0_darwin_arm64.zip").hexdigest()
+    assert package["shasums_signature_url"] == "http://localhost/dl/provider/" \
+        "hashicorp/random/3.1.0/terraform-provider-random_3.1.0_SHA256SUMS.sig"
+    assert package["signing_keys"] == KEYS
+    assert package["protocols"] == ["5.0", "6.0"]
+    with pytest.raises(ProviderNotFoundException):
+        backend.get_download("http://localhost/", "hashicorp", "random", "3.1.0",
+                             "windows", "amd64")
+
+
+def test_missing_shasums_generated(basedir):
+    backend = Filesystem(str(basedir))
+    package = json.loads(backend.get_download("http://localhost/", "hashicorp",
+                                              "random", "3.0.0", "linux", "amd64"))
+    assert package["shasums_signature_url"] is None
+    shasums = backend.download_provider(
+        "hashicorp/random/3.0.0/terraform-provider-random_3.0.0_SHA256SUMS")
+    assert shasums == "{}  {}\n".format(package["shasum"],
+                                        package["filename"]).encode()
+
+
+def test_download_provider(basedir):
+    backend = Filesystem(str(basedir))
+    path = backend.download_provider(
+        "hashicorp/random/3.1.0/terraform-provider-random_3.1.0_linux_amd64.zip")
+    assert path == str(basedir / "hashicorp" / "random" / "3.1.0" /
+                       "terraform-provider-random_3.1.0_linux_amd64.zip")
+    with pytest.raises(FileNotFoundException):
+        backend.download_provider("hashicorp/random/3.1.0/../../signing_keys.json")
+
+
+def test_reload(basedir):
+    backend = Filesystem(str(basedir))
+    generation = backend.generation
+    write_release(basedir, "3.2.0", ["linux_amd64"])
+    backend.reload()
+    assert backend.generation == generation + 1
+    versions = json.loads(backend.get_versions("hashicorp", "random"))["versions"]
+    assert versions[-1]["version"] == "3.2.0"
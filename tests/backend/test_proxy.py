@@ -0,0 +1,236 @@
+import json
+import threading
+import time
+import pytest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+pytest.importorskip("urllib3")
+
+from terraform_registry_api.terraform_module_registry_api.backends \
+    import Proxy  # noqa: E402
+from terraform_registry_api.terraform_module_registry_api.backends.proxy \
+    import SingleFlight  # noqa: E402
+from terraform_registry_api.terraform_module_registry_api.exceptions \
+    import (ModuleNotFoundException, FileNotFoundException,  # noqa: E402
+            UpstreamUnavailableException)
+
+ARCHIVE = b"archive content"
+VERSIONS = {"modules": [{"versions": [{"version": "1.0.0"}, {"version": "1.1.0"},
+                                      {"version": "2.0.0-beta"}]}]}
+
+
+class Upstream(BaseHTTPRequestHandler):
+    """Fake registry counting the requests for each path."""
+
+    def do_GET(self):
+        server = self.server
+        server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        time.sleep(server.delay)
+        if server.down:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path == "/.well-known/terraform.json":
+            self.reply(200, {"modules.v1": "/api/modules/"})
+        elif self.path == "/api/modules/terra/vpc/aws/versions":
+            self.reply(200, VERSIONS)
+        elif self.path == "/api/modules/terra/vpc/aws/1.0.0/download":
+            self.send_response(204)
+            self.send_header("X-Terraform-Get", "/archives/vpc-1.0.0.tar.gz")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/api/modules/terra/vpc/aws/1.1.0/download":
+            self.send_response(204)
+            self.send_header("X-Terraform-Get",
+                             "git::https://example.com/terra/vpc?ref=v1.1.0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/archives/vpc-1.0.0.tar.gz":
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(ARCHIVE)))
+            self.end_headers()
+            self.wfile.write(ARCHIVE)
+        elif self.path.startswith("/api/modules/search?"):
+            meta = {}
+            if "limit=" in self.path:
+                meta = {"next_url": "/api/modules/search?q=vpc&limit=5&offset=5",
+                        "prev_url": "/api/modules/search?q=vpc&limit=5&offset=0"}
+            self.reply(200, {"meta": meta, "modules": [], "query": self.path})
+        else:
+            self.reply(404, {"errors": ["Not Found"]})
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    server.hits, server.delay, server.down = {}, 0, False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_backend(upstream, tmp_path, ttl=300, max_responses=1024):
+    return Proxy("http://127.0.0.1:{}/".format(upstream.server_port),
+                 str(tmp_path), ttl=ttl, timeout=2, max_responses=max_responses)
+
+
+def test_get_versions_cached(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    assert json.loads(backend.get_versions("terra", "vpc", "aws")) == VERSIONS
+    assert json.loads(backend.get_versions("terra", "vpc", "aws")) == VERSIONS
+    assert upstream.hits["/api/modules/terra/vpc/aws/versions"] == 1
+    assert upstream.hits["/.well-known/terraform.json"] == 1
+
+
+def test_not_found(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    with pytest.raises(ModuleNotFoundException):
+        backend.get_versions("terra", "nothing", "aws")
+
+
+def test_query_parameters(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    result = json.loads(backend.search_modules("http://localhost/", "vpc", limit=5,
+                                               verified=True))
+    assert result["query"] == "/api/modules/search?q=vpc&offset=0&limit=5&verified=true"
+
+
+def test_page_urls_rewritten(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    result = json.loads(backend.search_modules("http://localhost/", "vpc", limit=5))
+    assert result["meta"] == {
+        "next_url": "http://localhost/v1/modules/search?q=vpc&limit=5&offset=5",
+        "prev_url": "http://localhost/v1/modules/search?q=vpc&limit=5&offset=0"}
+    assert json.loads(backend.search_modules("http://localhost/", "vpc"))[
+        "meta"] == {}
+
+
+def test_download_latest(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    assert backend.download_latest("http://localhost/", "terra", "vpc", "aws") == \
+        "http://localhost/v1/modules/terra/vpc/aws/1.1.0/download"
+
+
+def test_download_archive_cached(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    path = backend.download_version("terra", "vpc", "aws", "1.0.0")
+    assert path == "terra/vpc/aws/1.0.0/terra_vpc-aws-1.0.0.tar.gz"
+    blob = backend.download_module(path)
+    with open(blob, "rb") as archive:
+        assert archive.read() == ARCHIVE
+    assert backend.download_module(path) == blob
+    assert upstream.hits["/archives/vpc-1.0.0.tar.gz"] == 1
+
+    # archives are kept permanently, even once the upstream is gone
+    upstream.down = True
+    assert make_backend(upstream, tmp_path, ttl=0).download_module(path) == blob
+
+
+def test_download_git_source_passed_through(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    assert backend.download_version("terra", "vpc", "aws", "1.1.0") == \
+        "git::https://example.com/terra/vpc?ref=v1.1.0"
+    with pytest.raises(FileNotFoundException):
+        backend.download_module("terra/vpc/aws/1.1.0/terra_vpc-aws-1.1.0.tar.gz")
+
+
+def test_stale_served_when_upstream_down(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path, ttl=0)
+    backend.get_versions("terra", "vpc", "aws")
+    upstream.down = True
+    assert json.loads(backend.get_versions("terra", "vpc", "aws")) == VERSIONS
+    # responses are also kept on disk for a new process
+    restarted = make_backend(upstream, tmp_path, ttl=0)
+    assert json.loads(restarted.get_versions("terra", "vpc", "aws")) == VERSIONS
+    with pytest.raises(UpstreamUnavailableException):
+        restarted.get_versions("terra", "other", "aws")
+    with pytest.raises(FileNotFoundException):
+        restarted.download_module("terra/other/aws/1.0.0/terra_other-aws-1.0.0.tar.gz")
+
+
+def test_responses_bounded(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path, max_responses=3)
+    backend.get_versions("terra", "vpc", "aws")
+    for query in ("a", "b", "c", "d"):
+        backend.search_modules("http://localhost/", query)
+    assert len(backend._responses) == 3
+    # the least recently used responses were dropped
+    backend.search_modules("http://localhost/", "a")
+    assert upstream.hits["/api/modules/search?q=a&offset=0"] == 2
+    backend.search_modules("http://localhost/", "d")
+    assert upstream.hits["/api/modules/search?q=d&offset=0"] == 1
+
+
+def test_only_module_responses_stored(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    backend.get_versions("terra", "vpc", "aws")
+    backend.search_modules("http://localhost/", "vpc")
+    with pytest.raises(ModuleNotFoundException):
+        backend.get_versions("terra", "nothing", "aws")
+    # the versions and the discovery document
+    assert len(list((tmp_path / "responses").iterdir())) == 2
+
+
+def test_concurrent_requests_collapsed(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    backend.get_versions("terra", "vpc", "aws")
+    upstream.delay = 0.2
+    backend.ttl = 0
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        backend.get_versions("terra", "vpc", "aws"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8
+    assert upstream.hits["/api/modules/terra/vpc/aws/versions"] == 2
+
+
+def test_single_flight_error_shared():
+    flight = SingleFlight()
+    started = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("failed")
+
+    def follower():
+        started.wait()
+        try:
+            flight.do("key", lambda: "not called")
+        except ValueError as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=follower)
+    thread.start()
+    with pytest.raises(ValueError):
+        flight.do("key", failing)
+    thread.join()
+    assert len(errors) == 1
+
+
+def test_after_fork_drops_flights(upstream, tmp_path):
+    backend = make_backend(upstream, tmp_path)
+    inherited = backend._flight
+    # a fetch the parent had in flight never finishes in the child
+    inherited._calls["pending"] = SingleFlight.Call()
+    backend.after_fork()
+    assert backend._flight is not inherited
+    assert json.loads(backend.get_versions("terra", "vpc", "aws")) == VERSIONS
@@ -0,0 +1,66 @@
+import json
+
+from terraform_registry_api.terraform_module_registry_api.backends.catalog \
+    import Catalog
+from terraform_registry_api.terraform_module_registry_api.backends.records \
+    import ModuleRecord, render_listing, stream_listing
+
+
+def test_record_matches_dict():
+    record = ModuleRecord("ns", "vpc", "aws", "1.0.0", 'A. "Quoted" Person',
+                          "Café\n", False, "dl/modules/ns/vpc/aws/1.0.0")
+    rendered = record.render('http://example.com/"/')
+    assert json.loads(rendered) == {
+        "id": "/ns/vpc/aws/1.0.0",
+        "owner": 'A. "Quoted" Person',
+        "namespace": "ns",
+        "name": "vpc",
+        "version": "1.0.0",
+        "provider": "aws",
+        "description": "Café\n",
+        "source": 'http://example.com/"/dl/modules/ns/vpc/aws/1.0.0',
+        "published_at": "2021-10-17T01:22:17.792066Z",
+        "downloads": 213,
+        "verified": False
+    }
+    assert list(json.loads(rendered)) == ["id", "owner", "namespace", "name", "version",
+                                          "provider", "description", "source",
+                                          "published_at", "downloads", "verified"]
+
+
+def test_render_listing():
+    records = [ModuleRecord("ns", name, "aws", "1.0.0", "", "", True,
+                            "dl/modules/ns/{}/aws/1.0.0".format(name))
+               for name in ("a", "b")]
+    listing = json.loads(render_listing("http://localhost/", {"limit": 2}, records))
+    assert listing["meta"] == {"limit": 2}
+    assert [module["name"] for module in listing["modules"]] == ["a", "b"]
+    assert json.loads(render_listing("http://localhost/", {}, [])) == {
+        "meta": {}, "modules": []}
+
+
+def test_entry_keeps_served_fields_only():
+    catalog = Catalog()
+    catalog.set_module("ns", "vpc", {"owner": "me", "description": "VPC",
+                                     "unused": "x" * 1000}, {"aws": ["1.0.0", "1.1.0"]})
+    entry = catalog.snapshot().get("ns", "vpc")
+    assert entry.metadata == {"owner": "me", "description": "VPC", "verified": True}
+    assert not hasattr(entry, "__dict__")
+    assert json.loads(entry.records["aws"].render("http://localhost/"))["version"] \
+        == "1.1.0"
+    catalog.set_versions("ns", "vpc", "aws", added=["2.0.0"])
+    entry = catalog.snapshot().get("ns", "vpc")
+    assert json.loads(entry.records["aws"].render("http://localhost/"))["version"] \
+        == "2.0.0"
+
+
+def test_stream_listing_chunks():
+    records = [ModuleRecord("ns", "m{}".format(index), "aws", "1.0.0", "", "", True,
+                            "dl/modules/ns/m{}/aws/1.0.0".format(index))
+               for index in range(5)]
+    meta = {"limit": 0, "current_offset": 0}
+    chunks = list(stream_listing("http://localhost/", meta, iter(records), chunk=2))
+    assert len(chunks) == 5
+    assert b"".join(chunks) == render_listing("http://localhost/", meta, records)
+    assert b"".join(stream_listing("http://localhost/", {}, [])) \
+        == render_listing("http://localhost/", {}, [])
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import pytest
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+from terraform_registry_api.terraform_module_registry_api.backends \
+    import S3  # noqa: E402
+from terraform_registry_api.terraform_module_registry_api.exceptions \
+    import ModuleNotFoundException, FileNotFoundException  # noqa: E402
+
+
+def put_version(client, namespace, name, provider, version, prefix="modules/"):
+    key = "{p}{ns}/{n}/{pr}/{v}/{ns}_{n}-{pr}-{v}.tar.gz".format(
+        p=prefix, ns=namespace, n=name, pr=provider, v=version)
+    client.put_object(Bucket="registry", Key=key, Body=b"tarball")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="registry")
+        client.put_object(Bucket="registry",
+                          Key="modules/namespace1/sample1/module_metadata.yaml",
+                          Body=b"owner: A. Person\ndescription: A Module\n")
+        for provider, version in (("aws", "1.0.0"), ("aws", "1.1.0"),
+                                  ("aws", "2.0.0"), ("gcp", "1.0.0")):
+            put_version(client, "namespace1", "sample1", provider, version)
+        put_version(client, "namespace1", "sample2", "aws", "1.0.0")
+        client.put_object(Bucket="registry", Key="modules/namespace1/sample2/README",
+                          Body=b"ignored")
+        client.put_object(Bucket="registry", Key="other/namespace2/x/aws/1.0.0/a.tar.gz",
+                          Body=b"outside the prefix")
+        yield client
+
+
+@pytest.fixture
+def backend(client):
+    backend = S3("registry", prefix="modules", refresh_interval=0, client=client)
+    yield backend
+    backend.close()
+
+
+def test_listing(backend):
+    modules = json.loads(backend.get_modules("http://localhost/"))["modules"]
+    assert [module["id"] for module in modules] == [
+        "/namespace1/sample1/aws/2.0.0",
+        "/namespace1/sample1/gcp/1.0.0",
+        "/namespace1/sample2/aws/1.0.0",
+    ]
+    assert modules[0]["owner"] == "A. Person"
+    assert modules[2]["owner"] == ""
+
+
+def test_get_versions(backend):
+    versions = json.loads(backend.get_versions("namespace1", "sample1", "aws"))
+    assert versions["modules"][0]["versions"] == [
+        {"version": "1.0.0"}, {"version": "1.1.0"}, {"version": "2.0.0"}]
+    with pytest.raises(ModuleNotFoundException):
+        backend.get_versions("namespace2", "x", "aws")
+
+
+def test_download_version_presigned(backend):
+    url = backend.download_version("namespace1", "sample1", "aws", "2.0.0")
+    assert url.startswith("https://registry.s3.amazonaws.com/modules/namespace1/"
+                          "sample1/aws/2.0.0/namespace1_sample1-aws-2.0.0.tar.gz?")
+    assert "Signature" in url or "X-Amz-Signature" in url
+    with pytest.raises(ModuleNotFoundException):
+        backend.download_version("namespace1", "sample1", "aws", "3.0.0")
+
+
+def test_download_module(backend):
+    artifact = backend.download_module(
+        "namespace1/sample1/gcp/1.0.0/namespace1_sample1-gcp-1.0.0.tar.gz")
+    assert artifact.body.read() == b"tarball"
+    assert artifact.size == len(b"tarball")
+    assert artifact.etag == hashlib.md5(b"tarball").hexdigest()
+    with pytest.raises(FileNotFoundException):
+        backend.download_module("namespace1/sample2/README")
+
+
+def test_refresh_is_incremental(client, backend):
+    generation = backend.generation
+    backend.refresh()
+    assert backend.generation == generation
+
+    put_version(client, "namespace1", "sample2", "aws", "1.1.0")
+    client.delete_object(Bucket="registry",
+                         Key="modules/namespace1/sample1/gcp/1.0.0/"
+                             "namespace1_sample1-gcp-1.0.0.tar.gz")
+    backend.refresh()
+    assert backend.generation == generation + 1
+    assert json.loads(backend.get_versions("namespace1", "sample2", "aws"))[
+        "modules"][0]["versions"] == [{"version": "1.0.0"}, {"version": "1.1.0"}]
+    with pytest.raises(ModuleNotFoundException):
+        backend.get_versions("namespace1", "sample1", "gcp")
+
+
+def test_refresh_metadata_change(client, backend):
+    client.put_object(Bucket="registry",
+                      Key="modules/namespace1/sample1/module_metadata.yaml",
+                      Body=b"owner: Someone Else\n")
+    backend.refresh()
+    module = json.loads(backend.get_module("http://localhost/", "namespace1",
+                                           "sample1", "aws"))
+    assert module["owner"] == "Someone Else"
+
+
+def test_refresh_removes_modules(client, backend):
+    client.delete_object(Bucket="registry",
+                         Key="modules/namespace1/sample2/aws/1.0.0/"
+                             "namespace1_sample2-aws-1.0.0.tar.gz")
+    backend.refresh()
+    modules = json.loads(backend.get_modules("http://localhost/"))["modules"]
+    assert {module["name"] for module in modules} == {"sample1"}
+
+
+def test_refresh_retries_failed_metadata(client, backend, monkeypatch):
+    client.put_object(Bucket="registry",
+                      Key="modules/namespace1/sample1/module_metadata.yaml",
+                      Body=b"owner: Someone Else\n")
+    get_object = client.get_object
+
+    def failing(**kwargs):
+        raise ClientError({"Error": {"Code": "SlowDown"}}, "GetObject")
+
+    monkeypatch.setattr(client, "get_object", failing)
+    backend.refresh()
+    module = json.loads(backend.get_module("http://localhost/", "namespace1",
+                                           "sample1", "aws"))
+    assert module["owner"] == "A. Person"
+
+    monkeypatch.setattr(client, "get_object", get_object)
+    backend.refresh()
+    module = json.loads(backend.get_module("http://localhost/", "namespace1",
+                                           "sample1", "aws"))
+    assert module["owner"] == "Someone Else"
+
+
+def test_refresh_retries_unparsable_metadata(client, backend):
+    client.put_object(Bucket="registry",
+                      Key="modules/namespace1/sample2/module_metadata.yaml",
+                      Body=b"owner: [")
+    backend.refresh()
+    assert json.loads(backend.get_module("http://localhost/", "namespace1",
+                                         "sample2", "aws"))["owner"] == ""
+    generation = backend.generation
+    backend.refresh()
+    assert backend.generation == generation + 1
+
+
+def test_listing_recorded_after_update(client, backend, monkeypatch):
+    put_version(client, "namespace1", "sample2", "aws", "1.1.0")
+    update = backend.catalog.update
+
+    def failing(**kwargs):
+        raise RuntimeError("update failed")
+
+    monkeypatch.setattr(backend.catalog, "update", failing)
+    with pytest.raises(RuntimeError):
+        backend.refresh()
+    monkeypatch.setattr(backend.catalog, "update", update)
+    backend.refresh()
+    assert json.loads(backend.get_versions("namespace1", "sample2", "aws"))[
+        "modules"][0]["versions"] == [{"version": "1.0.0"}, {"version": "1.1.0"}]
+
+
+def test_after_fork(backend):
+    backend.after_fork()
+    assert backend.refresher is None
+    assert json.loads(backend.get_versions("namespace1", "sample2", "aws"))
@@ -0,0 +1,54 @@
+from terraform_registry_api.terraform_module_registry_api.backends.search \
+    import SearchIndex
+
+
+def build_index():
+    index = SearchIndex()
+    index.set_module("hashicorp", "consul", {"owner": "HashiCorp",
+                                             "description": "Service mesh"},
+                     ["aws", "azurerm"])
+    index.set_module("terra", "vpc", {"owner": "Terra Team",
+                                      "description": "Network for consul clusters"},
+                     ["aws"])
+    index.set_module("terra", "consul-vpc", {"owner": "", "description": ""},
+                     ["gcp"])
+    return index
+
+
+def test_search_ranks_name_matches_first():
+    assert build_index().search("consul") == [
+        ("hashicorp", "consul", "aws"),
+        ("hashicorp", "consul", "azurerm"),
+        ("terra", "consul-vpc", "gcp"),
+        ("terra", "vpc", "aws"),
+    ]
+
+
+def test_search_path_substring():
+    assert build_index().search("/terra/vpc") == [("terra", "vpc", "aws")]
+    assert build_index().search("consul/az") == [("hashicorp", "consul", "azurerm")]
+
+
+def test_search_owner_and_description_case_insensitive():
+    index = build_index()
+    assert index.search("MESH") == [("hashicorp", "consul", "aws"),
+                                    ("hashicorp", "consul", "azurerm")]
+    assert index.search("terra team") == [("terra", "vpc", "aws")]
+
+
+def test_search_short_query():
+    assert build_index().search("gc") == [("terra", "consul-vpc", "gcp")]
+
+
+def test_search_no_match():
+    assert build_index().search("kubernetes") == []
+
+
+def test_reindex_and_remove_module():
+    index = build_index()
+    index.set_module("terra", "vpc", {"description": "Subnets"}, ["aws"])
+    assert index.search("clusters") == []
+    assert index.search("subnet") == [("terra", "vpc", "aws")]
+    index.remove_module("hashicorp", "consul")
+    assert index.search("consul") == [("terra", "consul-vpc", "gcp")]
+    assert len(index) == 2
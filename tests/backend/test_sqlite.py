@@ -0,0 +1,140 @@
+import io
+import json
+import os
+import shutil
+import tarfile
+
+import pytest
+
+from terraform_registry_api.terraform_module_registry_api.backends \
+    import Filesystem, SQLite
+from terraform_registry_api.terraform_module_registry_api.backends.ingest \
+    import Upload
+from terraform_registry_api.terraform_module_registry_api.exceptions \
+    import (ModuleNotFoundException, FileNotFoundException, InvalidModuleException,
+            ModuleExistsException)
+
+
+def make_tree(base, tarballs):
+    for (namespace, name, provider, version), content in tarballs.items():
+        directory = base / namespace / name / provider / version
+        directory.mkdir(parents=True)
+        (directory / "{}_{}-{}-{}.tar.gz".format(namespace, name, provider,
+                                                 version)).write_bytes(content)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    tree = tmp_path / "tree"
+    make_tree(tree, {(namespace, name, provider, version): b""
+                     for namespace in ("ns1", "ns2")
+                     for name in ("vpc", "dns", "network")
+                     for provider in ("aws", "gcp")
+                     for version in ("1.0.0", "1.10.0", "1.2.0", "2.0.0-rc.1")})
+    (tree / "ns1" / "vpc" / "module_metadata.yaml").write_text(
+        "owner: Platform\ndescription: Virtual private cloud\nverified: false\n")
+    (tree / "ns2" / "dns" / "module_metadata.yaml").write_text(
+        "owner: Networking\ndescription: DNS zones and records\n")
+    (tree / "ns2" / "lb" / "azure").mkdir(parents=True)
+    return tree
+
+
+@pytest.fixture
+def backend(tree, tmp_path):
+    return SQLite(str(tree), str(tmp_path / "catalog.sqlite"))
+
+
+def test_reads_match_filesystem(tree, backend):
+    reference = Filesystem(str(tree))
+    baseurl = "http://localhost/"
+    for namespace in (None, "ns2", "ns3"):
+        for offset, limit in ((0, None), (0, 5), (5, 5), (20, 5)):
+            for provider, verified in ((None, None), ("gcp", None), (None, True)):
+                assert backend.get_modules(
+                    baseurl, namespace, offset, limit, provider, verified) == \
+                    reference.get_modules(baseurl, namespace, offset, limit,
+                                          provider, verified)
+    for query in ("", "n", "ns", "dns", "NET", "ns1/vpc", "vpc", "platform",
+                  "records", "missing", '"quoted'):
+        for offset, limit in ((0, None), (1, 3)):
+            assert backend.search_modules(baseurl, query, offset, limit) == \
+                reference.search_modules(baseurl, query, offset, limit)
+    assert backend.search_modules(baseurl, "vpc", namespace="ns2", provider="aws") == \
+        reference.search_modules(baseurl, "vpc", namespace="ns2", provider="aws")
+    assert backend.get_latest_all_providers(baseurl, "ns1", "dns", 1, 1) == \
+        reference.get_latest_all_providers(baseurl, "ns1", "dns", 1, 1)
+    for version in (None, "1.2.0", "2.0.0-rc.1"):
+        assert backend.get_module(baseurl, "ns1", "vpc", "gcp", version) == \
+            reference.get_module(baseurl, "ns1", "vpc", "gcp", version)
+    assert backend.get_versions("ns1", "vpc", "aws") == \
+        reference.get_versions("ns1", "vpc", "aws")
+    assert backend.download_latest(baseurl, "ns1", "vpc", "aws") == \
+        "http://localhost/v1/modules/ns1/vpc/aws/1.10.0/download"
+
+
+def test_missing_modules(backend):
+    with pytest.raises(ModuleNotFoundException):
+        backend.get_versions("ns2", "lb", "azure")
+    with pytest.raises(ModuleNotFoundException):
+        backend.get_module("http://localhost/", "ns1", "vpc", "aws", "3.0.0")
+    with pytest.raises(ModuleNotFoundException):
+        backend.download_latest("http://localhost/", "ns1", "vpc", "azure")
+    with pytest.raises(ModuleNotFoundException):
+        backend.download_version("ns1", "vpc", "aws", "3.0.0")
+    with pytest.raises(FileNotFoundException):
+        backend.download_module("ns1/vpc/aws/3.0.0/ns1_vpc-aws-3.0.0.tar.gz")
+
+
+def test_download(tree, backend):
+    path = backend.download_version("ns1", "vpc", "aws", "1.2.0")
+    assert path == "ns1/vpc/aws/1.2.0/ns1_vpc-aws-1.2.0.tar.gz"
+    assert backend.download_module(path) == os.path.join(str(tree), path)
+
+
+def test_sync(tree, tmp_path, backend):
+    database = str(tmp_path / "catalog.sqlite")
+    generation = backend.generation
+    assert backend.sync() == (0, 0)
+    assert backend.generation == generation
+    shutil.rmtree(str(tree / "ns1" / "dns"))
+    make_tree(tree, {("ns1", "vpc", "aws", "3.0.0"): b""})
+    (tree / "ns2" / "dns" / "module_metadata.yaml").write_text("owner: Edge\n")
+    # a second backend on the same database sees the synced rows
+    reader = SQLite(str(tree), database, sync=False)
+    assert backend.sync() == (2, 1)
+    assert reader.generation == generation + 1
+    assert reader.download_latest("http://localhost/", "ns1", "vpc", "aws") == \
+        "http://localhost/v1/modules/ns1/vpc/aws/3.0.0/download"
+    found = json.loads(reader.search_modules("http://localhost/", "edge"))["modules"]
+    assert [module["id"] for module in found] == ["/ns2/dns/aws/1.10.0",
+                                                  "/ns2/dns/gcp/1.10.0"]
+    assert json.loads(reader.get_modules("http://localhost/", "ns1"))["modules"][0][
+        "name"] == "network"
+
+
+def test_publish(tree, tmp_path, backend):
+    tarball = tmp_path / "upload.tar.gz"
+    with tarfile.open(tarball, mode="w:gz") as upload:
+        info = tarfile.TarInfo("main.tf")
+        info.size = 2
+        upload.addfile(info, io.BytesIO(b"{}"))
+    generation = backend.generation
+    digests = backend.publish([Upload("ns1", "vpc", "aws", "1.11.0", str(tarball)),
+                               Upload("ns3", "db", "gcp", "0.1.0", str(tarball))])
+    assert digests[0] == digests[1]
+    assert backend.generation == generation + 1
+    assert json.loads(backend.get_versions("ns1", "vpc", "aws"))["modules"][0][
+        "versions"][-2:] == [{"version": "1.11.0"}, {"version": "2.0.0-rc.1"}]
+    assert os.path.islink(backend.download_module("ns3/db/gcp/0.1.0/ns3_db-gcp-0.1.0.tar.gz"))
+    assert json.loads(backend.search_modules("http://localhost/", "ns3/db"))[
+        "modules"][0]["id"] == "/ns3/db/gcp/0.1.0"
+
+    with pytest.raises(ModuleExistsException):
+        backend.publish([Upload("ns1", "vpc", "aws", "1.0.0", str(tarball))])
+    broken = tmp_path / "broken.tar.gz"
+    broken.write_bytes(b"broken")
+    with pytest.raises(InvalidModuleException):
+        backend.publish([Upload("ns1", "vpc", "aws", "1.12.0", str(tarball)),
+                         Upload("ns1", "vpc", "aws", "1.13.0", str(broken))])
+    assert backend.generation == generation + 1
+    assert not os.path.exists(str(tree / "ns1" / "vpc" / "aws" / "1.12.0"))
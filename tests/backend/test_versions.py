@@ -0,0 +1,59 @@
+from terraform_registry_api.terraform_module_registry_api.backends.versions \
+    import VersionList, version_key
+
+
+def test_semver_ordering():
+    versions = ["1.10.0", "1.2.0", "1.0.0-rc.1", "1.0.0", "1.0.0-alpha",
+                "1.0.0-alpha.10", "1.0.0-alpha.2", "1.0.0-beta", "0.9"]
+    assert sorted(versions, key=version_key) == [
+        "0.9", "1.0.0-alpha", "1.0.0-alpha.2", "1.0.0-alpha.10", "1.0.0-beta",
+        "1.0.0-rc.1", "1.0.0", "1.2.0", "1.10.0"]
+
+
+def test_invalid_versions_sort_first():
+    assert sorted(["1.0.0", "latest", "0.1.0"], key=version_key) == \
+        ["latest", "0.1.0", "1.0.0"]
+
+
+def test_latest_is_highest_stable():
+    versions = VersionList(["1.0.0", "2.0.0-beta.1", "1.1.0"])
+    assert list(versions) == ["1.0.0", "1.1.0", "2.0.0-beta.1"]
+    assert versions.latest == "1.1.0"
+
+
+def test_latest_falls_back_to_prerelease():
+    assert VersionList(["1.0.0-rc.1", "1.0.0-beta"]).latest == "1.0.0-rc.1"
+    assert VersionList().latest is None
+
+
+def test_add_and_remove_maintain_latest():
+    versions = VersionList(["1.0.0"])
+    versions.add("2.0.0-rc.1")
+    assert versions.latest == "1.0.0"
+    versions.add("2.0.0")
+    assert versions.latest == "2.0.0"
+    versions.add("1.5.0")
+    assert versions.latest == "2.0.0"
+    assert list(versions) == ["1.0.0", "1.5.0", "2.0.0-rc.1", "2.0.0"]
+    versions.remove("2.0.0")
+    assert versions.latest == "1.5.0"
+    assert "2.0.0" not in versions
+    assert "2.0.0-rc.1" in versions
+
+
+def test_copy_is_independent():
+    versions = VersionList(["1.0.0"])
+    copied = versions.copy()
+    copied.add("2.0.0")
+    assert list(versions) == ["1.0.0"]
+    assert versions.latest == "1.0.0"
+
+
+def test_from_sorted_builds_keys_when_needed():
+    versions = VersionList.from_sorted(["1.0.0", "1.1.0-rc.1", "1.1.0", "2.0.0-beta"])
+    assert versions.latest == "1.1.0"
+    assert "1.1.0" in versions
+    assert "1.2.0" not in versions
+    versions.add("1.2.0")
+    assert list(versions) == ["1.0.0", "1.1.0-rc.1", "1.1.0", "1.2.0", "2.0.0-beta"]
+    assert versions.latest == "1.2.0"
@@ -0,0 +1,123 @@
+import os
+import time
+import shutil
+import pytest
+
+from os.path import join
+
+from terraform_registry_api.terraform_module_registry_api.backends \
+    import Filesystem
+from terraform_registry_api.terraform_module_registry_api.backends.watcher \
+    import InotifyWatcher, PollingWatcher, create_watcher
+
+BASE = "./tests/backend/watched"
+
+
+@pytest.fixture
+def tree():
+    os.makedirs(join(BASE, "namespace1/sample1/aws/1.0.0"), exist_ok=True)
+    os.makedirs(join(BASE, "namespace1/sample2/aws/1.0.0"), exist_ok=True)
+    yield BASE
+    shutil.rmtree(BASE)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_refresh_provider_adds_version(tree):
+    backend = Filesystem(tree)
+    os.makedirs(join(tree, "namespace1/sample1/aws/1.1.0"))
+    backend.refresh("namespace1", "sample1", "aws")
+    assert backend.catalog.snapshot().versions(
+        "namespace1", "sample1", "aws") == ["1.0.0", "1.1.0"]
+
+
+def test_refresh_namespace_only_scans_new_modules(tree):
+    backend = Filesystem(tree)
+    os.makedirs(join(tree, "namespace1/sample1/aws/1.1.0"))
+    os.makedirs(join(tree, "namespace1/sample3/gcp/1.0.0"))
+    shutil.rmtree(join(tree, "namespace1/sample2"))
+    backend.refresh("namespace1")
+    catalog = backend.catalog.snapshot()
+    assert catalog.names("namespace1") == ["sample1", "sample3"]
+    assert catalog.versions("namespace1", "sample1", "aws") == ["1.0.0"]
+
+
+def test_refresh_root_removes_namespace(tree):
+    backend = Filesystem(tree)
+    os.makedirs(join(tree, "namespace2/sample1/aws/1.0.0"))
+    backend.refresh()
+    assert backend.catalog.snapshot().namespaces() == ["namespace1", "namespace2"]
+    shutil.rmtree(join(tree, "namespace1"))
+    backend.refresh()
+    assert backend.catalog.snapshot().namespaces() == ["namespace2"]
+
+
+@pytest.mark.parametrize("watcher_class", [InotifyWatcher, PollingWatcher])
+def test_watcher_reports_subtree(tree, watcher_class):
+    changes = []
+    kwargs = {"interval": 0.05} if watcher_class is PollingWatcher else {}
+    try:
+        watcher = watcher_class(tree, changes.append, settle=0.05, **kwargs)
+    except OSError:
+        pytest.skip("inotify not available")
+    watcher.start()
+    try:
+        time.sleep(0.05)
+        os.makedirs(join(tree, "namespace1/sample1/aws/2.0.0"))
+        assert wait_for(lambda: ("namespace1", "sample1", "aws") in changes)
+        os.makedirs(join(tree, "namespace2/sample1/aws/1.0.0"))
+        assert wait_for(lambda: any(change[:1] == ("namespace2",)
+                                    for change in changes))
+    finally:
+        watcher.stop()
+
+
+def test_backend_picks_up_new_versions(tree):
+    backend = Filesystem(tree, watch="poll", poll_interval=0.05)
+    try:
+        os.makedirs(join(tree, "namespace1/sample2/aws/2.0.0"))
+        assert wait_for(lambda: backend.catalog.snapshot().latest(
+            "namespace1", "sample2", "aws") == "2.0.0")
+    finally:
+        backend.watcher.stop()
+
+
+def test_create_watcher_falls_back_to_polling(tree, monkeypatch):
+    def no_inotify(*args, **kwargs):
+        raise OSError("inotify not available")
+    monkeypatch.setattr(
+        "terraform_registry_api.terraform_module_registry_api.backends.watcher"
+        ".InotifyWatcher", no_inotify)
+    assert isinstance(create_watcher(tree, print), PollingWatcher)
+
+
+@pytest.mark.parametrize("watch", ["poll", "auto"])
+def test_forked_worker_watches_tree(tree, watch):
+    backend = Filesystem(tree, watch=watch, poll_interval=0.05)
+    ready, go = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        status = 1
+        try:
+            backend.after_fork()
+            os.write(go, b"x")
+            if wait_for(lambda: backend.catalog.snapshot().latest(
+                    "namespace1", "sample2", "aws") == "3.0.0"):
+                status = 0
+        finally:
+            os._exit(status)
+    try:
+        os.read(ready, 1)
+        os.makedirs(join(tree, "namespace1/sample2/aws/3.0.0"))
+        assert os.waitpid(pid, 0)[1] == 0
+    finally:
+        backend.watcher.stop()
+        os.close(ready)
+        os.close(go)
@@ -0,0 +1,174 @@
+import io
+import os
+import pytest
+
+from flask import Flask
+from werkzeug.http import http_date
+
+from terraform_registry_api.artifacts import send_artifact
+from terraform_registry_api.terraform_module_registry_api.backends.abstract \
+    import Artifact
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "module.tar.gz"
+    path.write_bytes(bytes(range(256)) * 16)
+    return path
+
+
+@pytest.fixture
+def client(artifact):
+    app = Flask(__name__)
+
+    @app.route("/plain")
+    def plain():
+        return send_artifact(str(artifact))
+
+    @app.route("/accel")
+    def accel():
+        return send_artifact(str(artifact), "ns/module.tar.gz", "/_artifacts/")
+
+    @app.route("/buffer")
+    def buffer():
+        return send_artifact(artifact.read_bytes(), "ns/module.tar.gz",
+                             "/_artifacts/")
+
+    @app.route("/artifact")
+    def in_memory():
+        content = artifact.read_bytes()
+        return send_artifact(Artifact(content, len(content), "stored-etag", 0),
+                             "ns/module.tar.gz", "/_artifacts/")
+
+    @app.route("/stream")
+    def stream():
+        content = artifact.read_bytes()
+        return send_artifact(Artifact(io.BytesIO(content), len(content),
+                                      "stream-etag", None))
+
+    app.testing = True
+    yield app.test_client()
+
+
+def test_full_download(client, artifact):
+    rv = client.get("/plain")
+    assert rv.status_code == 200
+    assert rv.data == artifact.read_bytes()
+    assert rv.headers["Content-Length"] == "4096"
+    assert rv.headers["Accept-Ranges"] == "bytes"
+    assert rv.headers["ETag"]
+
+
+def test_file_wrapper(client, artifact):
+    wrapped = []
+
+    def file_wrapper(fileobj, block_size):
+        wrapped.append(fileobj)
+        return iter(lambda: fileobj.read(block_size), b"")
+
+    app = client.application
+    wsgi_app = app.wsgi_app
+
+    def server(environ, start_response):
+        environ["wsgi.file_wrapper"] = file_wrapper
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = server
+    rv = client.get("/plain")
+    assert wrapped
+    assert rv.data == artifact.read_bytes()
+
+    # ranges are not sent through the wrapper, which sends the file to its end
+    wrapped.clear()
+    rv = client.get("/plain", headers={"Range": "bytes=10-19"})
+    assert not wrapped
+    assert rv.status_code == 206
+    assert rv.data == artifact.read_bytes()[10:20]
+
+
+def test_range(client, artifact):
+    rv = client.get("/plain", headers={"Range": "bytes=100-199"})
+    assert rv.status_code == 206
+    assert rv.data == artifact.read_bytes()[100:200]
+    assert rv.headers["Content-Range"] == "bytes 100-199/4096"
+    rv = client.get("/plain", headers={"Range": "bytes=-10"})
+    assert rv.data == artifact.read_bytes()[-10:]
+
+
+def test_range_not_satisfiable(client):
+    rv = client.get("/plain", headers={"Range": "bytes=5000-"})
+    assert rv.status_code == 416
+    assert rv.headers["Content-Range"] == "bytes */4096"
+
+
+def test_if_range(client, artifact):
+    etag = client.get("/plain").headers["ETag"]
+    rv = client.get("/plain", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert rv.status_code == 206
+    rv = client.get("/plain", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert rv.status_code == 200
+    assert rv.data == artifact.read_bytes()
+
+
+def test_conditional(client, artifact):
+    etag = client.get("/plain").headers["ETag"]
+    rv = client.get("/plain", headers={"If-None-Match": etag})
+    assert rv.status_code == 304
+    assert rv.data == b""
+    modified = http_date(os.stat(artifact).st_mtime)
+    rv = client.get("/plain", headers={"If-Modified-Since": modified})
+    assert rv.status_code == 304
+    rv = client.get("/plain", headers={"If-Modified-Since": http_date(0)})
+    assert rv.status_code == 200
+
+
+def test_accel_redirect(client):
+    rv = client.get("/accel")
+    assert rv.status_code == 200
+    assert rv.headers["X-Accel-Redirect"] == "/_artifacts/ns/module.tar.gz"
+    assert rv.data == b""
+
+
+def test_buffer(client, artifact):
+    rv = client.get("/buffer")
+    assert rv.status_code == 200
+    assert rv.data == artifact.read_bytes()
+    assert "X-Accel-Redirect" not in rv.headers
+    rv = client.get("/buffer", headers={"Range": "bytes=0-9",
+                                        "If-Range": rv.headers["ETag"]})
+    assert rv.status_code == 206
+    assert rv.data == artifact.read_bytes()[:10]
+
+
+def test_artifact_etag_from_backend(client, artifact):
+    rv = client.get("/artifact")
+    assert rv.data == artifact.read_bytes()
+    assert rv.headers["ETag"] == '"stored-etag"'
+    assert "X-Accel-Redirect" not in rv.headers
+    rv = client.get("/artifact", headers={"If-None-Match": '"stored-etag"'})
+    assert rv.status_code == 304
+
+
+def test_stream(client, artifact):
+    rv = client.get("/stream", headers={"Range": "bytes=0-9"})
+    assert rv.status_code == 200
+    assert rv.data == artifact.read_bytes()
+    assert rv.headers["Accept-Ranges"] == "none"
+    assert rv.headers["ETag"] == '"stream-etag"'
+    assert rv.headers["Content-Length"] == str(len(artifact.read_bytes()))
+    rv = client.get("/stream", headers={"If-None-Match": '"stream-etag"'})
+    assert rv.status_code == 304
+
+
+def test_blob_etag(tmp_path, artifact):
+    from terraform_registry_api.terraform_module_registry_api.backends.blobstore \
+        import BlobStore
+    blobs = BlobStore(str(tmp_path / ".blobs"))
+    digest = blobs.put_file(str(artifact))
+    linked = tmp_path / "linked.tar.gz"
+    blobs.link(digest, str(linked))
+    app = Flask(__name__)
+    app.add_url_rule("/blob", "blob", lambda: send_artifact(str(linked)))
+    rv = app.test_client().get("/blob")
+    assert rv.headers["ETag"] == '"{}"'.format(digest)
+    assert rv.data == artifact.read_bytes()
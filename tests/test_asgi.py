@@ -0,0 +1,96 @@
+import asyncio
+import json
+import pytest
+
+from terraform_registry_api import registry
+from terraform_registry_api.asgi import Registry
+from terraform_registry_api.terraform_module_registry_api import api
+from terraform_registry_api.terraform_module_registry_api.backends import Filesystem
+
+CONTENT = bytes(range(256)) * 8192
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    directory = tmp_path / "ns" / "vpc" / "aws" / "1.0.0"
+    directory.mkdir(parents=True)
+    (directory / "ns_vpc-aws-1.0.0.tar.gz").write_bytes(CONTENT)
+    app = Registry(registry.create_app())
+    monkeypatch.setattr(api, "backend", Filesystem(str(tmp_path)))
+    yield app
+    app.executor.shutdown()
+
+
+def request(app, path, method="GET", headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": [(name.encode(), value.encode()) for name, value in headers],
+             "server": ("localhost", 80), "scheme": "http", "http_version": "1.1"}
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    assert not messages[-1]["more_body"]
+    return (start["status"], {name.decode(): value.decode()
+                              for name, value in start["headers"]},
+            b"".join(message.get("body", b"") for message in messages[1:]))
+
+
+def test_wsgi_routes(app):
+    status, headers, body = request(app, "/.well-known/terraform.json")
+    assert status == 200
+    assert json.loads(body)["modules.v1"] == "http://localhost/v1/modules"
+    status, headers, body = request(app, "/v1/modules/ns/vpc/aws/versions")
+    assert json.loads(body)["modules"][0]["versions"] == [{"version": "1.0.0"}]
+
+
+def test_listing_streamed(app, monkeypatch):
+    _, _, expected = request(app, "/v1/modules/")
+    monkeypatch.setattr(api, "stream_listings", True)
+    status, headers, body = request(app, "/v1/modules/")
+    assert status == 200
+    assert "content-length" not in headers
+    assert body == expected
+    assert json.loads(body)["modules"][0]["id"] == "/ns/vpc/aws/1.0.0"
+
+
+def test_download_streamed(app):
+    path = "/dl/module/ns/vpc/aws/1.0.0/ns_vpc-aws-1.0.0.tar.gz"
+    status, headers, body = request(app, path)
+    assert status == 200
+    assert body == CONTENT
+    assert headers["content-length"] == str(len(CONTENT))
+    status, headers, body = request(app, path, headers=[("Range", "bytes=10-19")])
+    assert status == 206
+    assert body == CONTENT[10:20]
+    status, headers, body = request(app, path, "HEAD")
+    assert status == 200
+    assert body == b""
+    status, _, _ = request(app, path, headers=[("If-None-Match", headers["etag"])])
+    assert status == 304
+
+
+def test_download_not_found(app):
+    status, headers, body = request(app, "/dl/module/ns/vpc/aws/2.0.0/x.tar.gz")
+    assert status == 404
+    assert headers["content-type"] == "application/problem+json"
+    assert json.loads(body)["title"] == "File Not Found"
+
+
+def test_lifespan(app):
+    events = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return events.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(app({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
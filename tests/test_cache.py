@@ -0,0 +1,97 @@
+import os
+import time
+import pytest
+
+from os.path import join
+
+from terraform_registry_api import registry
+from terraform_registry_api.terraform_module_registry_api import api
+from terraform_registry_api.terraform_module_registry_api.cache \
+    import ResponseCache
+
+
+@pytest.fixture
+def client():
+    app = registry.create_app()
+    app.testing = True
+    yield app.test_client()
+
+
+def test_cache_hit_and_generation_change():
+    cache = ResponseCache(size=10)
+    assert cache.get("key", 1) is None
+    entry = cache.put("key", 1, b"body")
+    assert cache.get("key", 1) is entry
+    assert cache.get("key", 2) is None
+    assert cache.get("key", 2) is None
+
+
+def test_cache_ttl():
+    cache = ResponseCache(size=10, ttl=0.01)
+    cache.get("key", 0)
+    cache.put("key", 0, b"body")
+    time.sleep(0.02)
+    assert cache.get("key", 0) is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(size=2)
+    cache.get("a", 0)
+    cache.put("a", 0, b"a")
+    cache.put("b", 0, b"b")
+    cache.get("a", 0)
+    cache.put("c", 0, b"c")
+    assert cache.get("b", 0) is None
+    assert cache.get("a", 0).body == b"a"
+
+
+def test_cache_ignores_stale_generation():
+    cache = ResponseCache(size=2)
+    cache.get("a", 1)
+    cache.put("a", 0, b"a")
+    assert cache.get("a", 1) is None
+
+
+def test_etag_and_not_modified(client):
+    rv = client.get('/v1/modules/terra/test/aws/versions')
+    assert rv.status_code == 200
+    etag = rv.headers['ETag']
+    again = client.get('/v1/modules/terra/test/aws/versions')
+    assert again.headers['ETag'] == etag
+    assert again.data == rv.data
+    rv = client.get('/v1/modules/terra/test/aws/versions',
+                    headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert rv.data == b''
+
+
+def test_errors_not_cached(client):
+    rv = client.get('/v1/modules/terra/test/aws2/versions')
+    assert rv.status_code == 404
+    assert 'ETag' not in rv.headers
+
+
+def test_cache_disabled(monkeypatch):
+    monkeypatch.setenv("cache_size", "0")
+    app = registry.create_app()
+    rv = app.test_client().get('/v1/modules/terra/test/aws/versions')
+    assert rv.status_code == 200
+    assert 'ETag' not in rv.headers
+
+
+def test_cache_invalidated_by_catalog_change(monkeypatch, tmp_path):
+    os.makedirs(join(str(tmp_path), "namespace1/sample1/aws/1.0.0"))
+    monkeypatch.setenv("fs_path", str(tmp_path))
+    monkeypatch.setenv("fs_watch", "off")
+    monkeypatch.setattr(api, "backend", api.backend)
+    app = registry.create_app()
+    client = app.test_client()
+    rv = client.get('/v1/modules/namespace1/sample1/aws/versions')
+    etag = rv.headers['ETag']
+    os.makedirs(join(str(tmp_path), "namespace1/sample1/aws/1.1.0"))
+    api.backend.refresh("namespace1", "sample1", "aws")
+    rv = client.get('/v1/modules/namespace1/sample1/aws/versions',
+                    headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+    assert b"1.1.0" in rv.data
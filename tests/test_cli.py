@@ -0,0 +1,72 @@
+import shutil
+
+from terraform_registry_api.cli import main
+
+
+def test_dedupe_and_gc(tmp_path, capsys):
+    for version in ("1.0.0", "1.1.0"):
+        directory = tmp_path / "ns" / "vpc" / "aws" / version
+        directory.mkdir(parents=True)
+        (directory / "ns_vpc-aws-{}.tar.gz".format(version)).write_bytes(b"tarball")
+    assert main(["dedupe", str(tmp_path)]) == 0
+    assert capsys.readouterr().out == \
+        "Moved 2 tarballs into the blob store, freed 7 bytes\n"
+    assert main(["gc", str(tmp_path)]) == 0
+    assert capsys.readouterr().out == "Removed 0 unused blobs\n"
+    shutil.rmtree(str(tmp_path / "ns"))
+    assert main(["gc", str(tmp_path)]) == 0
+    assert capsys.readouterr().out == "Removed 0 unused blobs\n"
+    assert main(["gc", str(tmp_path), "--grace", "0"]) == 0
+    assert capsys.readouterr().out == "Removed 1 unused blobs\n"
+
+
+def test_publish(tmp_path, capsys):
+    import io
+    import tarfile
+    source = tmp_path / "source" / "ns" / "vpc" / "aws" / "1.0.0"
+    source.mkdir(parents=True)
+    with tarfile.open(source / "ns_vpc-aws-1.0.0.tar.gz", mode="w:gz") as tarball:
+        info = tarfile.TarInfo("main.tf")
+        info.size = 2
+        tarball.addfile(info, io.BytesIO(b"{}"))
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    assert main(["publish", str(tree), str(tmp_path / "source"), "--workers", "2"]) == 0
+    assert capsys.readouterr().out == "Published 1 versions\n"
+    assert (tree / "ns" / "vpc" / "aws" / "1.0.0" / "ns_vpc-aws-1.0.0.tar.gz").is_symlink()
+    assert main(["publish", str(tree), str(tmp_path / "source")]) == 1
+    assert capsys.readouterr().err == "Version ns/vpc/aws/1.0.0 already exists\n"
+
+
+def test_profile_header(monkeypatch, capsys):
+    from terraform_registry_api.profiling import verify_header
+    monkeypatch.delenv("profile_secret", raising=False)
+    assert main(["profile-header"]) == 1
+    monkeypatch.setenv("profile_secret", "s3cret")
+    assert main(["profile-header", "--ttl", "60"]) == 0
+    name, _, value = capsys.readouterr().out.strip().partition(": ")
+    assert name == "X-Terra-Store-Profile"
+    assert verify_header("s3cret", value)
+
+
+def test_index(tmp_path, capsys):
+    directory = tmp_path / "tree" / "ns" / "vpc" / "aws" / "1.0.0"
+    directory.mkdir(parents=True)
+    (directory / "ns_vpc-aws-1.0.0.tar.gz").write_bytes(b"tarball")
+    database = str(tmp_path / "catalog.sqlite")
+    assert main(["index", str(tmp_path / "tree"), database]) == 0
+    assert capsys.readouterr().out == "Wrote 1 modules, removed 0 modules\n"
+    assert main(["index", str(tmp_path / "tree"), database]) == 0
+    assert capsys.readouterr().out == "Wrote 0 modules, removed 0 modules\n"
+
+
+def test_compile_specs(tmp_path, capsys):
+    import shutil
+    from terraform_registry_api.specs import SPECS, spec_path
+    source = tmp_path / "swagger.yml"
+    shutil.copy(spec_path(SPECS[1]), str(source))
+    assert main(["compile-specs", str(source)]) == 0
+    assert capsys.readouterr().out == "Compiled {}\n".format(tmp_path / "swagger.json")
+    source.write_text('swagger: "2.0"\npaths: {}\n')
+    assert main(["compile-specs", str(source)]) == 1
+    assert capsys.readouterr().err.startswith("{} is invalid".format(source))
@@ -0,0 +1,32 @@
+import gc
+import os
+
+from terraform_registry_api import gunicorn_config, metrics
+from terraform_registry_api.terraform_module_registry_api import api
+
+
+def test_hooks(monkeypatch):
+    forked = []
+    monkeypatch.setattr(api.backend, "before_fork", lambda: forked.append("before"),
+                        raising=False)
+    monkeypatch.setattr(api.backend, "after_fork", lambda: forked.append("after"),
+                        raising=False)
+    assert gunicorn_config.preload_app
+    gunicorn_config.pre_fork(None, None)
+    assert gc.get_freeze_count() > 0
+    gc.unfreeze()
+    assert forked == ["before"]
+    gunicorn_config.post_fork(None, None)
+    assert forked == ["before", "after"]
+
+
+def test_metrics_directory(monkeypatch):
+    collected = metrics.Registry()
+    monkeypatch.setattr(gunicorn_config, "metric_registry", collected)
+    monkeypatch.delenv("metrics_dir", raising=False)
+    gunicorn_config.on_starting(None)
+    assert os.path.isdir(collected.directory)
+    gunicorn_config.worker_exit(None, None)
+    assert len(os.listdir(collected.directory)) == 1
+    gunicorn_config.on_exit(None)
+    assert not os.path.exists(collected.directory)
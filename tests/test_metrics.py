@@ -0,0 +1,132 @@
+import os
+import pytest
+
+from terraform_registry_api import metrics, registry
+from terraform_registry_api.terraform_module_registry_api import api
+from terraform_registry_api.terraform_module_registry_api.backends import Dummy
+
+
+def sample(name, **labels):
+    rendered = metrics.metric_registry.render().decode()
+    prefix = name + ("{" + ",".join('{}="{}"'.format(key, value)
+                                    for key, value in labels.items()) + "}"
+                     if labels else "")
+    for line in rendered.splitlines():
+        if line.startswith(prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+@pytest.fixture
+def client():
+    app = registry.create_app()
+    app.testing = True
+    yield app.test_client()
+
+
+def test_render_histogram():
+    collected = metrics.Registry()
+    histogram = collected.histogram("test_seconds", "Test.", ("route",),
+                                    buckets=(0.1, 1.0))
+    histogram.labels('a"b').observe(0.05)
+    histogram.labels('a"b').observe(0.5)
+    histogram.labels('a"b').observe(5)
+    assert collected.render().decode().splitlines() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="a\\"b",le="0.1"} 1',
+        'test_seconds_bucket{route="a\\"b",le="1.0"} 2',
+        'test_seconds_bucket{route="a\\"b",le="+Inf"} 3',
+        'test_seconds_sum{route="a\\"b"} 5.55',
+        'test_seconds_count{route="a\\"b"} 3',
+    ]
+    with pytest.raises(ValueError):
+        histogram.labels()
+
+
+def test_timed_backend():
+    backend = metrics.TimedBackend(Dummy(), "test")
+    before = sample("terra_store_backend_call_duration_seconds_count",
+                    api="test", method="get_versions")
+    backend.get_versions("terra", "test", "aws")
+    backend.get_versions("terra", "test", "aws")
+    assert sample("terra_store_backend_call_duration_seconds_count",
+                  api="test", method="get_versions") == before + 2
+    assert backend.generation == 0
+
+
+def test_requests_recorded(client, monkeypatch):
+    operation = "terraform_registry_api.terraform_module_registry_api.api.list_versions"
+    before = sample("terra_store_requests_total", operation=operation, status="200")
+    rv = client.get("/v1/modules/terra/test/aws/versions")
+    assert rv.status_code == 200
+    assert sample("terra_store_requests_total", operation=operation,
+                  status="200") == before + 1
+    monkeypatch.setattr(api, "stream_listings", True)
+    operation = "terraform_registry_api.terraform_module_registry_api.api.list_all_modules"
+    before = sample("terra_store_response_bytes_total", operation=operation)
+    rv = client.get("/v1/modules/")
+    assert rv.is_streamed
+    size = len(rv.data)
+    rv.close()
+    assert sample("terra_store_response_bytes_total", operation=operation) \
+        == before + size
+
+
+def test_metrics_endpoint(client):
+    client.get("/.well-known/terraform.json")
+    rv = client.get("/metrics")
+    assert rv.status_code == 200
+    assert rv.content_type == metrics.CONTENT_TYPE
+    assert b'terra_store_requests_total{operation="service_discovery",status="200"}' \
+        in rv.data
+
+
+def test_render_gauge():
+    collected = metrics.Registry()
+    gauge = collected.gauge("test_seconds", "Test.", ("phase",))
+    gauge.labels("total").set(0.25)
+    assert collected.render().decode().splitlines() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds gauge",
+        'test_seconds{phase="total"} 0.25',
+    ]
+
+
+def test_startup_recorded(monkeypatch, caplog):
+    monkeypatch.setenv("startup_budget", "0")
+    registry.create_app()
+    assert sample("terra_store_startup_seconds", phase="total") == pytest.approx(
+        sum(sample("terra_store_startup_seconds", phase=phase)
+            for phase in ("imports", "backends", "apis")))
+    assert "over the budget of 0s" in caplog.text
+
+
+def test_shared_directory(tmp_path):
+    collected = metrics.Registry()
+    counter = collected.counter("test_total", "Test.").labels()
+    histogram = collected.histogram("test_seconds", "Test.", buckets=(1.0,)).labels()
+    gauge = collected.gauge("test_gauge", "Test.").labels()
+    (tmp_path / "stale.json").write_text("{}")
+    collected.set_directory(str(tmp_path), interval=60)
+    assert not (tmp_path / "stale.json").exists()
+    counter.inc(2)
+    gauge.set(5)
+    collected.flush()
+    pid = os.fork()
+    if pid == 0:
+        collected.after_fork()
+        counter.inc(3)
+        histogram.observe(0.5)
+        gauge.set(1)
+        collected.flush()
+        os._exit(0)
+    assert os.waitpid(pid, 0)[1] == 0
+    counter.inc(1)
+    histogram.observe(2)
+    lines = collected.render().decode().splitlines()
+    assert "test_total 6" in lines
+    assert 'test_seconds_bucket{le="1.0"} 1' in lines
+    assert "test_seconds_count 2" in lines
+    assert "test_gauge 5" in lines
+    assert len(list(tmp_path.glob("*.json"))) == 2
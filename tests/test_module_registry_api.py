@@ -2,6 +2,10 @@ import json
 import pytest
 
 from terraform_registry_api import registry
+from terraform_registry_api.terraform_module_registry_api import api
+from terraform_registry_api.terraform_module_registry_api.backends import Dummy
+from terraform_registry_api.terraform_module_registry_api.exceptions import (
+    ModuleNotFoundException, UpstreamUnavailableException)
 
 
 @pytest.fixture
@@ -117,7 +121,7 @@ def test_get_all_modules(client):
 def test_get_all_modules_limit2(client):
     details = {
         'meta': {
-            'limit': 0,
+            'limit': 2,
             'current_offset': 0,
         },
         'modules': [
@@ -154,6 +158,40 @@ def test_get_all_modules_limit2(client):
     assert json.loads(rv.data) == details
 
 
+def test_get_all_modules_paginated(client):
+    rv = client.get("/v1/modules/?limit=1")
+    assert rv.status_code == 200
+    first = json.loads(rv.data)
+    assert first['meta'] == {
+        'limit': 1,
+        'current_offset': 0,
+        'next_offset': 1,
+        'next_url': 'http://localhost/v1/modules?limit=1&offset=1'
+    }
+    assert [module['id'] for module in first['modules']] == ['/terra/test/aws/2.0.0']
+    rv = client.get("/v1/modules/?limit=1&offset=1")
+    second = json.loads(rv.data)
+    assert second['meta'] == {'limit': 1, 'current_offset': 1}
+    assert [module['id'] for module in second['modules']] == ['/terra/k8s/aws/2.0.0']
+
+
+def test_get_all_modules_provider_filter(client):
+    rv = client.get("/v1/modules/?provider=gcp")
+    assert rv.status_code == 200
+    assert json.loads(rv.data)['modules'] == []
+
+
+def test_search_module_paginated(client):
+    rv = client.get("/v1/modules/search?q=terra&limit=1&verified=true")
+    assert rv.status_code == 200
+    assert json.loads(rv.data)['meta'] == {
+        'limit': 1,
+        'current_offset': 0,
+        'next_offset': 1,
+        'next_url': 'http://localhost/v1/modules/search?q=terra&verified=true&limit=1&offset=1'
+    }
+
+
 def test_get_all_terra_modules(client):
     details = {
         'meta': {
@@ -417,3 +455,51 @@ def test_get_module_details_found(client):
     }
     assert rv.status_code == 200
     assert json.loads(rv.data) == expected
+
+
+def test_get_all_modules_streamed(client, monkeypatch):
+    expected = client.get("/v1/modules/?limit=1").data
+    monkeypatch.setattr(api, "stream_listings", True)
+    rv = client.get("/v1/modules/?limit=1")
+    assert rv.status_code == 200
+    assert rv.is_streamed
+    assert rv.data == expected
+
+
+class FailingBackend(Dummy):
+    """Backend raising the given exception from every lookup."""
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    def fail(self, *args, **kwargs):
+        raise self.error
+
+    get_modules = search_modules = get_latest_all_providers = fail
+    get_versions = get_module = download_version = download_latest = fail
+
+
+@pytest.mark.parametrize("url", [
+    "/v1/modules/", "/v1/modules/terra", "/v1/modules/search?q=test",
+    "/v1/modules/terra/test", "/v1/modules/terra/test/aws",
+    "/v1/modules/terra/test/aws/versions", "/v1/modules/terra/test/aws/2.0.0",
+    "/v1/modules/terra/test/aws/2.0.0/download",
+    "/v1/modules/terra/test/aws/download"])
+def test_backend_errors(client, monkeypatch, url):
+    monkeypatch.setattr(api, "backend", FailingBackend(
+        UpstreamUnavailableException("Upstream registry unavailable")))
+    rv = client.get(url)
+    assert rv.status_code == 502
+    assert rv.data == b"Upstream registry unavailable"
+
+    monkeypatch.setattr(api, "backend", FailingBackend(
+        ModuleNotFoundException("Module Not Found")))
+    assert client.get(url).status_code == 404
+
+
+def test_backend_errors_streamed(client, monkeypatch):
+    monkeypatch.setattr(api, "stream_listings", True)
+    monkeypatch.setattr(api, "backend", FailingBackend(
+        UpstreamUnavailableException("Upstream registry unavailable")))
+    assert client.get("/v1/modules/").status_code == 502
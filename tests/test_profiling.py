@@ -0,0 +1,54 @@
+import pstats
+import time
+
+import pytest
+
+from terraform_registry_api import registry
+from terraform_registry_api.profiling import sign, verify_header
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("profile_dir", str(tmp_path))
+    monkeypatch.setenv("profile_secret", "s3cret")
+    app = registry.create_app()
+    app.testing = True
+    yield app
+
+
+def test_verify_header():
+    header = sign("s3cret", 2000)
+    assert verify_header("s3cret", header, now=1000)
+    assert not verify_header("other", header, now=1000)
+    assert not verify_header("s3cret", header, now=2001)
+    assert not verify_header("s3cret", sign("s3cret", 10000), now=1000)
+    assert not verify_header(None, header, now=1000)
+    assert not verify_header("s3cret", "2000:", now=1000)
+    assert not verify_header("s3cret", "soon:abc", now=1000)
+
+
+def test_signed_request_profiled(app, tmp_path):
+    client = app.test_client()
+    rv = client.get("/v1/modules/terra/test/aws/versions")
+    assert "Server-Timing" not in rv.headers
+    assert list(tmp_path.iterdir()) == []
+    rv = client.get("/v1/modules/terra/test/aws/versions", headers={
+        "X-Terra-Store-Profile": sign("s3cret", int(time.time()) + 60)})
+    assert rv.status_code == 200
+    timing = rv.headers["Server-Timing"]
+    assert timing.startswith("app;dur=")
+    profiles = list(tmp_path.iterdir())
+    assert len(profiles) == 1
+    assert "-list_versions-" in profiles[0].name
+    assert '"{}"'.format(profiles[0].name) in timing
+    stats = pstats.Stats(str(profiles[0]))
+    assert any(function[2] == "full_dispatch_request" for function in stats.stats)
+
+
+def test_profile_all(tmp_path, monkeypatch):
+    monkeypatch.setenv("profile_dir", str(tmp_path))
+    monkeypatch.setenv("profile_all", "true")
+    client = registry.create_app().test_client()
+    rv = client.get("/.well-known/terraform.json")
+    assert "Server-Timing" in rv.headers
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,54 @@
+import hashlib
+import json
+import pytest
+
+from terraform_registry_api import registry
+
+
+@pytest.fixture
+def client():
+    app = registry.create_app()
+    app.testing = True
+    yield app.test_client()
+
+
+def test_list_versions(client):
+    rv = client.get('/v1/providers/terra/dummy/versions')
+    assert rv.status_code == 200
+    assert rv.content_type == "application/json"
+    versions = json.loads(rv.data)["versions"]
+    assert [version["version"] for version in versions] == ["1.0.0", "2.0.0"]
+    assert versions[0]["protocols"] == ["5.0"]
+    assert versions[0]["platforms"] == [{"os": "darwin", "arch": "arm64"},
+                                        {"os": "linux", "arch": "amd64"}]
+
+
+def test_list_versions_notfound(client):
+    rv = client.get('/v1/providers/terra/nothing/versions')
+    assert rv.status_code == 404
+    assert json.loads(rv.data) == {"errors": ["Provider Not Found: terra/nothing"]}
+
+
+def test_get_download(client):
+    rv = client.get('/v1/providers/terra/dummy/2.0.0/download/windows/amd64')
+    assert rv.status_code == 200
+    package = json.loads(rv.data)
+    assert package["os"] == "windows"
+    assert package["arch"] == "amd64"
+    assert package["filename"] == "terraform-provider-dummy_2.0.0_windows_amd64.zip"
+    assert package["download_url"] == "http://localhost/dl/provider/terra/dummy/" \
+        "2.0.0/terraform-provider-dummy_2.0.0_windows_amd64.zip"
+    assert package["shasums_signature_url"] is None
+    assert package["signing_keys"] == {"gpg_public_keys": []}
+
+    archive = client.get(package["download_url"]).data
+    assert hashlib.sha256(archive).hexdigest() == package["shasum"]
+    shasums = client.get(package["shasums_url"]).data.decode()
+    assert "{}  {}\n".format(package["shasum"], package["filename"]) in shasums
+
+
+def test_get_download_notfound(client):
+    rv = client.get('/v1/providers/terra/dummy/1.0.0/download/windows/amd64')
+    assert rv.status_code == 404
+    assert json.loads(rv.data) == {
+        "errors": ["Provider Package Not Found: terra/dummy/1.0.0/windows_amd64"]}
@@ -0,0 +1,69 @@
+import io
+import json
+import tarfile
+import pytest
+
+from terraform_registry_api import registry
+from terraform_registry_api.terraform_module_registry_api import api
+from terraform_registry_api.terraform_module_registry_api.backends import Filesystem
+
+
+def make_archive(*versions):
+    module = io.BytesIO()
+    with tarfile.open(fileobj=module, mode="w:gz") as tarball:
+        info = tarfile.TarInfo("main.tf")
+        info.size = 2
+        tarball.addfile(info, io.BytesIO(b"{}"))
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for namespace, name, provider, version in versions:
+            info = tarfile.TarInfo("{ns}/{n}/{p}/{v}/{ns}_{n}-{p}-{v}.tar.gz".format(
+                ns=namespace, n=name, p=provider, v=version))
+            info.size = len(module.getvalue())
+            tar.addfile(info, io.BytesIO(module.getvalue()))
+    return archive.getvalue()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    app = registry.create_app()
+    app.testing = True
+    monkeypatch.setattr(api, "backend", Filesystem(str(tmp_path)))
+    monkeypatch.setattr(api, "publish_token", "secret")
+    yield app.test_client()
+
+
+def publish(client, data, token="secret"):
+    return client.post("/v1/modules/", data=data, content_type="application/x-tar",
+                       headers={"Authorization": "Bearer {}".format(token)})
+
+
+def test_publish(client):
+    rv = publish(client, make_archive(("ns", "vpc", "aws", "1.0.0"),
+                                      ("ns", "vpc", "aws", "1.1.0")))
+    assert rv.status_code == 201
+    assert json.loads(rv.data) == {"modules": ["ns/vpc/aws/1.0.0", "ns/vpc/aws/1.1.0"]}
+    rv = client.get("/v1/modules/ns/vpc/aws/versions")
+    assert json.loads(rv.data)["modules"][0]["versions"] == [
+        {"version": "1.0.0"}, {"version": "1.1.0"}]
+    rv = publish(client, make_archive(("ns", "vpc", "aws", "1.0.0")))
+    assert rv.status_code == 409
+
+
+def test_publish_invalid(client):
+    assert publish(client, b"not an archive").status_code == 400
+    assert publish(client, make_archive(("ns", "vpc", "aws", "latest"))).status_code == 400
+
+
+def test_publish_unauthorized(client, monkeypatch):
+    archive = make_archive(("ns", "vpc", "aws", "1.0.0"))
+    assert publish(client, archive, token="wrong").status_code == 401
+    assert client.post("/v1/modules/", data=archive,
+                       content_type="application/x-tar").status_code == 401
+    monkeypatch.setattr(api, "publish_token", None)
+    assert publish(client, archive).status_code == 401
+
+
+def test_publish_read_only(client, monkeypatch):
+    monkeypatch.setattr(api, "backend", api.Dummy())
+    assert publish(client, make_archive(("ns", "vpc", "aws", "1.0.0"))).status_code == 501
@@ -1,7 +1,9 @@
+import io
 import json
 import pytest
+import tarfile
 
-from os import remove, environ
+from os import environ
 
 from terraform_registry_api import registry
 
@@ -28,8 +30,26 @@ def test_download_module_found(client):
     rv = client.get('/dl/module/terra/test/aws/2.0.0/test-2.0.0.tar.gz')
     assert rv.status_code == 200
     assert rv.content_type == "application/x-tar"
-    remove("/tmp/test-2.0.0.tar.gz")
-    remove("/tmp/notsupported.txt")
+    with tarfile.open(fileobj=io.BytesIO(rv.data)) as tar:
+        assert tar.getnames() == ["notsupported.txt"]
+    again = client.get('/dl/module/terra/k8s/aws/1.0.0/k8s-1.0.0.tar.gz')
+    assert again.data == rv.data
+    assert again.headers["ETag"] == rv.headers["ETag"]
+    rv = client.get('/dl/module/terra/test/aws/2.0.0/test-2.0.0.tar.gz',
+                    headers={"If-None-Match": rv.headers["ETag"]})
+    assert rv.status_code == 304
+
+
+def test_dummy_tarball_reproducible(monkeypatch):
+    import time
+    from terraform_registry_api.terraform_module_registry_api.backends.dummy \
+        import build_tarball
+
+    first = build_tarball({"notsupported.txt": b"content"})
+    monkeypatch.setattr(time, "time", lambda: 2000000000.0)
+    assert build_tarball({"notsupported.txt": b"content"}) == first
+    # no timestamp in the gzip header
+    assert first[4:8] == b"\0\0\0\0"
 
 
 def test_download_module_notfound(client):
@@ -45,14 +65,21 @@ def test_download_module_notfound(client):
     assert json.loads(rv.data) == error
 
 
-def test_download_provider_not_supported(client):
+def test_download_provider_found(client):
+    rv = client.get('/dl/provider/terra/dummy/1.0.0/'
+                    'terraform-provider-dummy_1.0.0_linux_amd64.zip')
+    assert rv.status_code == 200
+    assert rv.content_type == "application/zip"
+
+
+def test_download_provider_notfound(client):
     rv = client.get('/dl/provider/terra/test/aws/2.0.0/test-2.0.0.zip')
-    assert rv.status_code == 500
+    assert rv.status_code == 404
     assert rv.content_type == "application/problem+json"
     error = {
-        "detail": "The provider type is not yet supported",
-        "status": 500,
-        "title": "Not Yet Supported",
+        "detail": "The requested file was not found on the server.",
+        "status": 404,
+        "title": "File Not Found",
         "type": "about:blank"
     }
     assert json.loads(rv.data) == error
@@ -85,4 +112,21 @@ def test_fs_type():
         "title": "File Not Found",
         "type": "about:blank"
     }
-    assert json.loads(rv.data) == error
\ No newline at end of file
+    assert json.loads(rv.data) == error
+
+
+def test_backends_imported_lazily():
+    import subprocess
+    import sys
+    script = ("import json, sys\n"
+              "from terraform_registry_api import registry\n"
+              "registry.create_app()\n"
+              "print(json.dumps([name for name in sys.modules if name.startswith(("
+              "'terraform_registry_api.terraform_module_registry_api.backends.',"
+              "'boto3', 'tarfile'))]))\n")
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True,
+                            check=True, text=True,
+                            env={"PYTHONPATH": ".", "PATH": environ.get("PATH", "")})
+    loaded = {name.rpartition(".")[2] for name in json.loads(output.stdout)}
+    assert "dummy" in loaded
+    assert not loaded & {"boto3", "tarfile", "filesystem", "proxy", "s3", "sqlite"}
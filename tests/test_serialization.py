@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from terraform_registry_api import serialization
+
+
+@pytest.fixture
+def restore_encoder():
+    yield
+    serialization.set_encoder()
+
+
+@pytest.mark.parametrize("name", ["json", "orjson"])
+def test_encoders_agree(restore_encoder, name):
+    pytest.importorskip(name)
+    serialization.set_encoder(name)
+    document = {"modules": [{"description": 'Café "quoted"\n', "downloads": 213,
+                             "verified": False, "source": "http://example.com/dl/"}],
+                "meta": {"next_offset": None}}
+    encoded = serialization.dumps(document)
+    assert isinstance(encoded, bytes)
+    assert encoded == json.dumps(document, separators=(",", ":"),
+                                 ensure_ascii=False).encode()
+    assert serialization.escape('a "b"\n/') == b'a \\"b\\"\\n/'
+
+
+def test_set_encoder_unknown(restore_encoder):
+    with pytest.raises(ValueError):
+        serialization.set_encoder("simplejson")
+
+
+def test_set_encoder_missing_orjson(restore_encoder, monkeypatch):
+    monkeypatch.setattr(serialization, "orjson", None)
+    with pytest.raises(ImportError):
+        serialization.set_encoder("orjson")
+    serialization.set_encoder("auto")
+    assert serialization.encoder is serialization.stdlib_dumps
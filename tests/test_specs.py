@@ -0,0 +1,61 @@
+import json
+import shutil
+
+import pytest
+
+from connexion import App
+from connexion.exceptions import InvalidSpecification
+
+from terraform_registry_api import specs
+
+
+@pytest.fixture
+def spec(tmp_path):
+    path = tmp_path / "swagger.yml"
+    shutil.copy(specs.spec_path(specs.SPECS[0]), str(path))
+    return path
+
+
+def test_compile_and_load(spec):
+    assert specs.load_compiled(str(spec)) is None
+    assert specs.compile_spec(str(spec)) == str(spec.parent / "swagger.json")
+    compiled = specs.load_compiled(str(spec))
+    assert compiled["swagger"] == "2.0"
+    # response codes are integers in YAML, connexion expects strings
+    assert all(isinstance(code, str) for path in compiled["paths"].values()
+               for operation in path.values() if isinstance(operation, dict)
+               for code in operation.get("responses", {}))
+    spec.write_text(spec.read_text() + "\n")
+    assert specs.load_compiled(str(spec)) is None
+
+
+def test_compile_invalid(tmp_path):
+    path = tmp_path / "swagger.yml"
+    path.write_text('swagger: "2.0"\npaths: {}\n')
+    with pytest.raises(InvalidSpecification):
+        specs.compile_spec(str(path))
+    assert not (tmp_path / "swagger.json").exists()
+
+
+def test_add_api_uses_compiled(spec):
+    app = App(__name__)
+    specs.add_api(app, str(spec))
+    compiled_path = specs.compile_spec(str(spec))
+    with open(compiled_path) as compiled_file:
+        compiled = json.load(compiled_file)
+    assert compiled["source"] == specs.source_digest(str(spec))
+    compiled_app = App(__name__)
+    specs.add_api(compiled_app, str(spec))
+    assert sorted(rule.rule for rule in compiled_app.app.url_map.iter_rules()) == \
+        sorted(rule.rule for rule in app.app.url_map.iter_rules())
+
+    # the compiled form is loaded in place of the YAML file
+    paths = compiled["spec"]["paths"]
+    path = next(iter(paths))
+    paths["/compiled" + path] = paths.pop(path)
+    with open(compiled_path, "w") as compiled_file:
+        json.dump(compiled, compiled_file)
+    compiled_app = App(__name__)
+    specs.add_api(compiled_app, str(spec))
+    assert any(rule.rule.startswith("/v1/modules/compiled/")
+               for rule in compiled_app.app.url_map.iter_rules())